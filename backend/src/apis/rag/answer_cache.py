@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from .tokenizer import tokenize
+
+
+class _Flight:
+    """A generation in progress, shared by every caller asking the same question."""
+
+    def __init__(self, session_id: str, generation: Tuple[int, int]):
+        self.session_id = session_id
+        self.generation = generation
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class AnswerCache:
+    """
+    Cache of streamed LLM answers with single-flight generation.
+
+    Answers are keyed by session, normalized question and a fingerprint of
+    the context sent to the LLM, and stored as the chunks they were
+    streamed in, so a hit replays as a stream. While an answer is being
+    generated, identical requests subscribe to the same chunks instead of
+    starting another generation; it is cancelled once every subscriber is
+    gone. ``invalidate_session`` drops the answers of a session and keeps
+    generations already running from being stored. At most ``max_entries``
+    answers are kept, for ``ttl`` seconds (0 keeps them until evicted).
+
+    Not thread-safe: use it from the event loop.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, float, List[str]]]" = OrderedDict()
+        self._session_keys: Dict[str, Set[str]] = {}
+        self._flights: Dict[str, _Flight] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(session_id: str, query: str, context: List[str]) -> str:
+        fingerprint = hashlib.sha256("\0".join(context).encode("utf-8")).hexdigest()
+        normalized = " ".join(tokenize(query))
+        return hashlib.sha256(f"{session_id}\0{normalized}\0{fingerprint}".encode("utf-8")).hexdigest()
+
+    def _generation(self, session_id: str) -> Tuple[int, int]:
+        return (self._epoch, self._generations.get(session_id, 0))
+
+    # --- Invalidation ---
+
+    def invalidate_session(self, session_id: str) -> None:
+        session_id = str(session_id)
+        self._generations[session_id] = self._generations.get(session_id, 0) + 1
+        for key in self._session_keys.pop(session_id, set()):
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._epoch += 1
+        self._entries.clear()
+        self._session_keys.clear()
+
+    # --- Lookup ---
+
+    def _get(self, key: str) -> Optional[List[str]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        session_id, stored_at, chunks = entry
+        if self.ttl and time.monotonic() - stored_at > self.ttl:
+            self._drop(key, session_id)
+            return None
+        self._entries.move_to_end(key)
+        return chunks
+
+    def _store(self, key: str, session_id: str, chunks: List[str]) -> None:
+        self._entries[key] = (session_id, time.monotonic(), chunks)
+        self._entries.move_to_end(key)
+        self._session_keys.setdefault(session_id, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            old_key, (old_session, _, _) = self._entries.popitem(last=False)
+            self._drop(old_key, old_session)
+
+    def _drop(self, key: str, session_id: str) -> None:
+        self._entries.pop(key, None)
+        keys = self._session_keys.get(session_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._session_keys[session_id]
+
+    async def stream(
+        self, key: str, session_id: str, generate: Callable[[], AsyncIterator[str]]
+    ) -> AsyncIterator[str]:
+        """Stream the answer for ``key``: replayed, joined in flight, or generated with ``generate()``."""
+        session_id = str(session_id)
+        chunks = self._get(key)
+        if chunks is not None:
+            self.hits += 1
+            for text in chunks:
+                yield text
+            return
+
+        flight = self._flights.get(key)
+        if flight is None:
+            self.misses += 1
+            flight = _Flight(session_id, self._generation(session_id))
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, generate))
+        else:
+            self.coalesced += 1
+
+        flight.subscribers += 1
+        try:
+            index = 0
+            while True:
+                changed = flight.changed
+                while index < len(flight.chunks):
+                    yield flight.chunks[index]
+                    index += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Nobody is listening any more: later callers start afresh
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    async def _run(self, key: str, flight: _Flight, generate: Callable[[], AsyncIterator[str]]) -> None:
+        try:
+            async for text in generate():
+                flight.chunks.append(text)
+                flight.notify()
+            # Not stored if the session changed while the answer was generated
+            if flight.generation == self._generation(flight.session_id):
+                self._store(key, flight.session_id, flight.chunks)
+        except asyncio.CancelledError:
+            flight.error = RuntimeError("Answer generation cancelled")
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.notify()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "in_flight": len(self._flights),
+        }
@@ -0,0 +1,218 @@
+import math
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# (doc_id, tokens) pairs; tokens come from tokenizer.tokenize, computed at ingestion
+Documents = List[Tuple[str, List[str]]]
+
+
+class SessionBM25Index:
+    """
+    Incrementally maintained BM25 inverted index over the documents of one session.
+
+    Postings are appended as documents arrive and compiled to NumPy arrays on
+    the first query that needs them, so a query scores the whole corpus with a
+    few vectorized operations per term. Removed documents are masked out and
+    the postings are compacted once they make up half of the slots.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._doc_ids: List[Optional[str]] = []
+        self._slots: Dict[str, int] = {}
+        self._lengths: List[int] = []
+        self._alive: List[bool] = []
+        self._total_length = 0
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._compiled: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._lengths_array: Optional[np.ndarray] = None
+        self._alive_array: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def add(self, documents: Documents) -> None:
+        """Add or replace documents."""
+        with self._lock:
+            for doc_id, tokens in documents:
+                if doc_id in self._slots:
+                    self._remove(doc_id)
+                slot = len(self._doc_ids)
+                counts = Counter(tokens)
+                length = sum(counts.values())
+                self._doc_ids.append(doc_id)
+                self._slots[doc_id] = slot
+                self._lengths.append(length)
+                self._alive.append(True)
+                self._total_length += length
+                for term, tf in counts.items():
+                    slots, tfs = self._postings.setdefault(term, ([], []))
+                    slots.append(slot)
+                    tfs.append(tf)
+                    self._compiled.pop(term, None)
+            self._lengths_array = self._alive_array = None
+
+    def remove(self, doc_ids: Iterable[str]) -> None:
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+            if len(self._doc_ids) > 64 and len(self._slots) * 2 < len(self._doc_ids):
+                self._compact()
+            self._alive_array = None
+
+    def _remove(self, doc_id: str) -> None:
+        slot = self._slots.pop(doc_id, None)
+        if slot is None:
+            return
+        self._alive[slot] = False
+        self._doc_ids[slot] = None
+        self._total_length -= self._lengths[slot]
+
+    def _compact(self) -> None:
+        """Drop the slots of removed documents and renumber the postings."""
+        remap = np.full(len(self._doc_ids), -1, dtype=np.int64)
+        alive = [slot for slot, is_alive in enumerate(self._alive) if is_alive]
+        remap[alive] = np.arange(len(alive))
+
+        postings = {}
+        for term, (slots, tfs) in self._postings.items():
+            kept = [(int(remap[slot]), tf) for slot, tf in zip(slots, tfs) if remap[slot] >= 0]
+            if kept:
+                postings[term] = ([slot for slot, _ in kept], [tf for _, tf in kept])
+        self._postings = postings
+        self._compiled = {}
+        self._doc_ids = [self._doc_ids[slot] for slot in alive]
+        self._lengths = [self._lengths[slot] for slot in alive]
+        self._alive = [True] * len(alive)
+        self._slots = {doc_id: slot for slot, doc_id in enumerate(self._doc_ids)}
+        self._lengths_array = None
+
+    def _term_arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            postings = self._postings.get(term)
+            if postings is None:
+                return None
+            compiled = (np.asarray(postings[0], dtype=np.int64), np.asarray(postings[1], dtype=np.float32))
+            self._compiled[term] = compiled
+        return compiled
+
+    def search(self, query_tokens: List[str], top_k: int) -> List[Tuple[str, float]]:
+        """Return up to ``top_k`` (doc_id, score) pairs with a positive BM25 score, best first."""
+        terms = set(query_tokens)
+        with self._lock:
+            n_docs = len(self._slots)
+            if not terms or n_docs == 0:
+                return []
+            if self._lengths_array is None:
+                self._lengths_array = np.asarray(self._lengths, dtype=np.float32)
+            if self._alive_array is None:
+                self._alive_array = np.asarray(self._alive, dtype=bool)
+            lengths, alive = self._lengths_array, self._alive_array
+            avgdl = self._total_length / n_docs or 1.0
+
+            scores = np.zeros(len(self._doc_ids), dtype=np.float32)
+            for term in terms:
+                arrays = self._term_arrays(term)
+                if arrays is None:
+                    continue
+                slots, tfs = arrays
+                live = alive[slots]
+                df = int(live.sum())
+                if df == 0:
+                    continue
+                idf = math.log((n_docs - df + 0.5) / (df + 0.5) + 1.0)
+                norm = self.k1 * (1.0 - self.b + self.b * lengths[slots] / avgdl)
+                scores[slots] += np.where(live, idf * tfs * (self.k1 + 1.0) / (tfs + norm), 0.0)
+
+            candidates = np.flatnonzero(scores > 0)
+            if candidates.size > top_k:
+                candidates = candidates[np.argpartition(scores[candidates], -top_k)[-top_k:]]
+            ranked = candidates[np.argsort(scores[candidates])[::-1]]
+            return [(self._doc_ids[slot], float(scores[slot])) for slot in ranked]
+
+
+class BM25IndexManager:
+    """
+    Per-session BM25 indexes, built lazily and kept up to date incrementally.
+
+    A session's index is built from ``loader(session_id)`` the first time the
+    session is searched; afterwards saves and deletes are applied to it
+    directly. Changes that arrive while the index is being loaded are replayed
+    on it. At most ``max_sessions`` indexes are kept, least recently used
+    evicted first.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], Documents],
+        max_sessions: int = 64,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.loader = loader
+        self.max_sessions = max_sessions
+        self.k1 = k1
+        self.b = b
+        self._indexes: "OrderedDict[str, SessionBM25Index]" = OrderedDict()
+        self._loading: Dict[str, List[Tuple[str, object]]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, session_id: str, documents: Documents) -> None:
+        self._apply(session_id, "add", documents)
+
+    def remove(self, session_id: str, doc_ids: List[str]) -> None:
+        self._apply(session_id, "remove", doc_ids)
+
+    def _apply(self, session_id: str, op: str, payload) -> None:
+        with self._lock:
+            index = self._indexes.get(session_id)
+            if index is None:
+                # Not loaded: the loader will see the change; if loading, replay it afterwards
+                if session_id in self._loading:
+                    self._loading[session_id].append((op, payload))
+                return
+        getattr(index, op)(payload)
+
+    def drop(self, session_ids: Iterable[str]) -> None:
+        with self._lock:
+            for session_id in session_ids:
+                self._indexes.pop(session_id, None)
+                self._loading.pop(session_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._indexes.clear()
+            self._loading.clear()
+
+    def search(self, session_id: str, query_tokens: List[str], top_k: int) -> List[Tuple[str, float]]:
+        return self._get(session_id).search(query_tokens, top_k)
+
+    def _get(self, session_id: str) -> SessionBM25Index:
+        with self._lock:
+            index = self._indexes.get(session_id)
+            if index is not None:
+                self._indexes.move_to_end(session_id)
+                return index
+            self._loading.setdefault(session_id, [])
+
+        index = SessionBM25Index(self.k1, self.b)
+        index.add(self.loader(session_id))
+
+        with self._lock:
+            existing = self._indexes.get(session_id)
+            if existing is not None:
+                return existing  # loaded concurrently
+            if session_id not in self._loading:
+                return index  # dropped while loading: do not keep it
+            for op, payload in self._loading.pop(session_id, []):
+                getattr(index, op)(payload)
+            self._indexes[session_id] = index
+            while len(self._indexes) > self.max_sessions:
+                self._indexes.popitem(last=False)
+        return index
@@ -0,0 +1,115 @@
+import json
+import re
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel
+
+# Rough token count: words and punctuation marks
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+Turn = Tuple[Optional[str], str]
+
+
+class Chunk(BaseModel):
+    index: int
+    text: str
+    start_turn: int  # first turn of the transcript in this chunk
+    end_turn: int  # last turn (inclusive)
+
+
+def count_tokens(text: str) -> int:
+    return len(_TOKEN.findall(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut ``text`` after its first ``max_tokens`` tokens (as counted by count_tokens)."""
+    if max_tokens <= 0:
+        return ""
+    for i, match in enumerate(_TOKEN.finditer(text)):
+        if i == max_tokens - 1:
+            return text[:match.end()]
+    return text
+
+
+def parse_turns(text: str) -> List[Turn]:
+    """
+    Split a transcript into (speaker, text) turns.
+
+    Understands the JSON list of {speaker: text} objects produced by
+    speech_to_text.stt.parse_conv; other texts are split into paragraphs
+    with no speaker.
+    """
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if isinstance(data, list) and data and all(isinstance(turn, dict) for turn in data):
+        return [(str(speaker), str(said)) for turn in data for speaker, said in turn.items() if str(said).strip()]
+    return [(None, part.strip()) for part in re.split(r"\n\s*\n|\n", text) if part.strip()]
+
+
+def _render(turn: Turn) -> str:
+    speaker, text = turn
+    return f"{speaker}: {text}" if speaker is not None else text
+
+
+def _split_turn(turn: Turn, max_tokens: int, overlap_tokens: int) -> List[Turn]:
+    """Split a turn that does not fit in a chunk into overlapping word windows."""
+    speaker, text = turn
+    words = text.split()
+    # Words can hold several tokens (punctuation), so windows are sized in words per token
+    words_per_token = len(words) / max(1, count_tokens(_render(turn)))
+    size = max(1, int(max_tokens * words_per_token))
+    step = max(1, size - int(overlap_tokens * words_per_token))
+    return [(speaker, " ".join(words[i:i + size])) for i in range(0, len(words), step) if words[i:i + size]]
+
+
+def chunk_transcript(text: str, max_tokens: int = 256, overlap_tokens: int = 32) -> List[Chunk]:
+    """
+    Pack speaker turns into chunks of at most ``max_tokens`` tokens.
+
+    Turns are never cut unless a single turn exceeds the budget. Consecutive
+    chunks share their boundary turns, up to ``overlap_tokens`` tokens, so an
+    exchange is not lost at a chunk border. Each line of a chunk is rendered
+    as "speaker: text".
+    """
+    units: List[Tuple[int, str, int]] = []  # (turn index, rendered text, tokens)
+    for turn_index, turn in enumerate(parse_turns(text)):
+        rendered = _render(turn)
+        tokens = count_tokens(rendered)
+        if tokens <= max_tokens:
+            units.append((turn_index, rendered, tokens))
+            continue
+        for piece in _split_turn(turn, max_tokens, overlap_tokens):
+            rendered = _render(piece)
+            units.append((turn_index, rendered, count_tokens(rendered)))
+
+    chunks: List[Chunk] = []
+    current: List[Tuple[int, str, int]] = []
+    current_tokens = 0
+    for unit in units:
+        if current and current_tokens + unit[2] > max_tokens:
+            chunks.append(_make_chunk(len(chunks), current))
+            # Carry the trailing units that fit in the overlap budget
+            carried: List[Tuple[int, str, int]] = []
+            carried_tokens = 0
+            for previous in reversed(current):
+                if carried_tokens + previous[2] > overlap_tokens or carried_tokens + previous[2] + unit[2] > max_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous[2]
+            current, current_tokens = carried, carried_tokens
+        current.append(unit)
+        current_tokens += unit[2]
+    if current:
+        chunks.append(_make_chunk(len(chunks), current))
+    return chunks
+
+
+def _make_chunk(index: int, units: List[Tuple[int, str, int]]) -> Chunk:
+    return Chunk(
+        index=index,
+        text="\n".join(rendered for _, rendered, _ in units),
+        start_turn=units[0][0],
+        end_turn=units[-1][0],
+    )
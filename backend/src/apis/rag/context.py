@@ -0,0 +1,203 @@
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel
+
+from .chunking import count_tokens, truncate_tokens
+from .tokenizer import tokenize
+
+# MinHash permutations are (a * h + b) mod p over 32-bit shingle hashes
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_SHINGLE_BASE = 1000003
+
+
+class PackedContext(BaseModel):
+    documents: List[str]
+    tokens: int  # estimated tokens of the selected documents
+    candidate_tokens: int  # estimated tokens of all the candidates
+    duplicates: int  # candidates dropped as near-duplicates
+    over_budget: int  # candidates left out for lack of budget
+
+
+class ContextPacker:
+    """
+    Selects the retrieved passages sent to the LLM within a token budget.
+
+    1. Near-duplicates are dropped: passages whose MinHash estimate of the
+       Jaccard similarity of their token shingles with a better ranked
+       passage reaches ``dedupe_threshold`` (e.g. the same meeting recorded
+       twice, or the overlap of consecutive chunks).
+    2. The remaining passages are picked by maximal marginal relevance:
+       ``mmr_lambda * relevance - (1 - mmr_lambda) * max similarity`` to the
+       passages already picked, where relevance is the min-max normalized
+       retrieval score and similarity the cosine of the passage embeddings
+       stored at ingestion (``embeddings`` looks them up by id), or the
+       shingle similarity for passages without one.
+    3. Passages that do not fit in the remaining budget are skipped; the
+       first one is truncated instead if it alone exceeds the budget.
+
+    Signatures and similarities are computed with NumPy for all candidates
+    at once. Counters of the work saved are available through ``stats()``.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 2000,
+        dedupe_threshold: float = 0.8,
+        mmr_lambda: float = 0.7,
+        embeddings: Optional[Callable[[List[str]], Dict[str, Sequence[float]]]] = None,
+        num_perm: int = 64,
+        shingle_size: int = 3,
+        seed: int = 1,
+        cache_size: int = 4096,
+    ):
+        self.max_tokens = max_tokens
+        self.dedupe_threshold = dedupe_threshold
+        self.mmr_lambda = mmr_lambda
+        self.embeddings = embeddings
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+        # The same chunks come back across queries: their signatures are kept
+        self.cache_size = cache_size
+        self._signatures: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+        self._lock = threading.Lock()
+        self._packed = 0
+        self._candidate_tokens = 0
+        self._tokens = 0
+        self._duplicates = 0
+        self._over_budget = 0
+
+    # --- Similarity ---
+
+    def _shingle_hashes(self, text: str) -> np.ndarray:
+        """Distinct 32-bit hashes of the token shingles, combined from per-token hashes."""
+        tokens = np.fromiter((zlib.crc32(token.encode("utf-8")) for token in tokenize(text)), dtype=np.uint64)
+        if tokens.size == 0:
+            return tokens
+        size = min(self.shingle_size, tokens.size)
+        count = tokens.size - size + 1
+        hashes = np.zeros(count, dtype=np.uint64)
+        for offset in range(size):
+            hashes = (hashes * np.uint64(_SHINGLE_BASE) + tokens[offset:offset + count]) & np.uint64(0xFFFFFFFF)
+        return np.unique(hashes)
+
+    def signatures(self, documents: List[str]) -> np.ndarray:
+        """MinHash signatures, one row per document (equal for all documents without tokens)."""
+        signatures = np.full((len(documents), len(self._a)), _MERSENNE_PRIME, dtype=np.uint64)
+        for i, document in enumerate(documents):
+            with self._lock:
+                cached = self._signatures.get(document)
+                if cached is not None:
+                    self._signatures.move_to_end(document)
+            if cached is None:
+                hashes = self._shingle_hashes(document)
+                if hashes.size:
+                    # (num_perm, shingles) permuted hashes, minimum per permutation
+                    signatures[i] = ((np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME).min(axis=1)
+                with self._lock:
+                    self._signatures[document] = signatures[i].copy()
+                    while len(self._signatures) > self.cache_size:
+                        self._signatures.popitem(last=False)
+            else:
+                signatures[i] = cached
+        return signatures
+
+    @staticmethod
+    def jaccard(signatures: np.ndarray) -> np.ndarray:
+        """Pairwise Jaccard similarity estimates of MinHash signatures."""
+        return (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2)
+
+    def _similarity(self, ids: Optional[List[str]], jaccard: np.ndarray) -> np.ndarray:
+        if self.embeddings is None or ids is None:
+            return jaccard
+        stored = self.embeddings(ids)
+        found = [i for i, doc_id in enumerate(ids) if doc_id in stored]
+        if not found:
+            return jaccard
+        vectors = np.asarray([stored[ids[i]] for i in found], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+        similarity = jaccard.copy()
+        similarity[np.ix_(found, found)] = vectors @ vectors.T
+        return similarity
+
+    # --- Packing ---
+
+    def pack(
+        self, documents: List[str], scores: Optional[List[float]] = None, ids: Optional[List[str]] = None
+    ) -> PackedContext:
+        """Select passages from ``documents`` (best first, with their retrieval ``scores`` and vector store ``ids``)."""
+        lengths = np.array([count_tokens(document) for document in documents], dtype=np.int64)
+        candidate_tokens = int(lengths.sum())
+        if not documents:
+            return PackedContext(documents=[], tokens=0, candidate_tokens=0, duplicates=0, over_budget=0)
+
+        # 1. Near-duplicates of a better ranked passage
+        jaccard = self.jaccard(self.signatures(documents))
+        keep = np.ones(len(documents), dtype=bool)
+        for i in range(1, len(documents)):
+            if (jaccard[i, :i][keep[:i]] >= self.dedupe_threshold).any():
+                keep[i] = False
+        kept = np.flatnonzero(keep)
+        duplicates = len(documents) - len(kept)
+
+        # 2. Maximal marginal relevance within the budget
+        relevance = np.asarray(scores if scores is not None else -np.arange(len(documents)), dtype=np.float64)[kept]
+        spread = relevance.max() - relevance.min()
+        relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(len(kept))
+        similarity = self._similarity(
+            [ids[i] for i in kept] if ids is not None else None, jaccard[np.ix_(kept, kept)]
+        )
+
+        selected: List[str] = []
+        used = 0
+        max_similarity = np.zeros(len(kept))
+        remaining = np.ones(len(kept), dtype=bool)
+        while remaining.any():
+            mmr = np.where(
+                remaining, self.mmr_lambda * relevance - (1 - self.mmr_lambda) * max_similarity, -np.inf
+            )
+            pick = int(np.argmax(mmr))
+            remaining[pick] = False
+            length = int(lengths[kept[pick]])
+            if used + length > self.max_tokens:
+                if selected:
+                    continue
+                # The best passage alone is over budget: send its beginning
+                selected.append(truncate_tokens(documents[kept[pick]], self.max_tokens))
+                used = count_tokens(selected[-1])
+            else:
+                selected.append(documents[kept[pick]])
+                used += length
+            max_similarity = np.maximum(max_similarity, similarity[pick])
+        over_budget = len(kept) - len(selected)
+
+        with self._lock:
+            self._packed += 1
+            self._candidate_tokens += candidate_tokens
+            self._tokens += used
+            self._duplicates += duplicates
+            self._over_budget += over_budget
+        return PackedContext(
+            documents=selected,
+            tokens=used,
+            candidate_tokens=candidate_tokens,
+            duplicates=duplicates,
+            over_budget=over_budget,
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "packed": self._packed,
+                "avg_candidate_tokens": self._candidate_tokens / self._packed if self._packed else 0.0,
+                "avg_tokens": self._tokens / self._packed if self._packed else 0.0,
+                "duplicates": self._duplicates,
+                "over_budget": self._over_budget,
+            }
@@ -1,8 +1,27 @@
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
+from ...commons.constants import settings
 from ...commons.router import make_router
 from .service import RagService
+from .sse import SSE_HEADERS, event_stream
 from . import schemas
 
+ANSWER_EVENTS = {schemas.AnswerContext: "context", schemas.AnswerToken: "token", schemas.AnswerDone: "done"}
+BATCH_EVENTS = {
+    schemas.BatchAnswerContext: "context",
+    schemas.BatchAnswerToken: "token",
+    schemas.BatchAnswerDone: "done",
+    schemas.BatchAnswerError: "error",
+    schemas.BatchDone: "end",
+}
+
+async def _ndjson_search(results: AsyncIterator) -> AsyncIterator[str]:
+    async for item in results:
+        yield item.model_dump_json() + "\n"
+
 @make_router()
 def controller(router, rag_service: RagService) -> None:
 
@@ -16,17 +35,127 @@ def controller(router, rag_service: RagService) -> None:
         return await rag_service.save_conversation(payload)
 
     @router.post("/initial_query")
-    async def initial_query(payload: schemas.QueryRequest):
-        # Get generator from service
-        response_generator = rag_service.stream_rag_response(payload.query, payload.session_id)
-        # Return standard StreamingResponse
-        return StreamingResponse(response_generator, media_type="text/event-stream")
+    async def initial_query(payload: schemas.QueryRequest, request: Request):
+        """Answer a question about a session as server-sent events.
+
+        Events: "context" (passages sent to the LLM), "token" (answer text,
+        one per chunk), then "done" (time to first token, tokens per second)
+        or "error". Heartbeat comments keep idle streams open through
+        proxies; the generation stops when the client disconnects.
+        """
+        events = rag_service.stream_rag_response(payload.query, payload.session_id)
+        return StreamingResponse(
+            event_stream(
+                events,
+                ANSWER_EVENTS,
+                request.is_disconnected,
+                heartbeat=settings.RAG_SSE_HEARTBEAT,
+                poll_interval=settings.RAG_SSE_DISCONNECT_POLL,
+            ),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS,
+        )
+
+    @router.post("/batch_query")
+    async def batch_query(payload: schemas.BatchQueryRequest, request: Request):
+        """Answer several questions about a session in one stream of server-sent events.
+
+        The events of /rag/initial_query, each with the question_id it
+        belongs to (the question's position unless given), interleaved as
+        the answers are generated. A question that fails gets an "error"
+        event and the others go on; "end" closes the stream.
+        """
+        try:
+            events = rag_service.batch_query(payload.session_id, payload.questions)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return StreamingResponse(
+            event_stream(
+                events,
+                BATCH_EVENTS,
+                request.is_disconnected,
+                heartbeat=settings.RAG_SSE_HEARTBEAT,
+                poll_interval=settings.RAG_SSE_DISCONNECT_POLL,
+            ),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS,
+        )
+
+    @router.get("/search", response_model=schemas.SearchPage)
+    async def search(
+        q: str = Query(..., min_length=1),
+        session_name: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        limit: int = Query(20, ge=1, le=100),
+        per_session: int = Query(3, ge=1, le=20),
+        cursor: Optional[str] = None,
+        stream: bool = False,
+    ):
+        """Search conversations across all sessions, grouped by session, best first (cursor-paginated).
+
+        Filters apply to the session: name substring (case-insensitive) and
+        creation date range. With stream=true the response is NDJSON: one
+        SearchGroup line per session as soon as it is ready, then a SearchPage
+        line without groups carrying next_cursor and timings.
+        """
+        try:
+            results = rag_service.search(q, limit, per_session, cursor, session_name, date_from, date_to)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if stream:
+            return StreamingResponse(_ndjson_search(results), media_type="application/x-ndjson")
+        page = schemas.SearchPage()
+        async for item in results:
+            if isinstance(item, schemas.SearchGroup):
+                page.groups.append(item)
+            else:
+                page.next_cursor, page.timings = item.next_cursor, item.timings
+        return page
+
+    @router.get("/metrics/embeddings")
+    async def embedding_metrics():
+        """Throughput and batching counters of the embedding queue."""
+        return rag_service.embedding_queue.metrics()
+
+    @router.get("/metrics/embedding_cache")
+    async def embedding_cache_metrics():
+        """Hit and miss counters of the embedding cache."""
+        return rag_service.embedding_cache.stats()
+
+    @router.get("/metrics/retrieval")
+    async def retrieval_metrics():
+        """Average milliseconds per retrieval stage (query embedding, generators, fusion, fetch)."""
+        return rag_service.retrieval.metrics()
+
+    @router.get("/metrics/context")
+    async def context_metrics():
+        """Prompt context sizes before and after packing, and passages dropped."""
+        return rag_service.context_packer.stats()
+
+    @router.get("/metrics/answer_cache")
+    async def answer_cache_metrics():
+        """Answers replayed from the cache, joined in flight, or generated."""
+        return rag_service.answer_cache.stats()
+
+    @router.get("/metrics/streams")
+    async def stream_metrics():
+        """Answer streams completed, cancelled or failed, time to first token and tokens per second."""
+        return rag_service.stream_metrics.stats()
 
     @router.get("/sessions", response_model=list[schemas.SessionResponse])
     async def get_all_sessions():
         """Get all sessions from RAG database."""
         return await rag_service.get_all_sessions()
 
+    @router.get("/sessions/page", response_model=schemas.SessionPage)
+    async def list_sessions(limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
+        """List sessions, most recently created first (cursor-paginated)."""
+        try:
+            return await rag_service.list_sessions(limit, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
     @router.delete("/sessions", status_code=200)
     async def delete_all_sessions():
         """Delete all sessions from RAG database (hard delete)."""
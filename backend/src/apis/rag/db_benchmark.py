@@ -0,0 +1,145 @@
+"""
+Compare the database storage profiles under concurrent reads and writes.
+
+Run from the backend directory:
+
+    python -m src.apis.rag.db_benchmark --writers 4 --readers 16 --duration 10
+
+Each profile gets a fresh SQLite file seeded with ``--sessions`` sessions
+and ``--conversations`` conversations. Writers then save conversations
+with their chunks, one transaction each (bulk INSERTs, as
+RagService.save_conversations), while readers list a keyset-paginated page
+of sessions and load the conversations of a random session. Reports
+operations per second and latency (p50 / p95) of both.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+import numpy as np
+from sqlalchemy import insert, select, tuple_
+
+from ...commons.database import DATABASE_PROFILES, create_database_engine
+from . import models
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+async def _seed(engine, n_sessions: int, n_conversations: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+        started = datetime(2024, 1, 1)
+        await conn.execute(insert(models.Session), [
+            {"id": f"session-{i}", "name": f"Session {i}", "created_at": started + timedelta(minutes=i)}
+            for i in range(n_sessions)
+        ])
+        await conn.execute(insert(models.Conversation), [
+            {"text": "turn " * 500, "session_id": f"session-{i % n_sessions}"} for i in range(n_conversations)
+        ])
+
+
+async def _write(engine, rng: random.Random, n_sessions: int, chunks: int) -> None:
+    session_id = f"session-{rng.randrange(n_sessions)}"
+    async with engine.begin() as conn:
+        conversation_id = (await conn.execute(
+            insert(models.Conversation).returning(models.Conversation.id),
+            {"text": "turn " * 500, "session_id": session_id},
+        )).scalar_one()
+        await conn.execute(insert(models.ConversationChunk), [
+            {
+                "id": f"{conversation_id}:{i}",
+                "conversation_id": conversation_id,
+                "session_id": session_id,
+                "chunk_index": i,
+                "start_turn": i,
+                "end_turn": i,
+            }
+            for i in range(chunks)
+        ])
+
+
+async def _read(engine, rng: random.Random, n_sessions: int) -> None:
+    async with engine.connect() as conn:
+        # A page of sessions after a random key, then one session's conversations
+        offset = rng.randrange(n_sessions)
+        after = (datetime(2024, 1, 1) + timedelta(minutes=offset), f"session-{offset}")
+        await conn.execute(
+            select(models.Session.id, models.Session.name, models.Session.created_at)
+            .where(tuple_(models.Session.created_at, models.Session.id) < after)
+            .order_by(models.Session.created_at.desc(), models.Session.id.desc())
+            .limit(20)
+        )
+        await conn.execute(
+            select(models.Conversation.id, models.Conversation.created_at)
+            .where(models.Conversation.session_id == f"session-{rng.randrange(n_sessions)}")
+            .limit(50)
+        )
+
+
+async def run(profile: str, path: str, args) -> dict:
+    engine = create_database_engine(f"sqlite+aiosqlite:///{path}", profile)
+    await _seed(engine, args.sessions, args.conversations)
+    latencies = {"write": [], "read": []}
+    errors = {"write": 0, "read": 0}
+    deadline = time.perf_counter() + args.duration
+
+    async def worker(kind: str, seed: int) -> None:
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if kind == "write":
+                    await _write(engine, rng, args.sessions, args.chunks)
+                else:
+                    await _read(engine, rng, args.sessions)
+            except Exception:
+                errors[kind] += 1  # e.g. "database is locked"
+                continue
+            latencies[kind].append(time.perf_counter() - started)
+
+    await asyncio.gather(
+        *(worker("write", i) for i in range(args.writers)),
+        *(worker("read", args.writers + i) for i in range(args.readers)),
+    )
+    await engine.dispose()
+    return {
+        kind: {
+            "per_second": round(len(values) / args.duration),
+            "p50_ms": round(_percentile(values, 50), 2),
+            "p95_ms": round(_percentile(values, 95), 2),
+            "errors": errors[kind],
+        }
+        for kind, values in latencies.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--conversations", type=int, default=20000, help="conversations stored before the run")
+    parser.add_argument("--chunks", type=int, default=8, help="chunks saved with each conversation")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per profile")
+    parser.add_argument("--profiles", default=",".join(reversed(DATABASE_PROFILES)))
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers, {args.readers} readers, {args.duration:g} s per profile")
+    for profile in args.profiles.split(","):
+        with tempfile.TemporaryDirectory() as directory:
+            report = asyncio.run(run(profile, os.path.join(directory, "benchmark.db"), args))
+        print(f"{profile:>8}: " + ", ".join(
+            f"{kind} {r['per_second']}/s (p50 {r['p50_ms']} ms, p95 {r['p95_ms']} ms, {r['errors']} errors)"
+            for kind, r in report.items()
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from chromadb import Documents, EmbeddingFunction, Embeddings
+
+# Keeps SELECT ... IN (...) under SQLite's host parameter limit
+_SQL_CHUNK = 500
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a text before hashing so trivially different copies share a cache entry."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of embeddings keyed by a hash of the namespace and normalized text.
+
+    The namespace identifies the model and task type, so vectors of different
+    models never mix. Lookups hit a bounded in-memory LRU first, then an SQLite
+    table of float32 blobs (``path=None`` disables the disk tier). Texts that
+    miss both tiers are computed with one call for the whole batch and stored
+    in both tiers. Safe to use from several threads.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_memory_entries: int = 10000):
+        self.max_memory_entries = max_memory_entries
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL) WITHOUT ROWID"
+            )
+            self._db.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(namespace: str, text: str) -> bytes:
+        return hashlib.sha256(f"{namespace}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+    def embed(
+        self, namespace: str, texts: List[str], compute: Callable[[List[str]], Sequence[Sequence[float]]]
+    ) -> List[np.ndarray]:
+        """Return the embeddings of ``texts``, calling ``compute`` only for the cache misses."""
+        keys = [self.key(namespace, text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            self.memory_hits += sum(1 for key in keys if key in found)
+
+            missing = list(dict.fromkeys(key for key in keys if key not in found))
+            if missing and self._db is not None:
+                from_disk = self._load(missing)
+                self.disk_hits += sum(1 for key in keys if key in from_disk)
+                for key, vector in from_disk.items():
+                    self._remember(key, vector)
+                found.update(from_disk)
+
+        # Each distinct missing text is computed once, outside the lock
+        pending: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+        if pending:
+            computed = compute(list(pending.values()))
+            vectors = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(pending, computed)}
+            with self._lock:
+                self.misses += sum(1 for key in keys if key in vectors)
+                for key, vector in vectors.items():
+                    self._remember(key, vector)
+                if self._db is not None:
+                    self._db.executemany(
+                        "INSERT OR IGNORE INTO embeddings (key, vector) VALUES (?, ?)",
+                        [(key, vector.tobytes()) for key, vector in vectors.items()],
+                    )
+                    self._db.commit()
+            found.update(vectors)
+
+        return [found[key] for key in keys]
+
+    def _load(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        loaded = {}
+        for i in range(0, len(keys), _SQL_CHUNK):
+            chunk = keys[i:i + _SQL_CHUNK]
+            rows = self._db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            )
+            for key, blob in rows:
+                loaded[key] = np.frombuffer(blob, dtype=np.float32)
+        return loaded
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+                self._db = None
+
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """
+    Chroma embedding function that serves embeddings from an EmbeddingCache.
+
+    It reports the wrapped function's name and config, so existing collections
+    accept it in place of the original.
+    """
+
+    def __init__(self, inner: EmbeddingFunction, cache: EmbeddingCache, namespace: str):
+        self.inner = inner
+        self.cache = cache
+        self.namespace = namespace
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self.cache.embed(self.namespace, list(input), self.inner)
+
+    def name(self) -> str:
+        return self.inner.name()
+
+    def get_config(self) -> dict:
+        return self.inner.get_config()
+
+    def default_space(self):
+        return self.inner.default_space()
+
+    def supported_spaces(self):
+        return self.inner.supported_spaces()
+
+    def is_legacy(self) -> bool:
+        return self.inner.is_legacy()
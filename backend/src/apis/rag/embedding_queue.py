@@ -0,0 +1,190 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+# (id, document, metadata, future resolved once the document is written)
+_Item = tuple
+
+EmbedFn = Callable[[List[str]], Sequence[Sequence[float]]]
+WriteFn = Callable[[List[str], list, List[str], List[dict]], None]
+
+
+class EmbeddingQueue:
+    """
+    Micro-batching pipeline between document producers and the vector DB.
+
+    Documents submitted by concurrent callers are gathered into batches of at
+    most ``max_batch_size`` documents, waiting at most ``max_wait`` seconds for
+    a batch to fill up. Each batch is embedded with one ``embed`` call and
+    written with one ``write`` call, both run in the threadpool so the event
+    loop never waits on the provider.
+
+    The queue holds at most ``max_pending`` documents: ``submit`` blocks when
+    it is full, which pushes back on producers instead of buffering without
+    bound. ``min_interval`` spaces out embedding calls to stay under the
+    provider's rate limit.
+    """
+
+    def __init__(
+        self,
+        embed: EmbedFn,
+        write: WriteFn,
+        max_batch_size: int = 100,
+        max_wait: float = 0.05,
+        max_pending: int = 2000,
+        workers: int = 2,
+        min_interval: float = 0.0,
+    ):
+        self.embed = embed
+        self.write = write
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.workers = workers
+        self.min_interval = min_interval
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._rate_lock: Optional[asyncio.Lock] = None
+        self._next_call = 0.0
+
+        self._submitted = 0
+        self._written = 0
+        self._failed = 0
+        self._batches = 0
+        self._failed_batches = 0
+        self._max_batch = 0
+        self._embed_seconds = 0.0
+        self._write_seconds = 0.0
+
+    # --- Lifecycle ---
+
+    async def start(self) -> None:
+        """Start the workers on the running loop."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._rate_lock = asyncio.Lock()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"embedding-queue-{i}") for i in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Callers still waiting on queued documents get an error instead of hanging
+        while self._queue is not None and not self._queue.empty():
+            self._fail_stopped([self._queue.get_nowait()])
+
+    # --- Producers ---
+
+    async def submit(self, ids: List[str], documents: List[str], metadatas: List[dict]) -> None:
+        """Queue documents and wait until they are embedded and written."""
+        if not ids:
+            return
+        if not self._tasks:
+            await self.start()
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for item in zip(ids, documents, metadatas):
+            future = loop.create_future()
+            await self._queue.put((*item, future))  # blocks while the queue is full
+            futures.append(future)
+        self._submitted += len(futures)
+        await asyncio.gather(*futures)
+
+    # --- Workers ---
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            try:
+                while len(batch) < self.max_batch_size:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # The items taken so far are no longer in the queue for stop() to fail
+                self._fail_stopped(batch)
+                raise
+            await self._process(batch)
+
+    async def _process(self, batch: List[_Item]) -> None:
+        # The same id queued twice (e.g. a retried ingestion) is only written once
+        unique: Dict[str, _Item] = {}
+        for item in batch:
+            unique[item[0]] = item
+        ids = list(unique)
+        documents = [item[1] for item in unique.values()]
+        metadatas = [item[2] for item in unique.values()]
+
+        try:
+            await self._throttle()
+            started = time.perf_counter()
+            embeddings = await asyncio.to_thread(self.embed, documents)
+            embedded = time.perf_counter()
+            await asyncio.to_thread(self.write, ids, embeddings, documents, metadatas)
+            self._embed_seconds += embedded - started
+            self._write_seconds += time.perf_counter() - embedded
+        except asyncio.CancelledError:
+            self._fail_stopped(batch)
+            raise
+        except Exception as e:
+            print(f"Error: Embedding batch of {len(ids)} document(s) failed: {e}")
+            self._failed += len(batch)
+            self._failed_batches += 1
+            for item in batch:
+                if not item[3].done():
+                    item[3].set_exception(e)
+            return
+
+        self._written += len(batch)
+        self._batches += 1
+        self._max_batch = max(self._max_batch, len(ids))
+        for item in batch:
+            if not item[3].done():
+                item[3].set_result(None)
+
+    @staticmethod
+    def _fail_stopped(batch: List[_Item]) -> None:
+        for item in batch:
+            if not item[3].done():
+                item[3].set_exception(RuntimeError("Embedding queue stopped"))
+
+    async def _throttle(self) -> None:
+        if self.min_interval <= 0:
+            return
+        async with self._rate_lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next_call - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_call = loop.time() + self.min_interval
+
+    # --- Metrics ---
+
+    def metrics(self) -> dict:
+        return {
+            "submitted": self._submitted,
+            "written": self._written,
+            "failed": self._failed,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self._batches,
+            "failed_batches": self._failed_batches,
+            "avg_batch_size": self._written / self._batches if self._batches else 0.0,
+            "max_batch_size": self._max_batch,
+            "embed_seconds": round(self._embed_seconds, 3),
+            "write_seconds": round(self._write_seconds, 3),
+        }
@@ -0,0 +1,29 @@
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Merge ranked id lists by summing 1 / (k + rank) over the lists each id appears in."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def weighted_fusion(score_maps: Sequence[Dict[str, float]], weights: Sequence[float]) -> List[Tuple[str, float]]:
+    """Merge score maps after min-max normalizing each one; ids missing from a map score 0 there."""
+    ids = list(dict.fromkeys(doc_id for scores in score_maps for doc_id in scores))
+    if not ids:
+        return []
+    total = np.zeros(len(ids))
+    for scores, weight in zip(score_maps, weights):
+        if not scores:
+            continue
+        values = np.array([scores.get(doc_id, np.nan) for doc_id in ids], dtype=float)
+        present = ~np.isnan(values)
+        low, high = values[present].min(), values[present].max()
+        normalized = (values - low) / (high - low) if high > low else np.ones_like(values)
+        total += weight * np.where(present, normalized, 0.0)
+    return [(ids[i], float(total[i])) for i in np.argsort(-total, kind="stable")]
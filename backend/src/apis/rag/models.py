@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, DDL, MetaData, Table, event
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 
@@ -9,7 +9,7 @@ class Session(Base):
     id = Column(String, primary_key=True, index=True)  # UUID from session_manager
     name = Column(String, index=True)
     description = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     
     conversations = relationship("Conversation", back_populates="session")
 
@@ -17,7 +17,107 @@ class Conversation(Base):
     __tablename__ = "conversations"
     id = Column(Integer, primary_key=True, index=True)
     text = Column(Text, nullable=False)
-    session_id = Column(String, ForeignKey("sessions.id"))  # UUID reference
-    created_at = Column(DateTime, default=datetime.utcnow)
+    session_id = Column(String, ForeignKey("sessions.id"), index=True)  # UUID reference
+    external_id = Column(String, unique=True, index=True, nullable=True)  # conversation_id from session_manager
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     
-    session = relationship("Session", back_populates="conversations")
\ No newline at end of file
+    session = relationship("Session", back_populates="conversations")
+
+class ConversationChunk(Base):
+    __tablename__ = "conversation_chunks"
+    # INTEGER PRIMARY KEY, so the rowid the chunk_search row points at survives a VACUUM
+    search_id = Column(Integer, primary_key=True)
+    id = Column(String, unique=True, nullable=False)  # "<conversation id>:<chunk index>", also the vector DB id
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), index=True)
+    session_id = Column(String, index=True)  # UUID reference
+    chunk_index = Column(Integer, nullable=False)
+    start_turn = Column(Integer, nullable=False)
+    end_turn = Column(Integer, nullable=False)
+
+class ReindexChunk(Base):
+    # Chunk rows of the vector store generation a reindex is building, with their
+    # tokens; they replace the conversation_chunks and chunk_search rows of their
+    # conversations when the generation becomes active
+    __tablename__ = "reindex_chunks"
+    id = Column(String, primary_key=True)
+    conversation_id = Column(Integer, index=True)
+    session_id = Column(String)
+    chunk_index = Column(Integer, nullable=False)
+    start_turn = Column(Integer, nullable=False)
+    end_turn = Column(Integer, nullable=False)
+    tokens = Column(Text, nullable=False)
+
+# Full-text index of the chunk tokens, used by the cross-session search. Its rowid
+# is the search_id of the chunk in conversation_chunks. It is an FTS5 virtual table,
+# so it is created by the DDL below rather than declared on Base.metadata.
+chunk_search = Table("chunk_search", MetaData(), Column("rowid", Integer, primary_key=True), Column("tokens", Text))
+
+event.listen(
+    Base.metadata, "after_create",
+    DDL("CREATE VIRTUAL TABLE IF NOT EXISTS chunk_search USING fts5(tokens)").execute_if(dialect="sqlite"),
+)
+
+
+def _missing_column(table: str, column: str):
+    """execute_if callable: true when ``table`` exists without ``column``."""
+    def check(ddl, target, bind, **kw):
+        columns = {row[1] for row in bind.exec_driver_sql(f"PRAGMA table_info({table})")}
+        return bool(columns) and column not in columns
+    return check
+
+
+# create_all does not add columns to existing tables: databases created before
+# conversations were keyed by their session_manager id get the column here (SQLite
+# cannot add a UNIQUE column, so uniqueness comes from the index below)
+event.listen(
+    Base.metadata, "after_create",
+    DDL("ALTER TABLE conversations ADD COLUMN external_id VARCHAR").execute_if(
+        dialect="sqlite", callable_=_missing_column("conversations", "external_id")
+    ),
+)
+event.listen(
+    Base.metadata, "after_create",
+    DDL(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_conversations_external_id ON conversations (external_id)"
+    ).execute_if(dialect="sqlite"),
+)
+
+
+def _add_chunk_search_ids(target, connection, **kw):
+    """
+    Rebuild a conversation_chunks table keyed by its id string with an
+    INTEGER PRIMARY KEY. The implicit rowids are copied into it, so the
+    existing chunk_search rows keep pointing at their chunks.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    columns = {row[1] for row in connection.exec_driver_sql("PRAGMA table_info(conversation_chunks)")}
+    if not columns or "search_id" in columns:
+        return
+    connection.exec_driver_sql(
+        "CREATE TABLE conversation_chunks_new ("
+        "search_id INTEGER NOT NULL PRIMARY KEY, id VARCHAR NOT NULL UNIQUE, "
+        "conversation_id INTEGER REFERENCES conversations (id), session_id VARCHAR, "
+        "chunk_index INTEGER NOT NULL, start_turn INTEGER NOT NULL, end_turn INTEGER NOT NULL)"
+    )
+    connection.exec_driver_sql(
+        "INSERT INTO conversation_chunks_new "
+        "SELECT rowid, id, conversation_id, session_id, chunk_index, start_turn, end_turn FROM conversation_chunks"
+    )
+    connection.exec_driver_sql("DROP TABLE conversation_chunks")
+    connection.exec_driver_sql("ALTER TABLE conversation_chunks_new RENAME TO conversation_chunks")
+
+
+event.listen(Base.metadata, "after_create", _add_chunk_search_ids)
+# create_all does not add indexes to existing tables either (nor to a rebuilt one)
+for name, table, column in [
+    ("ix_sessions_created_at", "sessions", "created_at"),
+    ("ix_conversations_session_id", "conversations", "session_id"),
+    ("ix_conversations_created_at", "conversations", "created_at"),
+    ("ix_conversation_chunks_conversation_id", "conversation_chunks", "conversation_id"),
+    ("ix_conversation_chunks_session_id", "conversation_chunks", "session_id"),
+]:
+    event.listen(
+        Base.metadata, "after_create",
+        DDL(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})").execute_if(dialect="sqlite"),
+    )
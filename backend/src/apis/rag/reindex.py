@@ -0,0 +1,301 @@
+"""
+Rebuild the vector store from the conversations stored in SQLite.
+
+Run from the backend directory:
+
+    python -m src.apis.rag.reindex --workers 4
+
+Use it after changing EMBEDDING_MODEL or the chunking settings, or when
+the store is damaged. Conversations are read in pages ordered by id,
+chunked, embedded in parallel batches and written to a new generation of
+the store (a new Chroma collection, or a NumPy directory next to
+NUMPY_VECTOR_PATH). Their chunk rows and tokens are staged in the
+reindex_chunks table, so the live conversation_chunks and full-text rows
+keep matching the active generation. Only one page is held in memory.
+
+After each page a checkpoint records the last conversation id: running the
+command again resumes there (``--restart`` starts over). Once every
+conversation is indexed, including the ones saved during the run, and the
+chunks of the ones deleted meanwhile are removed from the new generation, one
+transaction replaces the chunk and full-text rows of the reindexed
+conversations with the staged ones, then the new generation is made
+active by atomically replacing the store's pointer file; a run interrupted
+between the two finishes the swap when it is started again. The server
+opens the active generation when it starts, so restart it afterwards.
+``--drop-old`` removes the previous generation right after the swap,
+which is only safe with the server stopped.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import google.generativeai as genai
+from chromadb.utils import embedding_functions
+from sqlalchemy import delete, exists, func, insert, select
+
+from ...commons.constants import settings
+from ...commons.database import AsyncSessionLocal, engine
+from . import models
+from .chunking import chunk_transcript
+from .embedding_cache import CachedEmbeddingFunction, EmbeddingCache
+from .retrieval import index_metadata
+from .service import delete_search_rows, request_embeddings
+from .tokenizer import serialize_tokens, tokenize
+from .vector_store import VectorStore, create_vector_store, set_active_generation, store_path
+
+# (vector id, document, metadata)
+Entry = Tuple[str, str, dict]
+
+
+def _new_generation(backend: str) -> str:
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    if backend == "chroma":
+        return f"conversations-{stamp}"
+    return f"{Path(os.path.normpath(store_path(backend))).name}-{stamp}"
+
+
+def _load_checkpoint(path: str, backend: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        state = json.load(f)
+    if state.get("backend") != backend or state.get("embedding_model") != settings.EMBEDDING_MODEL:
+        print(f"Ignoring checkpoint {path}: written for {state.get('backend')} / {state.get('embedding_model')}")
+        return None
+    return state
+
+
+def _save_checkpoint(path: str, state: dict) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _format_eta(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def _embed_and_write(store: VectorStore, cache: EmbeddingCache, batch: List[Entry]) -> None:
+    ids = [doc_id for doc_id, _, _ in batch]
+    documents = [document for _, document, _ in batch]
+    # Batch requests, cached under the same namespace as RagService._embed_documents
+    embeddings = cache.embed(f"{settings.EMBEDDING_MODEL}|RETRIEVAL_DOCUMENT", documents, request_embeddings)
+    store.upsert(ids, embeddings, documents, [metadata for _, _, metadata in batch])
+
+
+async def _index_page(
+    rows, store: VectorStore, cache: EmbeddingCache, executor: ThreadPoolExecutor, batch_size: int
+) -> int:
+    """Index one page of conversations; returns the number of chunks written."""
+    chunks = {
+        row.id: chunk_transcript(row.text, settings.CHUNK_MAX_TOKENS, settings.CHUNK_OVERLAP_TOKENS) for row in rows
+    }
+    tokens = {(row.id, chunk.index): tokenize(chunk.text) for row in rows for chunk in chunks[row.id]}
+    entries: List[Entry] = [
+        (
+            f"{row.id}:{chunk.index}",
+            chunk.text,
+            index_metadata(
+                {"session_id": str(row.session_id), "conversation_id": row.id, "chunk_index": chunk.index},
+                tokens[(row.id, chunk.index)],
+            ),
+        )
+        for row in rows for chunk in chunks[row.id]
+    ]
+
+    # 1. Embed and write the batches in parallel (upserts: a repeated page is harmless)
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(
+        loop.run_in_executor(executor, _embed_and_write, store, cache, entries[i:i + batch_size])
+        for i in range(0, len(entries), batch_size)
+    ))
+
+    # 2. Stage the chunk rows of the new generation, swapped in with it by _swap_chunks
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            delete(models.ReindexChunk).where(models.ReindexChunk.conversation_id.in_([row.id for row in rows]))
+        )
+        staged = [
+            {
+                "id": f"{row.id}:{chunk.index}",
+                "conversation_id": row.id,
+                "session_id": row.session_id,
+                "chunk_index": chunk.index,
+                "start_turn": chunk.start_turn,
+                "end_turn": chunk.end_turn,
+                "tokens": serialize_tokens(tokens[(row.id, chunk.index)]),
+            }
+            for row in rows for chunk in chunks[row.id]
+        ]
+        if staged:
+            await db.execute(insert(models.ReindexChunk), staged)
+        await db.commit()
+    return len(entries)
+
+
+async def _drop_deleted(store: VectorStore) -> int:
+    """Remove the staged chunks and vectors of conversations deleted during the run; returns their number."""
+    staged = models.ReindexChunk
+    deleted = ~exists().where(models.Conversation.id == staged.conversation_id)
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(select(staged.id, staged.conversation_id).where(deleted))).all()
+    if not rows:
+        return 0
+    # Vectors first: a run interrupted here finds the staged rows again
+    store.delete([row.id for row in rows])
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(staged).where(deleted))
+        await db.commit()
+    return len({row.conversation_id for row in rows})
+
+
+async def _swap_chunks() -> None:
+    """
+    Replace the chunk and full-text rows of the staged conversations with
+    the staged ones, in one transaction. Nothing is left staged afterwards,
+    so running it again is harmless.
+    """
+    staged = models.ReindexChunk.__table__
+    chunks = models.ConversationChunk.__table__
+    columns = ["id", "conversation_id", "session_id", "chunk_index", "start_turn", "end_turn"]
+    async with AsyncSessionLocal() as db:
+        condition = models.ConversationChunk.conversation_id.in_(select(staged.c.conversation_id))
+        await delete_search_rows(db, condition)
+        await db.execute(delete(models.ConversationChunk).where(condition))
+        await db.execute(insert(chunks).from_select(columns, select(*(staged.c[column] for column in columns))))
+        # The rowid of a full-text row is the search_id of its chunk
+        await db.execute(insert(models.chunk_search).from_select(
+            ["rowid", "tokens"],
+            select(chunks.c.search_id, staged.c.tokens).select_from(chunks.join(staged, staged.c.id == chunks.c.id)),
+        ))
+        await db.execute(delete(staged))
+        await db.commit()
+
+
+async def reindex(
+    backend: str,
+    page_size: int,
+    batch_size: int,
+    workers: int,
+    checkpoint: str,
+    restart: bool = False,
+    drop_old: bool = False,
+) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+
+    state = None if restart else _load_checkpoint(checkpoint, backend)
+    if state is None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(models.ReindexChunk))  # left by an abandoned run
+            await db.commit()
+        state = {
+            "backend": backend,
+            "embedding_model": settings.EMBEDDING_MODEL,
+            "generation": _new_generation(backend),
+            "last_id": 0,
+            "conversations": 0,
+            "chunks": 0,
+        }
+        _save_checkpoint(checkpoint, state)
+        print(f"Reindexing into {state['generation']}")
+    else:
+        print(f"Resuming {state['generation']} after conversation {state['last_id']}")
+
+    genai.configure(api_key=settings.GOOGLE_API_KEY)
+    cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH or None, settings.EMBEDDING_CACHE_SIZE)
+    # Only used by Chroma as the collection's embedding function, the documents are embedded in batches
+    embed = CachedEmbeddingFunction(
+        embedding_functions.GoogleGenerativeAiEmbeddingFunction(
+            api_key=settings.GOOGLE_API_KEY, model_name=settings.EMBEDDING_MODEL
+        ),
+        cache,
+        f"{settings.EMBEDDING_MODEL}|RETRIEVAL_DOCUMENT",
+    )
+    store = create_vector_store(backend, embed, generation=state["generation"])
+    async with AsyncSessionLocal() as db:
+        total = await db.scalar(select(func.count()).select_from(models.Conversation))
+
+    started = time.perf_counter()
+    indexed = 0
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reindex")
+    try:
+        while True:
+            # Keyset pagination: only the current page is in memory
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(
+                    select(models.Conversation.id, models.Conversation.text, models.Conversation.session_id)
+                    .where(models.Conversation.id > state["last_id"])
+                    .order_by(models.Conversation.id)
+                    .limit(page_size)
+                )).all()
+            if not rows:
+                break
+            chunks = await _index_page(rows, store, cache, executor, batch_size)
+
+            state["last_id"] = rows[-1].id
+            state["conversations"] += len(rows)
+            state["chunks"] += chunks
+            _save_checkpoint(checkpoint, state)
+
+            indexed += len(rows)
+            elapsed = time.perf_counter() - started
+            rate = indexed / elapsed if elapsed else 0.0
+            total = max(total, state["conversations"])  # conversations saved during the run
+            eta = _format_eta((total - state["conversations"]) / rate) if rate else "?"
+            print(
+                f"{state['conversations']}/{total} conversations ({100 * state['conversations'] / total:.0f}%), "
+                f"{state['chunks']} chunks, {rate:.1f} conversations/s, ETA {eta}"
+            )
+    finally:
+        executor.shutdown(wait=True)
+        cache.close()
+
+    deleted = await _drop_deleted(store)
+    if deleted:
+        print(f"Removed {deleted} conversations deleted during the run")
+
+    path = store_path(backend)
+    previous = create_vector_store(backend) if drop_old else None
+    await _swap_chunks()
+    set_active_generation(path, state["generation"])
+    os.remove(checkpoint)
+    print(
+        f"Active generation: {state['generation']} ({state['conversations']} conversations, "
+        f"{state['chunks']} chunks, {time.perf_counter() - started:.0f} s). Restart the server to use it."
+    )
+    if previous is not None:
+        previous.drop()
+        print("Dropped the previous generation")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default=settings.VECTOR_STORE, choices=["chroma", "numpy"])
+    parser.add_argument("--page-size", type=int, default=200, help="conversations read per page")
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE, help="chunks per embedding call")
+    parser.add_argument("--workers", type=int, default=4, help="embedding batches in flight")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <store path>.reindex.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start a new generation")
+    parser.add_argument("--drop-old", action="store_true", help="remove the previous generation after the swap")
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or f"{os.path.normpath(store_path(args.backend))}.reindex.json"
+    asyncio.run(reindex(
+        args.backend, args.page_size, args.batch_size, args.workers, checkpoint, args.restart, args.drop_old
+    ))
+
+
+if __name__ == "__main__":
+    main()
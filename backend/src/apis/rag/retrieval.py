@@ -0,0 +1,387 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from ...commons.constants import settings
+from .bm25_index import BM25IndexManager, Documents
+from .fusion import reciprocal_rank_fusion, weighted_fusion
+from .tokenizer import TOKENIZER_VERSION, deserialize_tokens, serialize_tokens, tokenize
+from .vector_store import VectorHit, VectorStore
+
+# (doc_id, score) pairs, best first
+Ranking = List[Tuple[str, float]]
+
+
+# --- Ingestion ---
+
+def index_metadata(metadata: dict, tokens: List[str]) -> dict:
+    """Metadata stored with a document: the caller's, plus the tokens computed at ingestion."""
+    return {**metadata, "tokens": serialize_tokens(tokens), "tokenizer": TOKENIZER_VERSION}
+
+
+def stored_tokens(document: str, metadata: dict) -> List[str]:
+    """Tokens of a stored document; only documents indexed by an older tokenizer are tokenized again."""
+    if metadata.get("tokenizer") == TOKENIZER_VERSION and "tokens" in metadata:
+        return deserialize_tokens(metadata["tokens"])
+    return tokenize(document)
+
+
+def session_loader(vector_store: VectorStore) -> Callable[[str], Documents]:
+    """BM25 index loader reading a session's stored tokens from the vector store."""
+    def load(session_id: str) -> Documents:
+        return [
+            (doc_id, stored_tokens(document, metadata))
+            for doc_id, document, metadata in vector_store.session_documents(session_id)
+        ]
+    return load
+
+
+# --- Query state ---
+
+class QueryContext:
+    """
+    One retrieval request, shared by the stages of the pipeline.
+
+    The query is tokenized once and embedded at most once, whichever stages
+    use it, and documents returned by a stage are kept so they are not
+    fetched again. ``timings`` holds the milliseconds spent in each stage,
+    excluding the nested stages it triggered (e.g. "embed_query").
+    """
+
+    def __init__(
+        self,
+        query: str,
+        session_ids: Optional[List[str]],
+        top_k: int,
+        embed_query: Callable[[str], Sequence[float]],
+        fetch_documents: Callable[[List[str]], Dict[str, str]],
+        embedding: Optional[Sequence[float]] = None,
+    ):
+        self.query = query
+        self.session_ids = session_ids
+        self.top_k = top_k
+        self.tokens = tokenize(query)
+        self.documents: Dict[str, str] = {}
+        self.timings: Dict[str, float] = {}
+        self._embed_query = embed_query
+        self._fetch_documents = fetch_documents
+        self._embedding = embedding  # computed by the caller, e.g. in a batch
+        self._nested: List[float] = []
+
+    @property
+    def embedding(self) -> Sequence[float]:
+        if self._embedding is None:
+            with self.timed("embed_query"):
+                self._embedding = self._embed_query(self.query)
+        return self._embedding
+
+    def fetch(self, doc_ids: List[str]) -> Dict[str, str]:
+        """Return the documents of ``doc_ids``, loading the ones no stage has returned yet."""
+        missing = [doc_id for doc_id in doc_ids if doc_id not in self.documents]
+        if missing:
+            with self.timed("fetch"):
+                self.documents.update(self._fetch_documents(missing))
+        return {doc_id: self.documents[doc_id] for doc_id in doc_ids if doc_id in self.documents}
+
+    @contextmanager
+    def timed(self, stage: str):
+        started = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = self._nested.pop()
+            self.timings[stage] = self.timings.get(stage, 0.0) + (elapsed - nested) * 1000
+            if self._nested:
+                self._nested[-1] += elapsed
+
+
+# --- Pipeline stages ---
+
+class CandidateGenerator(ABC):
+    """Ranks candidate documents for a query."""
+
+    name: str
+
+    @abstractmethod
+    def generate(self, context: QueryContext, n: int) -> Ranking:
+        ...
+
+    def generate_many(self, contexts: List[QueryContext], n: int) -> List[Ranking]:
+        """Rankings of several queries; generators override it to share work between them."""
+        return [self.generate(context, n) for context in contexts]
+
+
+class DenseGenerator(CandidateGenerator):
+    """Nearest neighbours of the query embedding in the vector store."""
+
+    name = "dense"
+
+    def __init__(self, vector_store: VectorStore):
+        self.vector_store = vector_store
+
+    def generate(self, context: QueryContext, n: int) -> Ranking:
+        return self._ranking(context, self.vector_store.query(context.embedding, n, context.session_ids))
+
+    def generate_many(self, contexts: List[QueryContext], n: int) -> List[Ranking]:
+        # One vector store query when the queries share their sessions (a batch)
+        if len({None if context.session_ids is None else tuple(context.session_ids) for context in contexts}) > 1:
+            return super().generate_many(contexts, n)
+        embeddings = [context.embedding for context in contexts]
+        hits = self.vector_store.query_many(embeddings, n, contexts[0].session_ids)
+        return [self._ranking(context, query_hits) for context, query_hits in zip(contexts, hits)]
+
+    @staticmethod
+    def _ranking(context: QueryContext, hits: List[VectorHit]) -> Ranking:
+        for hit in hits:
+            context.documents[hit.id] = hit.document
+        # Cosine distance (0 is identical), converted to a similarity
+        return [(hit.id, 1.0 - hit.distance) for hit in hits]
+
+
+class GlobalDenseGenerator(DenseGenerator):
+    """
+    Dense candidates of a cross-session query: one search of the whole
+    store, the query's ``session_ids`` filtering the hits instead of
+    scoping the search (a filter may match thousands of sessions).
+    """
+
+    def generate(self, context: QueryContext, n: int) -> Ranking:
+        session_filter = None if context.session_ids is None else set(context.session_ids)
+        return self._ranking(context, self.vector_store.query_global(context.embedding, n, session_filter))
+
+    def generate_many(self, contexts: List[QueryContext], n: int) -> List[Ranking]:
+        return [self.generate(context, n) for context in contexts]
+
+
+class LexicalGenerator(CandidateGenerator):
+    """BM25 over the whole corpus of each queried session."""
+
+    name = "lexical"
+
+    def __init__(self, bm25_index: BM25IndexManager):
+        self.bm25_index = bm25_index
+
+    def generate(self, context: QueryContext, n: int) -> Ranking:
+        # Lexical indexes are per session: an unrestricted query has no lexical candidates
+        if not context.tokens or context.session_ids is None:
+            return []
+        ranking: Ranking = []
+        for session_id in context.session_ids:
+            ranking.extend(self.bm25_index.search(session_id, context.tokens, n))
+        ranking.sort(key=lambda item: item[1], reverse=True)
+        return ranking[:n]
+
+
+class Fuser(ABC):
+    """Merges the rankings of the generators, keyed by generator name."""
+
+    @abstractmethod
+    def fuse(self, rankings: Dict[str, Ranking]) -> Ranking:
+        ...
+
+
+class RRFFuser(Fuser):
+    def __init__(self, k: int = 60):
+        self.k = k
+
+    def fuse(self, rankings: Dict[str, Ranking]) -> Ranking:
+        return reciprocal_rank_fusion([[doc_id for doc_id, _ in ranking] for ranking in rankings.values()], k=self.k)
+
+
+class WeightedFuser(Fuser):
+    def __init__(self, weights: Dict[str, float]):
+        self.weights = weights
+
+    def fuse(self, rankings: Dict[str, Ranking]) -> Ranking:
+        names = list(rankings)
+        return weighted_fusion([dict(rankings[name]) for name in names], [self.weights.get(name, 0.0) for name in names])
+
+
+class Scorer(ABC):
+    """Re-scores, re-orders or filters the fused candidates (re-rankers, diversification)."""
+
+    name: str
+
+    @abstractmethod
+    def score(self, context: QueryContext, ranking: Ranking) -> Ranking:
+        ...
+
+
+# --- Engine ---
+
+class RetrievalResult(BaseModel):
+    ids: List[str]
+    documents: List[Optional[str]]  # None when not fetched (fetch_documents=False)
+    scores: List[float]
+    timings: Dict[str, float]  # milliseconds per stage, plus "total"
+
+
+class RetrievalEngine:
+    """
+    Hybrid retrieval pipeline: candidate generators, then a fuser, then scorers.
+
+    Each generator ranks ``candidate_factor * top_k`` candidates, the fuser
+    merges their rankings and the scorers re-rank the fused list in turn.
+    Documents no stage returned are fetched for the final ``top_k`` only.
+    Every stage is timed: a result carries the breakdown of its query and
+    ``metrics()`` the average per stage over all queries. Safe to use from
+    several threads.
+    """
+
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        embed_query: Callable[[str], Sequence[float]],
+        generators: List[CandidateGenerator],
+        fuser: Fuser,
+        scorers: Sequence[Scorer] = (),
+        candidate_factor: int = 2,
+    ):
+        self.vector_store = vector_store
+        self.embed_query = embed_query
+        self.generators = list(generators)
+        self.fuser = fuser
+        self.scorers = list(scorers)
+        self.candidate_factor = candidate_factor
+        self._queries = 0
+        self._totals: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def search(
+        self,
+        query: str,
+        session_ids: Optional[List[str]],
+        top_k: int,
+        rankings: Optional[Dict[str, Ranking]] = None,
+        fetch_documents: bool = True,
+    ) -> RetrievalResult:
+        """
+        Return the ``top_k`` best documents of the given sessions (all sessions if None).
+
+        ``rankings`` are fused along with the generators' own, for candidates
+        computed outside the engine (e.g. by an async database query). With
+        ``fetch_documents=False`` only the documents the stages returned are
+        filled in, so the caller can load the others when it needs them.
+        """
+        started = time.perf_counter()
+        context = self._context(query, session_ids, top_k)
+
+        rankings = dict(rankings or {})
+        for generator in self.generators:
+            with context.timed(generator.name):
+                rankings[generator.name] = generator.generate(context, top_k * self.candidate_factor)
+        return self._finish(context, rankings, fetch_documents, started)
+
+    def search_many(
+        self,
+        queries: List[str],
+        session_ids: Optional[List[str]],
+        top_k: int,
+        embeddings: Optional[List[Sequence[float]]] = None,
+        fetch_documents: bool = True,
+    ) -> List[RetrievalResult]:
+        """
+        ``search`` for several queries of the same sessions, one result per query.
+
+        Each generator ranks the candidates of all the queries at once (the
+        dense generator with a single vector store query); its time is split
+        evenly between the queries. ``embeddings`` of the queries computed in
+        one call by the caller are used as is, otherwise each query is
+        embedded on its own.
+        """
+        started = time.perf_counter()
+        contexts = [
+            self._context(query, session_ids, top_k, embeddings[i] if embeddings is not None else None)
+            for i, query in enumerate(queries)
+        ]
+        if not contexts:
+            return []
+        if embeddings is None:
+            for context in contexts:
+                context.embedding  # embedded and timed now, not inside the shared generator calls
+
+        rankings: List[Dict[str, Ranking]] = [{} for _ in contexts]
+        for generator in self.generators:
+            generator_started = time.perf_counter()
+            batch = generator.generate_many(contexts, top_k * self.candidate_factor)
+            share = (time.perf_counter() - generator_started) * 1000 / len(contexts)
+            for context, context_rankings, ranking in zip(contexts, rankings, batch):
+                context_rankings[generator.name] = ranking
+                context.timings[generator.name] = context.timings.get(generator.name, 0.0) + share
+        return [
+            self._finish(context, context_rankings, fetch_documents, started)
+            for context, context_rankings in zip(contexts, rankings)
+        ]
+
+    def _context(
+        self, query: str, session_ids: Optional[List[str]], top_k: int, embedding: Optional[Sequence[float]] = None
+    ) -> QueryContext:
+        return QueryContext(
+            query,
+            None if session_ids is None else [str(session_id) for session_id in session_ids],  # UUIDs as strings
+            top_k,
+            self.embed_query,
+            self.vector_store.get,
+            embedding,
+        )
+
+    def _finish(
+        self, context: QueryContext, rankings: Dict[str, Ranking], fetch_documents: bool, started: float
+    ) -> RetrievalResult:
+        """Fuse and re-score the generators' rankings, then fetch the documents of the top_k."""
+        with context.timed("fuse"):
+            ranking = self.fuser.fuse(rankings)
+        for scorer in self.scorers:
+            with context.timed(scorer.name):
+                ranking = scorer.score(context, ranking)
+        ranking = ranking[:context.top_k]
+
+        if fetch_documents:
+            documents = context.fetch([doc_id for doc_id, _ in ranking])
+            ranking = [(doc_id, score) for doc_id, score in ranking if doc_id in documents]
+        else:
+            documents = context.documents
+        context.timings["total"] = (time.perf_counter() - started) * 1000
+        self._record(context.timings)
+
+        return RetrievalResult(
+            ids=[doc_id for doc_id, _ in ranking],
+            documents=[documents.get(doc_id) for doc_id, _ in ranking],
+            scores=[score for _, score in ranking],
+            timings={stage: round(ms, 3) for stage, ms in context.timings.items()},
+        )
+
+    def _record(self, timings: Dict[str, float]) -> None:
+        with self._lock:
+            self._queries += 1
+            for stage, ms in timings.items():
+                self._totals[stage] = self._totals.get(stage, 0.0) + ms
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "queries": self._queries,
+                "avg_ms": {stage: round(total / self._queries, 3) for stage, total in self._totals.items()},
+            }
+
+
+def create_retrieval_engine(
+    vector_store: VectorStore, bm25_index: BM25IndexManager, embed_query: Callable[[str], Sequence[float]]
+) -> RetrievalEngine:
+    """Dense and lexical generators fused as configured by RAG_FUSION."""
+    if settings.RAG_FUSION == "weighted":
+        fuser = WeightedFuser({"dense": settings.RAG_VECTOR_WEIGHT, "lexical": settings.RAG_BM25_WEIGHT})
+    else:
+        fuser = RRFFuser(settings.RAG_RRF_K)
+    return RetrievalEngine(
+        vector_store,
+        embed_query,
+        generators=[DenseGenerator(vector_store), LexicalGenerator(bm25_index)],
+        fuser=fuser,
+    )
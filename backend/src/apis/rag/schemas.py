@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 # Request Models
@@ -11,6 +11,7 @@ class SessionCreate(BaseModel):
 class ConversationCreate(BaseModel):
     conv_text: str
     session_id: str  # UUID
+    conversation_id: Optional[str] = None  # Idempotency key (session_manager conversation_id)
 
 class QueryRequest(BaseModel):
     query: str
@@ -25,10 +26,78 @@ class SessionResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class SessionPage(BaseModel):
+    items: List[SessionResponse]
+    next_cursor: Optional[str] = None
+
 class ConversationResponse(BaseModel):
     id: int
     text: str
     session_id: str  # UUID
     created_at: datetime
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class SearchHit(BaseModel):
+    chunk_id: str
+    conversation_id: Optional[str] = None  # session_manager conversation_id
+    text: str
+    score: float
+
+class SearchGroup(BaseModel):
+    session_id: str  # UUID
+    session_name: Optional[str] = None
+    created_at: Optional[datetime] = None
+    score: float  # score of the best hit
+    hits: List[SearchHit]
+
+class SearchPage(BaseModel):
+    groups: List[SearchGroup] = []
+    next_cursor: Optional[str] = None
+    timings: Dict[str, float] = {}  # milliseconds per retrieval stage
+
+# --- /rag/initial_query events ---
+
+class AnswerContext(BaseModel):
+    passages: int  # passages sent to the LLM
+    tokens: int  # estimated tokens of the passages
+    candidate_tokens: int  # estimated tokens retrieved before packing
+    duplicates: int
+    over_budget: int
+
+class AnswerToken(BaseModel):
+    text: str
+
+class AnswerDone(BaseModel):
+    ttfb_ms: Optional[float] = None  # from the request to the first token, None without tokens
+    tokens: int  # estimated tokens of the answer
+    tokens_per_second: float  # after the first token
+    duration_ms: float
+
+# --- /rag/batch_query events: the /rag/initial_query events, tagged with their question ---
+
+class BatchQuestion(BaseModel):
+    id: Optional[str] = None  # defaults to the question's position
+    query: str
+
+class BatchQueryRequest(BaseModel):
+    session_id: str
+    questions: List[BatchQuestion]
+
+class BatchAnswerContext(AnswerContext):
+    question_id: str
+
+class BatchAnswerToken(AnswerToken):
+    question_id: str
+
+class BatchAnswerDone(AnswerDone):
+    question_id: str
+
+class BatchAnswerError(BaseModel):
+    question_id: str
+    detail: str
+
+class BatchDone(BaseModel):
+    questions: int
+    failed: int
+    duration_ms: float
@@ -0,0 +1,93 @@
+import asyncio
+import secrets
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# (chunk id, conversation id, score) of a hit of a group
+GroupHit = Tuple[str, Optional[str], float]
+# (session id, best score, hits), best session first
+Group = Tuple[str, float, List[GroupHit]]
+
+
+class SearchState:
+    """
+    Ranking of a cross-session search, kept between the pages served from it.
+
+    ``groups`` holds the ranked sessions. They come from the ``depth`` best
+    candidates of each retriever; when too few are left for a page, the
+    search ranks deeper candidates (``complete`` once the retrievers have
+    nothing more) and regroups them. The first ``served`` groups have been
+    returned in a page and no longer change, so a page asked for again is
+    served identically. A search resumed from an expired cursor skips the
+    sessions ranked before ``after``.
+    """
+
+    def __init__(self, key: str, after: Optional[Tuple[float, str]] = None):
+        self.key = key
+        self.after = after
+        self.depth = 0
+        self.complete = False
+        self.session_ids: Optional[List[str]] = None  # sessions matching the filters, None without filters
+        self.groups: List[Group] = []
+        self.served = 0
+        self.lock = asyncio.Lock()
+
+    def regroup(self, ordered: List[Group]) -> None:
+        """Replace the groups not served yet with ``ordered`` (a deeper ranking of the search)."""
+        served = self.groups[:self.served]
+        sessions = {session_id for session_id, _, _ in served}
+        self.groups = served + [
+            (session_id, best, hits) for session_id, best, hits in ordered
+            if session_id not in sessions
+            and (self.after is None or (-best, session_id) > (-self.after[0], self.after[1]))
+        ]
+
+    def page(self, offset: int, limit: int) -> Tuple[List[Group], bool]:
+        """Groups ``offset`` to ``offset + limit``, and whether more may follow."""
+        page = self.groups[offset:offset + limit]
+        self.served = max(self.served, offset + len(page))
+        return page, len(self.groups) > offset + len(page) or not self.complete
+
+
+class SearchCursors:
+    """
+    States of the cross-session searches being paged through, by cursor id.
+
+    At most ``max_entries`` states are kept, for ``ttl`` seconds after their
+    last page (0 keeps them until evicted). A cursor whose state is gone is
+    resumed from the key of its last group instead.
+
+    Not thread-safe: use it from the event loop.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._states: "OrderedDict[str, Tuple[float, SearchState]]" = OrderedDict()
+
+    def get(self, cursor_id: str, key: str) -> Optional[SearchState]:
+        """State of ``cursor_id``, if it is still kept and was created for the same search ``key``."""
+        entry = self._states.get(cursor_id)
+        if entry is None:
+            return None
+        used_at, state = entry
+        if self.ttl and time.monotonic() - used_at > self.ttl:
+            del self._states[cursor_id]
+            return None
+        if state.key != key:
+            return None
+        self._states[cursor_id] = (time.monotonic(), state)
+        self._states.move_to_end(cursor_id)
+        return state
+
+    def create(self, key: str, after: Optional[Tuple[float, str]] = None) -> Tuple[str, SearchState]:
+        cursor_id = secrets.token_urlsafe(12)
+        state = SearchState(key, after)
+        self._states[cursor_id] = (time.monotonic(), state)
+        while len(self._states) > self.max_entries:
+            self._states.popitem(last=False)
+        return cursor_id, state
+
+    def clear(self) -> None:
+        self._states.clear()
@@ -1,14 +1,100 @@
+import asyncio
+import base64
+import contextlib
+import functools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import google.generativeai as genai
-import chromadb
 from chromadb.utils import embedding_functions
+from sqlalchemy import bindparam, delete, func, insert, literal_column, tuple_
 from sqlalchemy.future import select
-from rank_bm25 import BM25Okapi
-import numpy as np
-from typing import Optional
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Union
 
 from ...commons.database import AsyncSessionLocal
 from ...commons.constants import settings
 from . import models, schemas
+from .embedding_queue import EmbeddingQueue
+from .embedding_cache import EmbeddingCache, CachedEmbeddingFunction
+from .bm25_index import BM25IndexManager
+from .chunking import chunk_transcript, count_tokens
+from .context import ContextPacker, PackedContext
+from .answer_cache import AnswerCache
+from .search_cursor import SearchCursors, SearchState
+from .sse import StreamMetrics
+from .vector_store import create_vector_store
+from .tokenizer import serialize_tokens, tokenize
+from .retrieval import GlobalDenseGenerator, RetrievalEngine, create_retrieval_engine, index_metadata, session_loader
+
+# Maximum number of texts in one Gemini batch embedding request
+EMBED_REQUEST_LIMIT = 100
+
+# Columns of a SessionResponse, selected as rows instead of loading ORM objects
+SESSION_COLUMNS = (models.Session.id, models.Session.name, models.Session.description, models.Session.created_at)
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Naive UTC datetime, as stored in created_at columns."""
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+async def insert_chunks(db, convs, chunks: dict, tokens: dict) -> None:
+    """Bulk insert the conversation_chunks rows of ``convs`` and their full-text rows.
+
+    ``chunks`` maps conversation ids to their chunks and ``tokens`` maps
+    (conversation id, chunk index) to the chunk's tokens.
+    """
+    chunk_rows = [
+        {
+            "id": f"{conv.id}:{chunk.index}",
+            "conversation_id": conv.id,
+            "session_id": conv.session_id,
+            "chunk_index": chunk.index,
+            "start_turn": chunk.start_turn,
+            "end_turn": chunk.end_turn,
+        }
+        for conv in convs for chunk in chunks[conv.id]
+    ]
+    if not chunk_rows:
+        return
+    await db.execute(insert(models.ConversationChunk), chunk_rows)
+    # The rowid of a full-text row is the search_id of its chunk
+    await db.execute(
+        insert(models.chunk_search).from_select(
+            ["rowid", "tokens"],
+            select(models.ConversationChunk.search_id, bindparam("tokens"))
+            .where(models.ConversationChunk.id == bindparam("chunk_id")),
+        ),
+        [
+            {"chunk_id": f"{conv.id}:{chunk.index}", "tokens": serialize_tokens(tokens[(conv.id, chunk.index)])}
+            for conv in convs for chunk in chunks[conv.id]
+        ],
+    )
+
+
+def request_embeddings(texts: list[str], task_type: str = "retrieval_document") -> list[list[float]]:
+    """Embed texts with batch requests (the Chroma embedding function sends one request per text)."""
+    embeddings = []
+    for i in range(0, len(texts), EMBED_REQUEST_LIMIT):
+        result = genai.embed_content(
+            model=settings.EMBEDDING_MODEL,
+            content=texts[i:i + EMBED_REQUEST_LIMIT],
+            task_type=task_type,
+        )
+        embeddings.extend(result["embedding"])
+    return embeddings
+
+
+async def delete_search_rows(db, condition) -> None:
+    """Remove the full-text rows of the chunks matching ``condition`` (before the chunks themselves)."""
+    await db.execute(
+        delete(models.chunk_search).where(
+            models.chunk_search.c.rowid.in_(select(models.ConversationChunk.search_id).where(condition))
+        )
+    )
+
 
 class RagService:
     def __init__(self):
@@ -16,16 +102,89 @@ class RagService:
         genai.configure(api_key=settings.GOOGLE_API_KEY)
         self.llm_model = genai.GenerativeModel(settings.GEMINI_MODEL)
         
-        # 2. Initialize Vector DB (Chroma)
-        self.chroma_client = chromadb.PersistentClient(path=settings.VECTOR_DB_PATH)
-        self.embedding_fn = embedding_functions.GoogleGenerativeAiEmbeddingFunction(
-            api_key=settings.GOOGLE_API_KEY,
-            model_name=settings.EMBEDDING_MODEL
+        # 2. Initialize Vector DB (Chroma or the in-process NumPy store)
+        # Documents and queries are embedded with their own task type, each cached in its namespace
+        self.embedding_cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH or None, settings.EMBEDDING_CACHE_SIZE)
+        self.embedding_namespace = f"{settings.EMBEDDING_MODEL}|RETRIEVAL_DOCUMENT"
+        self.query_namespace = f"{settings.EMBEDDING_MODEL}|RETRIEVAL_QUERY"
+        self.embedding_fn = CachedEmbeddingFunction(
+            embedding_functions.GoogleGenerativeAiEmbeddingFunction(
+                api_key=settings.GOOGLE_API_KEY,
+                model_name=settings.EMBEDDING_MODEL
+            ),
+            self.embedding_cache,
+            self.embedding_namespace,
         )
-        self.collection = self.chroma_client.get_or_create_collection(
-            name="conversations",
-            embedding_function=self.embedding_fn
+        self.vector_store = create_vector_store(settings.VECTOR_STORE, self.embedding_fn)
+        
+        # 3. Documents are embedded and written to the vector DB in micro-batches
+        self.embedding_queue = EmbeddingQueue(
+            embed=self._embed_documents,
+            write=self._write_vectors,
+            max_batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_wait=settings.EMBEDDING_BATCH_WAIT,
+            max_pending=settings.EMBEDDING_QUEUE_SIZE,
+            min_interval=settings.EMBEDDING_MIN_INTERVAL,
+        )
+        
+        # 4. Blocking calls (vector DB queries, sync LLM clients) run here, never on the event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.RAG_EXECUTOR_WORKERS, thread_name_prefix="rag-executor"
+        )
+        
+        # 5. Lexical search: per-session BM25 indexes over the tokens stored in the vector DB
+        self.bm25_index = BM25IndexManager(
+            loader=session_loader(self.vector_store),
+            max_sessions=settings.BM25_MAX_SESSIONS,
+            k1=settings.BM25_K1,
+            b=settings.BM25_B,
+        )
+        
+        # 6. Hybrid retrieval: dense and lexical candidates, fused
+        self.retrieval = create_retrieval_engine(self.vector_store, self.bm25_index, self._embed_query)
+        # Retrieved passages are packed into a token budget before they reach the prompt
+        self.context_packer = ContextPacker(
+            max_tokens=settings.RAG_CONTEXT_MAX_TOKENS,
+            dedupe_threshold=settings.RAG_DEDUPE_THRESHOLD,
+            mmr_lambda=settings.RAG_MMR_LAMBDA,
+            embeddings=self.vector_store.get_embeddings,  # stored at ingestion, never embedded again
         )
+        # Answers to the same question over the same context are generated once
+        self.answer_cache = AnswerCache(settings.RAG_ANSWER_CACHE_SIZE, settings.RAG_ANSWER_CACHE_TTL)
+        self.stream_metrics = StreamMetrics()
+        # Cross-session search: lexical candidates come from the chunk_search full-text index
+        self.global_retrieval = RetrievalEngine(
+            self.vector_store, self._embed_query, [GlobalDenseGenerator(self.vector_store)], self.retrieval.fuser,
+            candidate_factor=1,
+        )
+        # Rankings of the searches being paged through, so a page does not rank the search again
+        self.search_cursors = SearchCursors(settings.SEARCH_CURSOR_CACHE_SIZE, settings.SEARCH_CURSOR_TTL)
+
+    def _embed_documents(self, texts: list[str]) -> list:
+        """Embed documents, only sending the texts missing from the cache to the provider."""
+        return self.embedding_cache.embed(self.embedding_namespace, texts, request_embeddings)
+
+    def _embed_queries(self, texts: list[str]) -> list:
+        """Embed questions like ``_embed_documents``, with the query task type."""
+        return self.embedding_cache.embed(
+            self.query_namespace, texts, functools.partial(request_embeddings, task_type="retrieval_query")
+        )
+
+    def _embed_query(self, text: str) -> list[float]:
+        return self._embed_queries([text])[0]
+
+    def _write_vectors(self, ids: list[str], embeddings: list, documents: list[str], metadatas: list[dict]) -> None:
+        # Upsert keeps retries idempotent
+        self.vector_store.upsert(ids, embeddings, documents, metadatas)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.embedding_cache.close()
+
+    async def _run_blocking(self, fn, *args, **kwargs):
+        """Run a blocking call on the bounded RAG executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
 
     # --- Persistence Methods ---
 
@@ -37,6 +196,11 @@ class RagService:
             final_session_id = str(uuid.uuid4())
         
         async with AsyncSessionLocal() as db:
+            # Creating the same session twice is a no-op (retries from the ingestion outbox)
+            existing = await db.get(models.Session, final_session_id)
+            if existing:
+                return existing
+            
             session = models.Session(
                 id=final_session_id,  # Use UUID as primary key
                 name=data.session_name, 
@@ -47,108 +211,524 @@ class RagService:
             await db.refresh(session)
             return session
 
-    async def get_all_sessions(self) -> list[models.Session]:
-        """Get all sessions from RAG database."""
+    async def get_all_sessions(self) -> list[schemas.SessionResponse]:
+        """Get all sessions from RAG database (plain rows, not ORM objects)."""
         async with AsyncSessionLocal() as db:
-            result = await db.execute(select(models.Session))
-            sessions = result.scalars().all()
-            return list(sessions)
+            result = await db.execute(select(*SESSION_COLUMNS))
+            return [schemas.SessionResponse.model_validate(row) for row in result]
+
+    async def list_sessions(self, limit: int = 50, cursor: Optional[str] = None) -> schemas.SessionPage:
+        """List sessions, most recently created first, keyset-paginated on (created_at, id).
+
+        Raises ValueError for an invalid cursor.
+        """
+        stmt = select(*SESSION_COLUMNS).order_by(models.Session.created_at.desc(), models.Session.id.desc())
+        if cursor:
+            created_at, session_id = self._decode_session_cursor(cursor)
+            stmt = stmt.where(tuple_(models.Session.created_at, models.Session.id) < (created_at, session_id))
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(stmt.limit(limit + 1))).all()
+        items = [schemas.SessionResponse.model_validate(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = self._encode_cursor((items[-1].created_at.isoformat(), items[-1].id))
+        return schemas.SessionPage(items=items, next_cursor=next_cursor)
 
     async def delete_all_sessions(self) -> int:
         """Delete all sessions from RAG database (hard delete)."""
         async with AsyncSessionLocal() as db:
-            # Get all sessions first to count
-            result = await db.execute(select(models.Session))
-            sessions = result.scalars().all()
-            count = len(sessions)
-            
-            # Delete all sessions (cascades to conversations)
-            for session in sessions:
-                await db.delete(session)
+            count = await db.scalar(select(func.count()).select_from(models.Session))
             
+            # Bulk statements instead of loading and deleting every row
+            await db.execute(delete(models.chunk_search))
+            await db.execute(delete(models.ConversationChunk))
+            await db.execute(delete(models.Conversation))
+            await db.execute(delete(models.Session))
             await db.commit()
-            
-            # Also clear the vector database collection
-            try:
-                # Delete all documents from ChromaDB collection
-                # Note: ChromaDB doesn't have a direct "delete all" method
-                # We need to get all IDs and delete them
-                all_docs = self.collection.get()
-                if all_docs and all_docs.get('ids'):
-                    self.collection.delete(ids=all_docs['ids'])
-            except Exception as e:
-                print(f"Warning: Failed to clear vector database: {e}")
-            
-            return count
+        
+        # Also clear the vector database
+        await self._run_blocking(self.vector_store.clear)
+        await self._run_blocking(self.bm25_index.clear)
+        self.answer_cache.clear()
+        self.search_cursors.clear()
+        
+        return count
+
+    async def delete_sessions(self, session_ids: list[str]) -> int:
+        """Delete sessions with their conversations and vectors (hard delete)."""
+        if not session_ids:
+            return 0
+        async with AsyncSessionLocal() as db:
+            await delete_search_rows(db, models.ConversationChunk.session_id.in_(session_ids))
+            await db.execute(delete(models.ConversationChunk).where(models.ConversationChunk.session_id.in_(session_ids)))
+            await db.execute(delete(models.Conversation).where(models.Conversation.session_id.in_(session_ids)))
+            result = await db.execute(delete(models.Session).where(models.Session.id.in_(session_ids)))
+            await db.commit()
+        
+        await self._run_blocking(self.vector_store.delete_sessions, [str(session_id) for session_id in session_ids])
+        await self._run_blocking(self.bm25_index.drop, [str(session_id) for session_id in session_ids])
+        for session_id in session_ids:
+            self.answer_cache.invalidate_session(session_id)
+        return result.rowcount
+
+    async def delete_conversations(self, conversation_ids: list[str]) -> int:
+        """Delete conversations and their vectors by session_manager conversation_id.
+
+        Vectors are deleted before the rows: if that fails, the rows are still
+        there for a retry to find them (deleting absent vectors is harmless).
+        """
+        if not conversation_ids:
+            return 0
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(models.Conversation.id, models.Conversation.session_id)
+                .where(models.Conversation.external_id.in_(conversation_ids))
+            )).all()
+            row_ids = [row_id for row_id, _ in rows]
+            chunk_rows = (await db.execute(
+                select(models.ConversationChunk.id, models.ConversationChunk.session_id)
+                .where(models.ConversationChunk.conversation_id.in_(row_ids))
+            )).all()
+
+        # Conversations indexed before chunking have a single vector under their own id
+        vector_ids = {}
+        for vector_id, session_id in [(str(row_id), session_id) for row_id, session_id in rows] + chunk_rows:
+            vector_ids.setdefault(str(session_id), []).append(vector_id)
+        if vector_ids:
+            await self._run_blocking(self.vector_store.delete, [vector_id for ids in vector_ids.values() for vector_id in ids])
+
+        async with AsyncSessionLocal() as db:
+            await delete_search_rows(db, models.ConversationChunk.conversation_id.in_(row_ids))
+            await db.execute(delete(models.ConversationChunk).where(models.ConversationChunk.conversation_id.in_(row_ids)))
+            await db.execute(delete(models.Conversation).where(models.Conversation.id.in_(row_ids)))
+            await db.commit()
+
+        # After the rows are gone, so a BM25 index loaded meanwhile cannot bring them back
+        for session_id, ids in vector_ids.items():
+            await self._run_blocking(self.bm25_index.remove, session_id, ids)
+            self.answer_cache.invalidate_session(session_id)
+        return len(rows)
 
     async def save_conversation(self, data: schemas.ConversationCreate) -> models.Conversation:
+        return (await self.save_conversations([data]))[0]
+
+    async def save_conversations(self, items: list[schemas.ConversationCreate]) -> list[models.Conversation]:
+        """Save and index several conversations with one commit and one vector DB call.
+
+        Transcripts are indexed as chunks of speaker turns; the chunk to
+        conversation mapping is stored in conversation_chunks. Items carrying a
+        conversation_id that is already stored are not inserted again.
+        """
         async with AsyncSessionLocal() as db:
-            # 1. Save to SQLite
-            conv = models.Conversation(text=data.conv_text, session_id=data.session_id)
-            db.add(conv)
+            # 1. Save to SQLite (skipping already ingested idempotency keys)
+            keys = [item.conversation_id for item in items if item.conversation_id]
+            existing = {}
+            if keys:
+                result = await db.execute(
+                    select(models.Conversation).where(models.Conversation.external_id.in_(keys))
+                )
+                existing = {conv.external_id: conv for conv in result.scalars().all()}
+
+            # Each item maps to a stored conversation or to its position among the new rows
+            slots, rows = [], []
+            for item in items:
+                slot = existing.get(item.conversation_id) if item.conversation_id else None
+                if slot is None:
+                    slot = len(rows)
+                    rows.append({"text": item.conv_text, "session_id": item.session_id, "external_id": item.conversation_id})
+                    if item.conversation_id:
+                        existing[item.conversation_id] = slot
+                slots.append(slot)
+            # One bulk INSERT ... RETURNING, which assigns the ids the chunk ids are built from
+            created = []
+            if rows:
+                created = list(await db.scalars(
+                    insert(models.Conversation).returning(models.Conversation, sort_by_parameter_order=True), rows
+                ))
+            convs = [created[slot] if isinstance(slot, int) else slot for slot in slots]
+
+            # 2. Chunk the transcripts (deterministic, so retries produce the same chunk ids)
+            unique_convs = list({conv.id: conv for conv in convs}.values())
+            chunks = {
+                conv.id: chunk_transcript(conv.text, settings.CHUNK_MAX_TOKENS, settings.CHUNK_OVERLAP_TOKENS)
+                for conv in unique_convs
+            }
+            tokens = {
+                (conv.id, chunk.index): tokenize(chunk.text) for conv in unique_convs for chunk in chunks[conv.id]
+            }
+            await insert_chunks(db, created, chunks, tokens)
             await db.commit()
-            await db.refresh(conv)
 
-            # 2. Index in Vector DB
-            self.collection.add(
-                ids=[str(conv.id)],
-                documents=[conv.text],
-                metadatas=[{"session_id": str(conv.session_id)}]  # UUID as string
-            )
-            return conv
+        # 3. Index the chunks in Vector DB, batched with concurrent callers; the tokens
+        #    computed above are stored with each chunk
+        entries = [(conv, chunk, tokens[(conv.id, chunk.index)]) for conv in unique_convs for chunk in chunks[conv.id]]
+        await self.embedding_queue.submit(
+            ids=[f"{conv.id}:{chunk.index}" for conv, chunk, _ in entries],
+            documents=[chunk.text for _, chunk, _ in entries],
+            metadatas=[
+                index_metadata(
+                    {"session_id": str(conv.session_id), "conversation_id": conv.id, "chunk_index": chunk.index},  # UUID as string
+                    tokens,
+                )
+                for conv, chunk, tokens in entries
+            ]
+        )
+        
+        # 4. Keep the lexical indexes of loaded sessions up to date
+        for conv, chunk, tokens in entries:
+            self.bm25_index.add(str(conv.session_id), [(f"{conv.id}:{chunk.index}", tokens)])
+        # Answers cached for these sessions may miss the new conversations
+        for session_id in {str(conv.session_id) for conv in created}:
+            self.answer_cache.invalidate_session(session_id)
+        return convs
 
     # --- Retrieval & RAG Methods ---
 
-    def _hybrid_search(self, query: str, session_id: str) -> list[str]:
-        # 1. Vector Search
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=settings.RAG_TOP_K * 2, # Fetch extra for re-ranking
-            where={"session_id": str(session_id)}  # UUID as string
+    def _hybrid_search(self, query: str, session_id: str) -> PackedContext:
+        """Retrieve candidate passages and pack the context sent to the LLM."""
+        result = self.retrieval.search(query, [session_id], settings.RAG_CONTEXT_CANDIDATES)
+        return self.context_packer.pack(result.documents, result.scores, result.ids)
+
+    def _hybrid_search_many(self, queries: list[str], session_id: str) -> list[PackedContext]:
+        """``_hybrid_search`` for several questions: one embedding request and one vector store query."""
+        embeddings = self._embed_queries(queries)
+        results = self.retrieval.search_many(queries, [session_id], settings.RAG_CONTEXT_CANDIDATES, embeddings)
+        return [self.context_packer.pack(result.documents, result.scores, result.ids) for result in results]
+
+    # --- Cross-session search ---
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        per_session: int = 3,
+        cursor: Optional[str] = None,
+        session_name: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+    ) -> AsyncIterator[Union[schemas.SearchGroup, schemas.SearchPage]]:
+        """Search every session, best session first, with optional session filters.
+
+        Returns an async iterator over the groups of the page, each yielded as
+        soon as it is ready, followed by a SearchPage without groups carrying
+        the next cursor and the stage timings. Raises ValueError for an
+        invalid cursor.
+        """
+        after = self._decode_cursor(cursor) if cursor else None
+        return self._search(query, limit, per_session, after, session_name, date_from, date_to)
+
+    async def _search(self, query, limit, per_session, after, session_name, date_from, date_to):
+        started = asyncio.get_running_loop().time()
+        conditions = self._session_conditions(session_name, date_from, date_to)
+        key = json.dumps([query, per_session, session_name, str(date_from), str(date_to)])
+
+        # 1. The ranking kept for the cursor, ranked further when it runs short
+        state = self.search_cursors.get(after[0], key) if after is not None else None
+        if state is None:
+            # A new search, or a cursor whose ranking expired: resumed after the key of its last group
+            cursor_id, state = self.search_cursors.create(key, after[2] if after is not None else None)
+            offset = 0
+        else:
+            cursor_id, offset = after[0], after[1]
+        timings = {}
+        async with state.lock:
+            while len(state.groups) < offset + limit and not state.complete:
+                timings = await self._rank_deeper(state, query, per_session, conditions)
+            page, more = state.page(offset, limit)
+        next_cursor = (
+            self._encode_cursor((cursor_id, offset + len(page), page[-1][1], page[-1][0])) if page and more else None
         )
-        
-        if not results['documents'] or not results['documents'][0]:
+
+        # 2. Stream the groups, loading their texts one group at a time
+        async with AsyncSessionLocal() as db:
+            result_sessions = await db.execute(
+                select(models.Session).where(models.Session.id.in_([session_id for session_id, _, _ in page]))
+            )
+            sessions = {session.id: session for session in result_sessions.scalars().all()}
+        for session_id, best, hits in page:
+            documents = await self._run_blocking(self.vector_store.get, [doc_id for doc_id, _, _ in hits])
+            session = sessions.get(session_id)
+            yield schemas.SearchGroup(
+                session_id=session_id,
+                session_name=session.name if session else None,
+                created_at=session.created_at if session else None,
+                score=best,
+                hits=[
+                    schemas.SearchHit(
+                        chunk_id=doc_id, conversation_id=conversation_id, text=documents.get(doc_id, ""), score=score
+                    )
+                    for doc_id, conversation_id, score in hits
+                ],
+            )
+
+        timings["total"] = round((asyncio.get_running_loop().time() - started) * 1000, 3)
+        yield schemas.SearchPage(next_cursor=next_cursor, timings=timings)
+
+    async def _rank_deeper(self, state: SearchState, query: str, per_session: int, conditions: list) -> dict:
+        """Rank the search's next candidates (SEARCH_CANDIDATES, then 4 times more each time) into groups."""
+        state.depth = state.depth * 4 if state.depth else settings.SEARCH_CANDIDATES
+
+        # Filters and lexical candidates, both answered by indexes
+        started = asyncio.get_running_loop().time()
+        async with AsyncSessionLocal() as db:
+            if conditions and state.session_ids is None:
+                state.session_ids = list((await db.scalars(select(models.Session.id).where(*conditions))).all())
+            lexical = await self._search_chunks(db, tokenize(query), conditions, state.depth)
+        timings = {"lexical": round((asyncio.get_running_loop().time() - started) * 1000, 3)}
+        if state.session_ids is not None and not state.session_ids:
+            state.complete = True
+            return timings
+
+        # Dense candidates from one search of the whole store, fused with the lexical ones
+        result = await self._run_blocking(
+            self.global_retrieval.search, query, state.session_ids, state.depth,
+            rankings={"lexical": lexical}, fetch_documents=False,
+        )
+        state.complete = len(result.ids) < state.depth
+
+        # Group by session; a session ranks by its best chunk
+        owners = await self._chunk_owners(result.ids)
+        groups = {}
+        for doc_id, score in zip(result.ids, result.scores):
+            owner = owners.get(doc_id)
+            if owner is None:
+                continue  # vector of a conversation deleted meanwhile
+            session_id, conversation_id = owner
+            _, hits = groups.setdefault(session_id, (score, []))
+            if len(hits) < per_session:
+                hits.append((doc_id, conversation_id, score))
+        ordered = sorted(
+            ((session_id, best, hits) for session_id, (best, hits) in groups.items()),
+            key=lambda group: (-group[1], group[0]),
+        )
+        state.regroup(ordered)
+        return {**timings, **result.timings}
+
+    def _session_conditions(
+        self, session_name: Optional[str], date_from: Optional[datetime], date_to: Optional[datetime]
+    ) -> list:
+        conditions = []
+        if session_name:
+            conditions.append(func.lower(models.Session.name).contains(session_name.lower(), autoescape=True))
+        if date_from:
+            conditions.append(models.Session.created_at >= _as_utc(date_from))
+        if date_to:
+            conditions.append(models.Session.created_at <= _as_utc(date_to))
+        return conditions
+
+    async def _search_chunks(self, db, tokens: list[str], conditions: list, limit: int) -> list[tuple[str, float]]:
+        """BM25 ranking of the chunks of all (matching) sessions, from the full-text index."""
+        if not tokens:
             return []
+        match = " OR ".join(f'"{token}"' for token in dict.fromkeys(tokens))
+        rank = func.bm25(literal_column("chunk_search"))
+        stmt = (
+            select(models.ConversationChunk.id, rank)
+            .select_from(
+                models.chunk_search.join(
+                    models.ConversationChunk.__table__,
+                    models.chunk_search.c.rowid == models.ConversationChunk.search_id,
+                )
+            )
+            .where(literal_column("chunk_search").op("MATCH")(match))
+            .order_by(rank)
+            .limit(limit)
+        )
+        if conditions:
+            stmt = stmt.join(models.Session, models.Session.id == models.ConversationChunk.session_id).where(*conditions)
+        rows = await db.execute(stmt)
+        # bm25() is lower for better matches
+        return [(chunk_id, -score) for chunk_id, score in rows]
 
-        docs = results['documents'][0]
-        distances = results['distances'][0]
-        
-        # Normalize Vector Scores (1 - distance approximation)
-        vec_scores = np.array([1 - d for d in distances])
-        if vec_scores.size > 0:
-            vec_scores = (vec_scores - vec_scores.min()) / (vec_scores.max() - vec_scores.min() + 1e-9)
-
-        # 2. BM25 (Lexical) Search on retrieved docs
-        tokenized_docs = [doc.split() for doc in docs]
-        bm25 = BM25Okapi(tokenized_docs)
-        bm25_scores = np.array(bm25.get_scores(query.split()))
-        
-        if bm25_scores.size > 0:
-            bm25_scores = (bm25_scores - bm25_scores.min()) / (bm25_scores.max() - bm25_scores.min() + 1e-9)
+    async def _chunk_owners(self, doc_ids: list[str]) -> dict[str, tuple[str, Optional[str]]]:
+        """Map vector ids to their (session_id, session_manager conversation_id)."""
+        chunk_ids = [doc_id for doc_id in doc_ids if ":" in doc_id]
+        # Conversations indexed before chunking have a single vector under their own id
+        legacy_ids = [int(doc_id) for doc_id in doc_ids if doc_id.isdigit()]
+        owners = {}
+        async with AsyncSessionLocal() as db:
+            if chunk_ids:
+                rows = await db.execute(
+                    select(models.ConversationChunk.id, models.ConversationChunk.session_id, models.Conversation.external_id)
+                    .join(models.Conversation, models.Conversation.id == models.ConversationChunk.conversation_id)
+                    .where(models.ConversationChunk.id.in_(chunk_ids))
+                )
+                owners.update({chunk_id: (session_id, external_id) for chunk_id, session_id, external_id in rows})
+            if legacy_ids:
+                rows = await db.execute(
+                    select(models.Conversation.id, models.Conversation.session_id, models.Conversation.external_id)
+                    .where(models.Conversation.id.in_(legacy_ids))
+                )
+                owners.update({str(row_id): (session_id, external_id) for row_id, session_id, external_id in rows})
+        return owners
 
-        # 3. Weighted Fusion
-        final_scores = (settings.RAG_VECTOR_WEIGHT * vec_scores) + (settings.RAG_BM25_WEIGHT * bm25_scores)
-        
-        # Sort and return top K
-        sorted_indices = np.argsort(final_scores)[::-1][:settings.RAG_TOP_K]
-        return [docs[i] for i in sorted_indices]
+    def _encode_cursor(self, key: tuple) -> str:
+        """Encode the key of a page (a tuple of JSON values) as an opaque cursor."""
+        return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii")
+
+    def _decode_cursor(self, cursor: str) -> tuple:
+        """Decode a search cursor into (cursor_id, offset, (score, session_id)) (raises ValueError if invalid)."""
+        try:
+            cursor_id, offset, score, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            if int(offset) < 0:
+                raise ValueError(offset)
+            return (str(cursor_id), int(offset), (float(score), str(session_id)))
+        except Exception as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
 
-    async def stream_rag_response(self, query: str, session_id: str):
-        # 1. Get Context
-        context_docs = self._hybrid_search(query, session_id)
-        context_text = "\n\n".join(context_docs)
+    def _decode_session_cursor(self, cursor: str) -> tuple:
+        """Decode a (created_at, session_id) cursor of list_sessions (raises ValueError if invalid)."""
+        try:
+            created_at, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return (datetime.fromisoformat(created_at), str(session_id))
+        except Exception as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
 
-        # 2. Prompt
-        prompt = f"""
+    async def stream_rag_response(
+        self, query: str, session_id: str
+    ) -> AsyncIterator[Union[schemas.AnswerContext, schemas.AnswerToken, schemas.AnswerDone]]:
+        """Stream an answer: the packed context, the answer tokens, then the stream's timings.
+
+        Closing the iterator (client gone) cancels the retrieval if it is
+        still queued and the LLM generation if no other request shares it.
+        """
+        # Vector query, query embedding and BM25 scoring are blocking
+        retrieve = functools.partial(self._run_blocking, self._hybrid_search, query, session_id)
+        async for event in self._answer(query, session_id, retrieve):
+            yield event
+
+    async def _answer(
+        self,
+        query: str,
+        session_id: str,
+        context: Callable[[], Awaitable[PackedContext]],
+        started: Optional[float] = None,
+        limit: Optional[asyncio.Semaphore] = None,
+    ) -> AsyncIterator[Union[schemas.AnswerContext, schemas.AnswerToken, schemas.AnswerDone]]:
+        """Answer ``query`` from the context ``context()`` retrieves; the generation waits for a slot of ``limit``."""
+        started = started or time.perf_counter()
+        first_token = None
+        tokens = 0
+        outcome = "cancelled"
+        try:
+            # 1. Get Context
+            packed = await context()
+            yield schemas.AnswerContext(
+                passages=len(packed.documents),
+                **packed.model_dump(include={"tokens", "candidate_tokens", "duplicates", "over_budget"}),
+            )
+            context_text = "\n\n".join(packed.documents)
+
+            # 2. Prompt
+            prompt = f"""
         Context from previous conversations:
         {context_text}
         
         User Question: {query}
         Answer based on context:
         """
-        
-        # 3. Stream
-        response = self.llm_model.generate_content(prompt, stream=True)
-        for chunk in response:
+
+            # 3. Stream: replayed from the cache, shared with an identical request in flight, or generated
+            key = self.answer_cache.key(session_id, query, packed.documents)
+            async with limit or contextlib.nullcontext():
+                async for text in self.answer_cache.stream(key, session_id, lambda: self._generate_stream(prompt)):
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    tokens += count_tokens(text)
+                    yield schemas.AnswerToken(text=text)
+            outcome = "completed"
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            finished = time.perf_counter()
+            generation_s = finished - first_token if first_token is not None else 0.0
+            ttfb_ms = (first_token - started) * 1000 if first_token is not None else None
+            self.stream_metrics.record(outcome, ttfb_ms, tokens, generation_s)
+
+        yield schemas.AnswerDone(
+            ttfb_ms=round(ttfb_ms, 3) if ttfb_ms is not None else None,
+            tokens=tokens,
+            tokens_per_second=round(tokens / generation_s, 3) if generation_s else 0.0,
+            duration_ms=round((finished - started) * 1000, 3),
+        )
+
+    def batch_query(self, session_id: str, questions: List[schemas.BatchQuestion]) -> AsyncIterator:
+        """Answer several questions about a session, multiplexed into one event stream.
+
+        The questions are embedded in one call and searched with one vector
+        store query against the session's (cached) lexical index; up to
+        RAG_BATCH_CONCURRENCY answers are generated at a time. Yields the
+        events of each answer tagged with its question id, as they come,
+        then a BatchDone. Raises ValueError for an invalid batch.
+        """
+        if not questions:
+            raise ValueError("No questions")
+        if len(questions) > settings.RAG_BATCH_MAX_QUESTIONS:
+            raise ValueError(f"At most {settings.RAG_BATCH_MAX_QUESTIONS} questions per batch")
+        question_ids = [question.id if question.id is not None else str(i) for i, question in enumerate(questions)]
+        if len(set(question_ids)) != len(question_ids):
+            raise ValueError("Duplicate question ids")
+        return self._stream_batch(session_id, question_ids, [question.query for question in questions])
+
+    async def _stream_batch(self, session_id: str, question_ids: list[str], queries: list[str]) -> AsyncIterator:
+        started = time.perf_counter()
+        retrieval = asyncio.ensure_future(self._run_blocking(self._hybrid_search_many, queries, session_id))
+        limit = asyncio.Semaphore(settings.RAG_BATCH_CONCURRENCY)
+        events: asyncio.Queue = asyncio.Queue()
+        tagged = {
+            schemas.AnswerContext: schemas.BatchAnswerContext,
+            schemas.AnswerToken: schemas.BatchAnswerToken,
+            schemas.AnswerDone: schemas.BatchAnswerDone,
+        }
+
+        async def context(i: int) -> PackedContext:
+            # Shielded: one question cancelled does not cancel the retrieval of the others
+            return (await asyncio.shield(retrieval))[i]
+
+        async def answer(i: int) -> None:
+            question_id = question_ids[i]
+            try:
+                async for event in self._answer(queries[i], session_id, functools.partial(context, i), started, limit):
+                    events.put_nowait(tagged[type(event)](question_id=question_id, **event.model_dump()))
+            except Exception as e:
+                events.put_nowait(schemas.BatchAnswerError(question_id=question_id, detail=str(e)))
+            finally:
+                events.put_nowait(None)
+
+        tasks = [asyncio.create_task(answer(i)) for i in range(len(queries))]
+        try:
+            failed = 0
+            remaining = len(tasks)
+            while remaining:
+                event = await events.get()
+                if event is None:
+                    remaining -= 1
+                    continue
+                if isinstance(event, schemas.BatchAnswerError):
+                    failed += 1
+                yield event
+            yield schemas.BatchDone(
+                questions=len(queries), failed=failed, duration_ms=round((time.perf_counter() - started) * 1000, 3)
+            )
+        finally:
+            # Client gone: stop the retrieval and the generations still running
+            retrieval.cancel()
+            for task in tasks:
+                task.cancel()
+
+    async def _generate_stream(self, prompt: str):
+        """Stream the LLM answer with the native async client, or pull a sync stream on the executor."""
+        if hasattr(self.llm_model, "generate_content_async"):
+            response = await self.llm_model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+            return
+
+        response = await self._run_blocking(self.llm_model.generate_content, prompt, stream=True)
+        chunks = iter(response)
+        done = object()
+        while (chunk := await self._run_blocking(next, chunks, done)) is not done:
             if chunk.text:
-                yield chunk.text
\ No newline at end of file
+                yield chunk.text
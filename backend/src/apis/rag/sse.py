@@ -0,0 +1,101 @@
+import asyncio
+import json
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from pydantic import BaseModel
+
+# Comment line: ignored by EventSource parsers, keeps proxies from closing an idle stream
+HEARTBEAT = ": heartbeat\n\n"
+
+# Headers of an event stream: no caching, no proxy buffering (nginx)
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_event(event: str, data: dict) -> str:
+    """One SSE event with a JSON payload (single line, so no data: continuation)."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def event_stream(
+    events: AsyncIterator[BaseModel],
+    names: Dict[type, str],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    heartbeat: float = 15.0,
+    poll_interval: float = 0.5,
+) -> AsyncIterator[str]:
+    """
+    Frame ``events`` as SSE, each named after its type in ``names``.
+
+    A heartbeat comment is sent when no event was sent for ``heartbeat``
+    seconds. While waiting for the next event the client is polled every
+    ``poll_interval`` seconds; once it is gone the pending step of
+    ``events`` is cancelled, so upstream work (retrieval queued on the
+    executor, the LLM stream) stops without waiting for a write to fail.
+    An exception raised by ``events`` is sent as an ``error`` event.
+    """
+    last_write = time.monotonic()
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(events.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=poll_interval)
+            if not done:
+                if await is_disconnected():
+                    return
+                if time.monotonic() - last_write >= heartbeat:
+                    last_write = time.monotonic()
+                    yield HEARTBEAT
+                continue
+
+            step, pending = pending, None
+            try:
+                item = step.result()
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                yield format_event("error", {"detail": str(e)})
+                return
+            last_write = time.monotonic()
+            yield format_event(names[type(item)], item.model_dump())
+    finally:
+        # Disconnected, or the response itself was cancelled: stop the producer
+        if pending is not None:
+            pending.cancel()
+            try:
+                await pending
+            except BaseException:
+                pass
+        await events.aclose()
+
+
+class StreamMetrics:
+    """Outcome, time to first token and generation rate of the answer streams."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._outcomes: Dict[str, int] = {"completed": 0, "cancelled": 0, "error": 0}
+        self._ttfb_ms = 0.0
+        self._ttfb_count = 0
+        self._tokens = 0
+        self._generation_s = 0.0
+
+    def record(self, outcome: str, ttfb_ms: Optional[float], tokens: int, generation_s: float) -> None:
+        with self._lock:
+            self._outcomes[outcome] = self._outcomes.get(outcome, 0) + 1
+            if ttfb_ms is not None:
+                self._ttfb_ms += ttfb_ms
+                self._ttfb_count += 1
+            self._tokens += tokens
+            self._generation_s += generation_s
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "streams": dict(self._outcomes),
+                "avg_ttfb_ms": round(self._ttfb_ms / self._ttfb_count, 3) if self._ttfb_count else 0.0,
+                "tokens": self._tokens,
+                "tokens_per_second": round(self._tokens / self._generation_s, 3) if self._generation_s else 0.0,
+            }
@@ -0,0 +1,28 @@
+import re
+import unicodedata
+from typing import List
+
+# Bumped whenever tokenize() changes, so tokens stored at ingestion are recomputed
+TOKENIZER_VERSION = 1
+
+_TOKEN = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Case-fold and strip accents, so "Café" and "cafe" match."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    """Split a normalized text into word tokens; punctuation is dropped."""
+    return _TOKEN.findall(normalize(text))
+
+
+def serialize_tokens(tokens: List[str]) -> str:
+    """Tokens as stored in vector metadata (tokens never contain spaces)."""
+    return " ".join(tokens)
+
+
+def deserialize_tokens(value: str) -> List[str]:
+    return value.split()
@@ -0,0 +1,160 @@
+"""
+Compare the vector store backends on synthetic sessions.
+
+Run from the backend directory:
+
+    python -m src.apis.rag.vector_benchmark --sessions 20 --per-session 2000 --dim 768
+
+Reports insert throughput, per-session query latency (p50 / p95) and the
+overlap of each backend's top results with the exact float32 NumPy
+ranking. The NumPy store runs once per ``--precisions`` entry, quantized
+ones with and without the exact re-score, and reports the bytes a query
+scans, i.e. the memory a node needs to keep the sessions hot.
+
+Queries run on a freshly reopened store, as after a restart. The Python
+heap it holds once every queried session is open (tracemalloc) and the
+growth of the process RSS, which also counts the mapped vector pages, are
+reported next to the latencies.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from .vector_store import ChromaVectorStore, NumpyVectorStore, VectorStore
+
+
+def _synthetic_sessions(n_sessions: int, per_session: int, dim: int, seed: int):
+    rng = np.random.default_rng(seed)
+    for s in range(n_sessions):
+        # Clustered vectors, closer to real embeddings than uniform noise
+        centers = rng.standard_normal((8, dim)).astype(np.float32)
+        vectors = centers[rng.integers(0, 8, per_session)] + 0.5 * rng.standard_normal((per_session, dim))
+        yield f"session-{s}", vectors.astype(np.float32)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+def _rss_bytes() -> Optional[int]:
+    """Resident set size of the process (Linux only)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def run(
+    factory: Callable[[str], VectorStore], path: str, sessions, queries, top_k: int, batch_size: int = 500
+) -> dict:
+    store = factory(path)
+    started = time.perf_counter()
+    total = 0
+    for session_id, vectors in sessions:
+        for i in range(0, len(vectors), batch_size):
+            batch = vectors[i:i + batch_size]
+            ids = [f"{session_id}:{i + j}" for j in range(len(batch))]
+            store.upsert(ids, batch, [f"doc {doc_id}" for doc_id in ids], [{"session_id": session_id}] * len(batch))
+            total += len(batch)
+    insert_seconds = time.perf_counter() - started
+    del store
+
+    # Reopen, then let a first pass open the queried sessions and measure what stays allocated
+    rss_before = _rss_bytes()
+    tracemalloc.start()
+    store = factory(path)
+    for session_id, query in queries:
+        store.query(query, top_k, [session_id])
+    heap_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    latencies, results = [], []
+    for session_id, query in queries:
+        started = time.perf_counter()
+        hits = store.query(query, top_k, [session_id])
+        latencies.append(time.perf_counter() - started)
+        results.append([hit.id for hit in hits])
+
+    rss_after = _rss_bytes()
+    stats = store.stats() if isinstance(store, NumpyVectorStore) else {}
+    return {
+        "inserted": total,
+        "scan_bytes": stats.get("scan_bytes"),
+        "heap_bytes": heap_bytes,
+        "rss_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+        "insert_per_second": round(total / insert_seconds) if insert_seconds else 0,
+        "query_p50_ms": round(_percentile(latencies, 50), 2),
+        "query_p95_ms": round(_percentile(latencies, 95), 2),
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--per-session", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backends", default="numpy,chroma")
+    parser.add_argument("--precisions", default="float32,float16,int8")
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    sessions = list(_synthetic_sessions(args.sessions, args.per_session, args.dim, args.seed))
+    rng = np.random.default_rng(args.seed + 1)
+    queries = []
+    for _ in range(args.queries):
+        session_id, vectors = sessions[rng.integers(0, len(sessions))]
+        # Queries near a stored vector, as a user question is near its answer
+        query = vectors[rng.integers(0, len(vectors))] + 0.3 * rng.standard_normal(args.dim)
+        queries.append((session_id, query.astype(np.float32)))
+
+    # (label, store factory)
+    configurations = []
+    for backend in args.backends.split(","):
+        if backend == "chroma":
+            configurations.append(("chroma", ChromaVectorStore))
+            continue
+        for precision in args.precisions.split(","):
+            configurations.append((f"numpy/{precision}", lambda path, p=precision: NumpyVectorStore(path, p)))
+            if precision != "float32" and args.rescore_factor > 0:
+                configurations.append((
+                    f"numpy/{precision}+rescore",
+                    lambda path, p=precision: NumpyVectorStore(path, p, args.rescore_factor),
+                ))
+
+    reports = {}
+    for label, factory in configurations:
+        with tempfile.TemporaryDirectory() as path:
+            reports[label] = run(factory, path, sessions, queries, args.top_k)
+
+    # Exact ranking (the float32 NumPy store is brute force) used as the recall reference
+    reference = reports.get("numpy/float32", {}).get("results")
+    full_bytes = args.sessions * args.per_session * args.dim * 4
+    print(f"{args.sessions} sessions x {args.per_session} vectors, dim {args.dim}, top {args.top_k}")
+    for label, report in reports.items():
+        line = (
+            f"{label:>22}: insert {report['insert_per_second']}/s, "
+            f"query p50 {report['query_p50_ms']} ms, p95 {report['query_p95_ms']} ms, "
+            f"heap {report['heap_bytes'] / 2 ** 20:.1f} MiB"
+        )
+        if report["rss_bytes"] is not None:
+            line += f", RSS +{report['rss_bytes'] / 2 ** 20:.1f} MiB"
+        if report["scan_bytes"] is not None:
+            line += f", scan {report['scan_bytes'] / 2 ** 20:.1f} MiB ({full_bytes / report['scan_bytes']:.1f}x less)"
+        if reference is not None and label != "numpy/float32":
+            overlaps = [len(set(a) & set(b)) / max(1, len(b)) for a, b in zip(report["results"], reference)]
+            line += f", recall@{args.top_k} {np.mean(overlaps):.3f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
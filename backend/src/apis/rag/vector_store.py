@@ -0,0 +1,886 @@
+import json
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import chromadb
+import numpy as np
+from pydantic import BaseModel
+
+from ...commons.constants import settings
+
+
+class VectorHit(BaseModel):
+    id: str
+    document: str
+    distance: float  # cosine distance, lower is closer
+    metadata: dict = {}
+
+
+class VectorStore(ABC):
+    """
+    Storage and nearest-neighbour search of document embeddings.
+
+    Every document carries a ``session_id`` in its metadata; queries are
+    restricted to one or more sessions.
+    """
+
+    @abstractmethod
+    def upsert(
+        self, ids: List[str], embeddings: Sequence[Sequence[float]], documents: List[str], metadatas: List[dict]
+    ) -> None:
+        ...
+
+    @abstractmethod
+    def query(
+        self, embedding: Sequence[float], n_results: int, session_ids: Optional[List[str]] = None
+    ) -> List[VectorHit]:
+        """Return the ``n_results`` closest documents, closest first (all sessions if ``session_ids`` is None)."""
+
+    def query_many(
+        self, embeddings: Sequence[Sequence[float]], n_results: int, session_ids: Optional[List[str]] = None
+    ) -> List[List[VectorHit]]:
+        """``query`` for several embeddings at once; backends override it to share the work."""
+        return [self.query(embedding, n_results, session_ids) for embedding in embeddings]
+
+    def query_global(
+        self, embedding: Sequence[float], n_results: int, session_filter: Optional[Set[str]] = None
+    ) -> List[VectorHit]:
+        """
+        ``query`` across sessions: the ``n_results`` closest documents of the
+        whole store, or of the sessions in ``session_filter`` (possibly
+        thousands of them). Backends override it where a long session list
+        is expensive to filter on.
+        """
+        return self.query(embedding, n_results, None if session_filter is None else sorted(session_filter))
+
+    @abstractmethod
+    def get(self, ids: List[str]) -> Dict[str, str]:
+        """Return the documents of the given ids (unknown ids are skipped)."""
+
+    @abstractmethod
+    def get_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Return the stored embeddings of the given ids (unknown ids are skipped)."""
+
+    @abstractmethod
+    def session_documents(self, session_id: str) -> List[Tuple[str, str, dict]]:
+        """Return the (id, document, metadata) of every document of a session."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None:
+        ...
+
+    @abstractmethod
+    def delete_sessions(self, session_ids: List[str]) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    def drop(self) -> None:
+        """Remove the store itself, e.g. a generation replaced by a reindex."""
+        self.clear()
+
+
+class ChromaVectorStore(VectorStore):
+    """VectorStore backed by a persistent Chroma collection."""
+
+    def __init__(self, path: str, embedding_function=None, collection_name: str = "conversations", client=None):
+        self.client = client or chromadb.PersistentClient(path=path)
+        self.embedding_function = embedding_function
+        self.collection_name = collection_name
+        self.collection = self._open_collection()
+
+    def _open_collection(self):
+        return self.client.get_or_create_collection(
+            name=self.collection_name,
+            embedding_function=self.embedding_function,
+            metadata={"hnsw:space": "cosine"}  # distances comparable with the NumPy store
+        )
+
+    def upsert(self, ids, embeddings, documents, metadatas) -> None:
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def query(self, embedding, n_results, session_ids=None) -> List[VectorHit]:
+        return self.query_many([embedding], n_results, session_ids)[0]
+
+    def query_many(self, embeddings, n_results, session_ids=None) -> List[List[VectorHit]]:
+        where = None
+        if session_ids is not None:
+            if not session_ids:
+                return [[] for _ in embeddings]
+            where = (
+                {"session_id": str(session_ids[0])} if len(session_ids) == 1
+                else {"session_id": {"$in": [str(session_id) for session_id in session_ids]}}
+            )
+        # One request for all the queries
+        results = self.collection.query(
+            query_embeddings=[list(map(float, embedding)) for embedding in embeddings],
+            n_results=n_results,
+            where=where,
+            include=["documents", "distances", "metadatas"],
+        )
+        if not results['ids']:
+            return [[] for _ in embeddings]
+        return [
+            [
+                VectorHit(id=doc_id, document=document, distance=distance, metadata=metadata or {})
+                for doc_id, document, distance, metadata in zip(ids, documents, distances, metadatas)
+            ]
+            for ids, documents, distances, metadatas in zip(
+                results['ids'], results['documents'], results['distances'], results['metadatas']
+            )
+        ]
+
+    def query_global(self, embedding, n_results, session_filter=None) -> List[VectorHit]:
+        if session_filter is None or len(session_filter) <= _WHERE_SESSIONS:
+            return self.query(embedding, n_results, None if session_filter is None else sorted(session_filter))
+        # A long $in list is slow to match: the nearest ids are fetched without documents and
+        # filtered here, fetching deeper at most up to _MAX_OVERFETCH times n_results
+        limit = n_results * _MAX_OVERFETCH
+        n = n_results
+        while True:
+            n = min(n * 4, limit)
+            results = self.collection.query(
+                query_embeddings=[list(map(float, embedding))], n_results=n, include=["distances", "metadatas"]
+            )
+            ids, distances, metadatas = results["ids"][0], results["distances"][0], results["metadatas"][0]
+            kept = [
+                (doc_id, distance, metadata or {})
+                for doc_id, distance, metadata in zip(ids, distances, metadatas)
+                if str((metadata or {}).get("session_id")) in session_filter
+            ]
+            if len(kept) >= n_results or len(ids) < n or n == limit:
+                break
+        kept = kept[:n_results]
+        documents = self.get([doc_id for doc_id, _, _ in kept])
+        return [
+            VectorHit(id=doc_id, document=documents.get(doc_id, ""), distance=distance, metadata=metadata)
+            for doc_id, distance, metadata in kept
+        ]
+
+    def get(self, ids) -> Dict[str, str]:
+        if not ids:
+            return {}
+        result = self.collection.get(ids=ids, include=["documents"])
+        return dict(zip(result["ids"], result["documents"]))
+
+    def get_embeddings(self, ids) -> Dict[str, np.ndarray]:
+        if not ids:
+            return {}
+        result = self.collection.get(ids=ids, include=["embeddings"])
+        return {doc_id: np.asarray(embedding, dtype=np.float32) for doc_id, embedding in zip(result["ids"], result["embeddings"])}
+
+    def session_documents(self, session_id) -> List[Tuple[str, str, dict]]:
+        result = self.collection.get(where={"session_id": str(session_id)}, include=["documents", "metadatas"])
+        return [
+            (doc_id, document, metadata or {})
+            for doc_id, document, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+        ]
+
+    def delete(self, ids) -> None:
+        if ids:
+            self.collection.delete(ids=ids)
+
+    def delete_sessions(self, session_ids) -> None:
+        if session_ids:
+            self.collection.delete(where={"session_id": {"$in": [str(session_id) for session_id in session_ids]}})
+
+    def clear(self) -> None:
+        # Dropping the collection is much cheaper than fetching every id to delete them
+        try:
+            self.client.delete_collection(self.collection_name)
+        except Exception as e:
+            print(f"Warning: Failed to clear vector database: {e}")
+        self.collection = self._open_collection()
+
+    def drop(self) -> None:
+        self.client.delete_collection(self.collection_name)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+# Storage of the scanned vectors: (file name, dtype)
+PRECISIONS = {
+    "float32": ("vectors.f32", np.float32),
+    "float16": ("vectors.f16", np.float16),
+    "int8": ("vectors.i8", np.int8),
+}
+# Rows converted to float32 at a time when scoring quantized vectors
+_SCORE_BLOCK = 4096
+# Cross-session Chroma queries filter on at most this many sessions with $in, and
+# otherwise filter the nearest hits themselves, fetching at most this factor more
+_WHERE_SESSIONS = 256
+_MAX_OVERFETCH = 64
+
+
+def quantize(vectors: np.ndarray, precision: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Encode unit-normalized float32 vectors in ``precision``.
+
+    int8 uses symmetric scalar quantization with one float32 scale per
+    vector (its largest absolute component maps to 127); the scales are
+    returned alongside the codes. Other precisions have no scales.
+    """
+    if precision == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales
+    return vectors.astype(PRECISIONS[precision][1]), None
+
+
+class _SessionVectors:
+    """
+    Vectors of one session: append-only vector files read through memory
+    maps, and an append-only ``rows.jsonl`` log of row assignments and deletes.
+
+    Queries scan the vectors in the session's precision (``format.json``,
+    fixed when the session is created). Quantized sessions can also keep
+    the float32 vectors on disk; only the rows of a query's shortlist are
+    read from them to re-score it exactly.
+
+    Only the ids and the offsets of their records are kept in memory; the
+    documents and metadata of the rows a caller needs are read back from
+    ``rows.jsonl``.
+    """
+
+    def __init__(self, directory: Path, precision: str = "float32", keep_full: bool = True):
+        self.directory = directory
+        self.rows_path = directory / "rows.jsonl"
+        self.format_path = directory / "format.json"
+        self.scales_path = directory / "scales.f32"
+        self.full_path = directory / PRECISIONS["float32"][0]
+        self.precision = precision
+        self.keep_full = keep_full
+        if self.format_path.exists():
+            stored = json.loads(self.format_path.read_text())
+            self.precision, self.keep_full = stored["precision"], stored["keep_full"]
+        elif self.rows_path.exists():
+            # Written before quantization existed
+            self.precision, self.keep_full = "float32", True
+        self.keep_full = self.keep_full or self.precision == "float32"
+        self.codes_path = directory / PRECISIONS[self.precision][0]
+        self.dtype = PRECISIONS[self.precision][1]
+
+        self.dim: Optional[int] = None
+        self.rows: Dict[str, int] = {}  # id -> row of its live vector
+        self.ids: List[Optional[str]] = []  # row -> id (None once replaced or deleted)
+        self.offsets = array("q")  # row -> byte offset of its record in rows.jsonl
+        self._maps: Dict[Path, np.ndarray] = {}
+        self._alive: Optional[np.ndarray] = None
+        self._load()
+
+    def _files(self) -> List[Tuple[Path, type, int]]:
+        """(path, dtype, values per row) of every vector file of the session."""
+        dim = self.dim or 0
+        files = [(self.codes_path, self.dtype, dim)]
+        if self.precision == "int8":
+            files.append((self.scales_path, np.float32, 1))
+        if self.keep_full and self.codes_path != self.full_path:
+            files.append((self.full_path, np.float32, dim))
+        return files
+
+    def _load(self) -> None:
+        if not self.rows_path.exists():
+            return
+        offset = 0
+        with open(self.rows_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn write at the tail
+                record = json.loads(line)
+                if "del" in record:
+                    self._unassign(record["del"])
+                else:
+                    self.dim = record["dim"]
+                    self._assign(record["id"], offset)
+                offset += len(line)
+        if self.rows_path.stat().st_size > offset:
+            with open(self.rows_path, "r+b") as f:
+                f.truncate(offset)
+        # Vectors without a complete row record are dropped
+        for path, dtype, width in self._files():
+            expected_size = len(self.ids) * width * np.dtype(dtype).itemsize
+            if path.exists() and path.stat().st_size > expected_size:
+                with open(path, "r+b") as f:
+                    f.truncate(expected_size)
+
+    def _assign(self, doc_id: str, offset: int) -> None:
+        self._unassign(doc_id)
+        self.rows[doc_id] = len(self.ids)
+        self.ids.append(doc_id)
+        self.offsets.append(offset)
+
+    def _unassign(self, doc_id: str) -> None:
+        row = self.rows.pop(doc_id, None)
+        if row is not None:
+            self.ids[row] = None
+
+    def entries(self, rows: Sequence[int]) -> List[Tuple[str, dict]]:
+        """(document, metadata) of ``rows``, read from their records."""
+        entries = []
+        with open(self.rows_path, "rb") as f:
+            for row in rows:
+                f.seek(self.offsets[row])
+                record = json.loads(f.readline())
+                entries.append((record["document"], record["metadata"]))
+        return entries
+
+    def _records(self, ids: List[str], documents: List[str], metadatas: List[dict]) -> List[bytes]:
+        return [
+            (json.dumps(
+                {"id": doc_id, "dim": self.dim, "document": document, "metadata": metadata}, ensure_ascii=False
+            ) + "\n").encode("utf-8")
+            for doc_id, document, metadata in zip(ids, documents, metadatas)
+        ]
+
+    def _write_vectors(self, vectors: np.ndarray, mode: str) -> None:
+        codes, scales = quantize(vectors, self.precision)
+        data = {self.codes_path: codes, self.scales_path: scales, self.full_path: vectors}
+        for path, _, _ in self._files():
+            with open(path, mode) as f:
+                f.write(np.ascontiguousarray(data[path]).tobytes())
+
+    def append(self, ids: List[str], vectors: np.ndarray, documents: List[str], metadatas: List[dict]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if not self.format_path.exists():
+            self.format_path.write_text(json.dumps({"precision": self.precision, "keep_full": self.keep_full}))
+        self.dim = vectors.shape[1]
+        # Vectors first: a row record always points at complete vectors
+        self._write_vectors(np.ascontiguousarray(vectors, dtype=np.float32), "ab")
+        records = self._records(ids, documents, metadatas)
+        with open(self.rows_path, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(b"".join(records))
+        for doc_id, record in zip(ids, records):
+            self._assign(doc_id, offset)
+            offset += len(record)
+        self._maps = {}
+        self._alive = None
+
+    def remove(self, ids: List[str]) -> None:
+        ids = [doc_id for doc_id in ids if doc_id in self.rows]
+        if not ids:
+            return
+        with open(self.rows_path, "a", encoding="utf-8") as f:
+            for doc_id in ids:
+                f.write(json.dumps({"del": doc_id}) + "\n")
+                self._unassign(doc_id)
+        self._alive = None
+        if len(self.ids) > 64 and len(self.rows) * 2 < len(self.ids):
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrite the files with the live rows only."""
+        live = [row for row, doc_id in enumerate(self.ids) if doc_id is not None]
+        ids = [self.ids[row] for row in live]
+        records = self._records(ids, *zip(*self.entries(live))) if live else []
+        arrays = {path: np.array(self._map(path, dtype, width)[live]) for path, dtype, width in self._files()}
+
+        replaced = []
+        for path, values in arrays.items():
+            tmp = path.with_suffix(path.suffix + ".tmp")
+            with open(tmp, "wb") as f:
+                f.write(values.tobytes())
+            replaced.append((tmp, path))
+        tmp_rows = self.rows_path.with_suffix(".tmp")
+        with open(tmp_rows, "wb") as f:
+            f.write(b"".join(records))
+        self._maps = {}
+        for tmp, path in replaced:
+            os.replace(tmp, path)
+        os.replace(tmp_rows, self.rows_path)
+
+        self.rows, self.ids, self.offsets = {}, [], array("q")
+        offset = 0
+        for doc_id, record in zip(ids, records):
+            self._assign(doc_id, offset)
+            offset += len(record)
+        self._alive = None
+
+    def _map(self, path: Path, dtype, width: int) -> np.ndarray:
+        matrix = self._maps.get(path)
+        if matrix is None:
+            if not self.ids:
+                return np.zeros((0, width), dtype=dtype)
+            matrix = np.memmap(path, dtype=dtype, mode="r", shape=(len(self.ids), width))
+            self._maps[path] = matrix
+        return matrix
+
+    def alive(self) -> np.ndarray:
+        if self._alive is None:
+            self._alive = np.array([doc_id is not None for doc_id in self.ids], dtype=bool)
+        return self._alive
+
+    def vectors(self, rows: Sequence[int]) -> np.ndarray:
+        """float32 vectors of ``rows``: the exact ones if kept, else decoded from the scanned ones."""
+        if self.keep_full:
+            return np.array(self._map(self.full_path, np.float32, self.dim)[rows])
+        vectors = self._map(self.codes_path, self.dtype, self.dim)[rows].astype(np.float32)
+        if self.precision == "int8":
+            vectors *= self._map(self.scales_path, np.float32, 1)[rows]
+        return vectors
+
+    def _scores(self, queries: np.ndarray) -> np.ndarray:
+        """(rows, queries) similarities: the session is read once for all the queries."""
+        codes = self._map(self.codes_path, self.dtype, self.dim)
+        if self.precision == "float32":
+            return codes @ queries.T
+        # Converted block by block so a query never holds a float32 copy of the session
+        scores = np.empty((codes.shape[0], queries.shape[0]), dtype=np.float32)
+        for start in range(0, codes.shape[0], _SCORE_BLOCK):
+            scores[start:start + _SCORE_BLOCK] = codes[start:start + _SCORE_BLOCK].astype(np.float32) @ queries.T
+        if self.precision == "int8":
+            scores *= self._map(self.scales_path, np.float32, 1)
+        return scores
+
+    def search(self, query: np.ndarray, n_results: int, rescore_factor: int = 0) -> List[Tuple[float, int]]:
+        """
+        Return (similarity, row) pairs of the closest live rows.
+
+        With ``rescore_factor`` > 0, a quantized session shortlists
+        ``n_results * rescore_factor`` rows and ranks them by their exact
+        float32 similarity.
+        """
+        return self.search_many(query[None, :], n_results, rescore_factor)[0]
+
+    def search_many(self, queries: np.ndarray, n_results: int, rescore_factor: int = 0) -> List[List[Tuple[float, int]]]:
+        """``search`` for each row of ``queries``, scoring them all in one pass over the session."""
+        if not self.rows or queries.shape[1] != self.dim:
+            return [[] for _ in queries]
+        # Rows are unit-normalized: dot products are cosine similarities
+        all_similarities = np.where(self.alive()[:, None], self._scores(queries), -np.inf)
+        k = min(n_results, len(self.rows))
+        rescore = rescore_factor > 0 and self.precision != "float32" and self.keep_full
+        shortlist = min(len(self.rows), k * rescore_factor) if rescore else k
+        results = []
+        for query, similarities in zip(queries, all_similarities.T):
+            top = np.argpartition(-similarities, shortlist - 1)[:shortlist]
+            if rescore:
+                top = np.sort(top)  # sequential reads from the float32 file
+                exact = self._map(self.full_path, np.float32, self.dim)[top] @ query
+                order = np.argsort(-exact)[:k]
+                results.append([(float(exact[i]), int(top[i])) for i in order])
+            else:
+                top = top[np.argsort(-similarities[top])]
+                results.append([(float(similarities[row]), int(row)) for row in top])
+        return results
+
+    def scan_bytes(self) -> int:
+        """Bytes read by a query that scans the session."""
+        width = (self.dim or 0) * np.dtype(self.dtype).itemsize + (4 if self.precision == "int8" else 0)
+        return len(self.ids) * width
+
+
+class _ReadWriteLock:
+    """Shared access for readers, exclusive for writers; a waiting writer blocks new readers."""
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process VectorStore keeping each session's vectors in memory-mapped
+    matrices under ``<path>/<session_id>/``.
+
+    Vectors are stored unit-normalized, so a query is one matrix-vector
+    product per session followed by ``argpartition``. A session is opened
+    the first time it is used; the page cache, not the heap, holds its
+    vectors, and documents are read back from disk for the rows returned.
+    ``<path>/ids.jsonl`` logs which session each id belongs to, so ids can
+    be resolved without opening every session.
+
+    Queries across sessions (no ``session_ids``, or ``query_global``)
+    score the matrices of all the (filtered) sessions into one array and
+    rank it once, instead of ranking and merging every session's hits.
+
+    ``precision`` ("float32", "float16" or "int8") sets how new sessions
+    store the vectors that queries scan: float16 halves and int8 quarters the
+    memory a session needs. With ``rescore_factor`` > 0 the float32 vectors
+    are kept on disk too, and the ``rescore_factor * n_results`` best rows of
+    a quantized scan are re-ranked with their exact similarity.
+
+    Queries and reads share the store and run concurrently; writes take it
+    exclusively.
+    """
+
+    def __init__(self, path: str, precision: str = "float32", rescore_factor: int = 0):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown vector precision: {precision}")
+        self.precision = precision
+        self.rescore_factor = rescore_factor
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.ids_path = self.path / "ids.jsonl"
+        self._lock = _ReadWriteLock()
+        self._sessions_lock = threading.Lock()  # guards _sessions, which readers fill too
+        self._sessions: Dict[str, _SessionVectors] = {}  # opened sessions
+        self._session_names = {
+            directory.name for directory in self.path.iterdir()
+            if directory.is_dir() and not directory.name.startswith(".")
+        }
+        self._id_sessions = self._load_ids()
+
+    # --- id -> session log ---
+
+    def _load_ids(self) -> Dict[str, str]:
+        if not self.ids_path.exists():
+            # Store written before the log existed: read the ids of every session once
+            id_sessions = {
+                doc_id: session_id
+                for session_id in self._session_names
+                for doc_id in _SessionVectors(self.path / session_id).rows
+            }
+            self._rewrite_ids(id_sessions)
+            return id_sessions
+
+        id_sessions: Dict[str, str] = {}
+        records = 0
+        complete = True
+        with open(self.ids_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    complete = False  # torn write at the tail
+                    break
+                doc_id, session_id = json.loads(line)
+                records += 1
+                if session_id is None:
+                    id_sessions.pop(doc_id, None)
+                else:
+                    id_sessions[doc_id] = session_id
+        if not complete or records > 2 * len(id_sessions) + 1024:
+            self._rewrite_ids(id_sessions)
+        return id_sessions
+
+    def _rewrite_ids(self, id_sessions: Dict[str, str]) -> None:
+        tmp = self.ids_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps([doc_id, session_id]) + "\n" for doc_id, session_id in id_sessions.items())
+        os.replace(tmp, self.ids_path)
+
+    def _log_ids(self, entries: List[Tuple[str, Optional[str]]]) -> None:
+        """Append (id, session_id) assignments; a None session removes the id."""
+        if entries:
+            with open(self.ids_path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps([doc_id, session_id]) + "\n" for doc_id, session_id in entries))
+
+    # --- Sessions ---
+
+    def _open(self, session_id: str) -> _SessionVectors:
+        with self._sessions_lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = _SessionVectors(self.path / session_id, self.precision, keep_full=self.rescore_factor > 0)
+                self._sessions[session_id] = session
+            return session
+
+    # --- Queries across sessions ---
+
+    def _query_global(
+        self, queries: np.ndarray, n_results: int, session_filter: Optional[Set[str]] = None
+    ) -> List[List[VectorHit]]:
+        names = self._session_names if session_filter is None else self._session_names & set(map(str, session_filter))
+        sessions = [
+            session for session in (self._open(name) for name in sorted(names))
+            if session.rows and session.dim == queries.shape[1]
+        ]
+        if not sessions:
+            return [[] for _ in queries]
+        # One (rows, queries) array of every session; session i holds rows starts[i] to starts[i + 1]
+        similarities = np.concatenate([
+            np.where(session.alive()[:, None], session._scores(queries), -np.inf) for session in sessions
+        ])
+        starts = np.cumsum([0] + [len(session.ids) for session in sessions])
+        available = sum(len(session.rows) for session in sessions)
+        k = min(n_results, available)
+        rescore = self.rescore_factor > 0 and any(
+            session.precision != "float32" and session.keep_full for session in sessions
+        )
+        shortlist = min(available, k * self.rescore_factor) if rescore else k
+
+        results = []
+        for query, column in zip(queries, similarities.T):
+            top = np.argpartition(-column, shortlist - 1)[:shortlist]
+            owners = np.searchsorted(starts, top, side="right") - 1
+            scores = column[top]
+            if rescore:
+                scores = scores.copy()
+                for i in np.unique(owners):
+                    session = sessions[i]
+                    if session.precision != "float32" and session.keep_full:
+                        picked = np.flatnonzero(owners == i)
+                        rows = top[picked] - starts[i]
+                        order = np.argsort(rows)  # sequential reads from the float32 file
+                        exact = session._map(session.full_path, np.float32, session.dim)[rows[order]] @ query
+                        scores[picked[order]] = exact
+            order = np.argsort(-scores, kind="stable")[:k]
+            results.append(self._hits([
+                (float(scores[j]), sessions[owners[j]], int(top[j] - starts[owners[j]])) for j in order
+            ]))
+        return results
+
+    def _by_session(self, ids: Sequence[str]) -> Dict[str, List[str]]:
+        by_session: Dict[str, List[str]] = {}
+        for doc_id in ids:
+            session_id = self._id_sessions.get(doc_id)
+            if session_id is not None:
+                by_session.setdefault(session_id, []).append(doc_id)
+        return by_session
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def upsert(self, ids, embeddings, documents, metadatas) -> None:
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        by_session: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            by_session.setdefault(str(metadata["session_id"]), []).append(i)
+
+        with self._lock.write():
+            for session_id, rows in by_session.items():
+                # An id moving to another session leaves its old one
+                moved = self._by_session([ids[i] for i in rows if self._id_sessions.get(ids[i], session_id) != session_id])
+                for previous, moved_ids in moved.items():
+                    self._open(previous).remove(moved_ids)
+                # Logged before the vectors are written: an id whose write was lost only costs a lookup
+                self._log_ids([(ids[i], session_id) for i in rows if self._id_sessions.get(ids[i]) != session_id])
+                self._open(session_id).append(
+                    [ids[i] for i in rows], vectors[rows], [documents[i] for i in rows], [metadatas[i] for i in rows]
+                )
+                self._session_names.add(session_id)
+                for i in rows:
+                    self._id_sessions[ids[i]] = session_id
+
+    def query(self, embedding, n_results, session_ids=None) -> List[VectorHit]:
+        return self.query_many([embedding], n_results, session_ids)[0]
+
+    def query_many(self, embeddings, n_results, session_ids=None) -> List[List[VectorHit]]:
+        if len(embeddings) == 0:
+            return []
+        queries = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock.read():
+            if session_ids is None:
+                return self._query_global(queries, n_results)
+            candidates = [[] for _ in embeddings]
+            for session_id in map(str, session_ids):
+                if session_id not in self._session_names:
+                    continue
+                session = self._open(session_id)
+                for i, hits in enumerate(session.search_many(queries, n_results, self.rescore_factor)):
+                    candidates[i].extend((similarity, session, row) for similarity, row in hits)
+            results = []
+            for query_candidates in candidates:
+                query_candidates.sort(key=lambda candidate: -candidate[0])
+                results.append(self._hits(query_candidates[:n_results]))
+            return results
+
+    def query_global(self, embedding, n_results, session_filter=None) -> List[VectorHit]:
+        queries = self._normalize(np.asarray([embedding], dtype=np.float32))
+        with self._lock.read():
+            return self._query_global(queries, n_results, session_filter)[0]
+
+    @staticmethod
+    def _hits(candidates: List[Tuple[float, "_SessionVectors", int]]) -> List[VectorHit]:
+        """VectorHits of (similarity, session, row) candidates, reading each session's records once."""
+        rows: Dict[int, List[int]] = {}
+        sessions: Dict[int, _SessionVectors] = {}
+        for _, session, row in candidates:
+            rows.setdefault(id(session), []).append(row)
+            sessions[id(session)] = session
+        entries = {
+            (key, row): entry
+            for key, session_rows in rows.items()
+            for row, entry in zip(session_rows, sessions[key].entries(session_rows))
+        }
+        hits = []
+        for similarity, session, row in candidates:
+            document, metadata = entries[(id(session), row)]
+            hits.append(VectorHit(id=session.ids[row], document=document, distance=1.0 - similarity, metadata=metadata))
+        return hits
+
+    def get(self, ids) -> Dict[str, str]:
+        with self._lock.read():
+            found = {}
+            for session_id, session_ids in self._by_session(ids).items():
+                session = self._open(session_id)
+                live = [doc_id for doc_id in session_ids if doc_id in session.rows]
+                for doc_id, (document, _) in zip(live, session.entries([session.rows[doc_id] for doc_id in live])):
+                    found[doc_id] = document
+            return found
+
+    def get_embeddings(self, ids) -> Dict[str, np.ndarray]:
+        # Exact vectors when the session keeps them, else decoded from the quantized ones
+        with self._lock.read():
+            found = {}
+            for session_id, session_ids in self._by_session(ids).items():
+                session = self._open(session_id)
+                live = [doc_id for doc_id in session_ids if doc_id in session.rows]
+                if live:
+                    found.update(zip(live, session.vectors([session.rows[doc_id] for doc_id in live])))
+            return found
+
+    def session_documents(self, session_id) -> List[Tuple[str, str, dict]]:
+        with self._lock.read():
+            if str(session_id) not in self._session_names:
+                return []
+            session = self._open(str(session_id))
+            rows = sorted(session.rows.values())  # sequential reads
+            return [
+                (session.ids[row], document, metadata)
+                for row, (document, metadata) in zip(rows, session.entries(rows))
+            ]
+
+    def delete(self, ids) -> None:
+        with self._lock.write():
+            for session_id, session_ids in self._by_session(ids).items():
+                self._open(session_id).remove(session_ids)
+                for doc_id in session_ids:
+                    del self._id_sessions[doc_id]
+                self._log_ids([(doc_id, None) for doc_id in session_ids])
+
+    def delete_sessions(self, session_ids) -> None:
+        with self._lock.write():
+            self._delete_sessions(map(str, session_ids))
+
+    def _delete_sessions(self, session_ids) -> None:
+        for session_id in session_ids:
+            if session_id not in self._session_names:
+                continue
+            session = self._open(session_id)
+            removed = [doc_id for doc_id in session.rows if self._id_sessions.get(doc_id) == session_id]
+            shutil.rmtree(session.directory, ignore_errors=True)
+            for doc_id in removed:
+                del self._id_sessions[doc_id]
+            self._log_ids([(doc_id, None) for doc_id in removed])
+            with self._sessions_lock:
+                del self._sessions[session_id]
+            self._session_names.discard(session_id)
+
+    def _clear(self) -> None:
+        self._delete_sessions(list(self._session_names))
+        self._id_sessions = {}
+        self._rewrite_ids({})
+
+    def clear(self) -> None:
+        with self._lock.write():
+            self._clear()
+
+    def drop(self) -> None:
+        with self._lock.write():
+            self._clear()
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def count(self) -> int:
+        with self._lock.read():
+            return len(self._id_sessions)
+
+    def stats(self) -> dict:
+        with self._lock.read():
+            with self._sessions_lock:
+                opened = list(self._sessions.values())
+            return {
+                "vectors": len(self._id_sessions),
+                "sessions": len(self._session_names),
+                "open_sessions": len(opened),
+                "precision": self.precision,
+                "rescore_factor": self.rescore_factor,
+                # of the open sessions
+                "scan_bytes": sum(session.scan_bytes() for session in opened),
+            }
+
+
+# A reindex writes a new generation of the store (a Chroma collection, or a NumPy
+# directory next to NUMPY_VECTOR_PATH) and names it in "<path>.current". Replacing
+# that file swaps the generation atomically; without it the original store is used.
+
+def _pointer(path: str) -> Path:
+    return Path(f"{os.path.normpath(path)}.current")
+
+
+def active_generation(path: str) -> Optional[str]:
+    """Generation named in the pointer file of the store at ``path``, if any."""
+    pointer = _pointer(path)
+    if not pointer.exists():
+        return None
+    return pointer.read_text().strip() or None
+
+
+def set_active_generation(path: str, generation: str) -> None:
+    """Point the store at ``path`` to ``generation`` (atomic rename of the pointer file)."""
+    pointer = _pointer(path)
+    tmp = pointer.with_name(pointer.name + ".tmp")
+    with open(tmp, "w") as f:
+        f.write(generation)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, pointer)
+
+
+def store_path(backend: str) -> str:
+    """Location of the vector store of ``backend``, where its pointer file lives."""
+    if backend == "chroma":
+        return settings.VECTOR_DB_PATH
+    if backend == "numpy":
+        return settings.NUMPY_VECTOR_PATH
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+
+def create_vector_store(backend: str, embedding_function=None, generation: Optional[str] = None) -> VectorStore:
+    """Build the vector store selected by the VECTOR_STORE setting, at its active generation by default."""
+    path = store_path(backend)
+    generation = generation or active_generation(path)
+    if backend == "chroma":
+        return ChromaVectorStore(path, embedding_function, collection_name=generation or "conversations")
+    directory = Path(os.path.normpath(path))
+    return NumpyVectorStore(
+        str(directory.with_name(generation)) if generation else str(directory),
+        settings.VECTOR_PRECISION,
+        settings.VECTOR_RESCORE_FACTOR,
+    )
@@ -0,0 +1,125 @@
+import asyncio
+import shutil
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .models import Session, Conversation
+
+
+class GarbageCollector:
+    """
+    Background cleanup of deleted sessions and conversations.
+
+    Deletions only write a tombstone to the session store and wake the
+    collector. It then removes the files, SQL rows and vectors of tombstoned
+    items in batches and purges their tombstones. Anything left over when the
+    process stops is collected after the next start.
+
+    Every step is idempotent, and the steps an item already went through are
+    remembered until its tombstone is purged: when a later step fails, the
+    retry resumes at that step instead of redoing the whole batch.
+    """
+
+    def __init__(self, session_service, rag_service=None, batch_size: int = 100, interval: float = 60.0):
+        self.session_service = session_service
+        self.rag_service = rag_service
+        self.batch_size = batch_size
+        self.interval = interval
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Completed steps ("files", "rag") of tombstones not purged yet
+        self._done: Dict[tuple, Set[str]] = {}
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()  # collect what was left before the last shutdown
+        self._task = asyncio.create_task(self._run(), name="session-garbage-collector")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._loop = None
+
+    def wake(self) -> None:
+        """Ask for a collection pass (thread-safe)."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                collected = await self.collect()
+                if collected:
+                    print(f"Garbage collector removed {collected} deleted item(s)")
+            except Exception as e:
+                # Tombstones are kept, the next pass retries
+                print(f"Error: Garbage collection failed: {e}")
+
+    async def collect(self) -> int:
+        """Remove everything currently tombstoned; returns the number of purged tombstones."""
+        store = self.session_service.store
+        collected = 0
+
+        while sessions := store.list_session_tombstones(self.batch_size):
+            session_ids = [session.session_id for session in sessions]
+            keys = [("session", session_id) for session_id in session_ids]
+            await self._step("files", keys, sessions, lambda todo: asyncio.to_thread(self._remove_session_files, todo))
+            if self.rag_service:
+                await self._step(
+                    "rag", keys, sessions,
+                    lambda todo: self.rag_service.delete_sessions([session.session_id for session in todo]),
+                )
+            await asyncio.wrap_future(store.purge_sessions(session_ids))
+            self._forget(keys)
+            collected += len(sessions)
+
+        while conversations := store.list_conversation_tombstones(self.batch_size):
+            keys = [("conversation", session_id, conversation.conversation_id) for session_id, conversation in conversations]
+            await self._step(
+                "files", keys, conversations, lambda todo: asyncio.to_thread(self._remove_conversation_files, todo)
+            )
+            if self.rag_service:
+                await self._step(
+                    "rag", keys, conversations,
+                    lambda todo: self.rag_service.delete_conversations([c.conversation_id for _, c in todo]),
+                )
+            await asyncio.wrap_future(store.purge_conversations([key[1:] for key in keys]))
+            self._forget(keys)
+            collected += len(conversations)
+
+        return collected
+
+    async def _step(self, name: str, keys: List[tuple], items: list, action: Callable[[list], Awaitable]) -> None:
+        """Run ``action`` on the items that have not completed step ``name`` yet, then record it."""
+        todo = [item for key, item in zip(keys, items) if name not in self._done.get(key, ())]
+        if todo:
+            await action(todo)
+        for key in keys:
+            self._done.setdefault(key, set()).add(name)
+
+    def _forget(self, keys: List[tuple]) -> None:
+        for key in keys:
+            self._done.pop(key, None)
+
+    def _remove_session_files(self, sessions: List[Session]) -> None:
+        for session in sessions:
+            self.session_service.content_store.drop_session(session.session_id)
+            session_dir = (self.session_service.sessions_dir / session.session_id).resolve()
+            if session_dir.exists() and session_dir.is_dir():
+                try:
+                    shutil.rmtree(str(session_dir))
+                except Exception as e:
+                    print(f"Error: Failed to delete session directory {session_dir}: {e}")
+
+    def _remove_conversation_files(self, conversations: List[Tuple[str, Conversation]]) -> None:
+        for session_id, conversation in conversations:
+            self.session_service.content_store.delete(session_id, conversation)
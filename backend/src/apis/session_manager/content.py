@@ -0,0 +1,542 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .models import Session, Conversation
+
+# Size of the chunks yielded by iter_range
+READ_CHUNK_SIZE = 64 * 1024
+
+# Blob key suffix of a transcript's turn index in a segment
+TURNS_SUFFIX = ":turns"
+
+# (speaker, text) turns as returned by transcript_turns
+Turns = List[Tuple[Optional[str], str]]
+
+
+def transcript_turns(text: str) -> List[Tuple[Optional[str], str]]:
+    """
+    Split a transcript into (speaker, text) turns.
+
+    Diarized transcripts are the JSON list of {speaker: text} objects produced
+    by speech_to_text.stt.parse_conv; anything else is split into lines with
+    no speaker.
+    """
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if isinstance(data, list) and all(isinstance(turn, dict) for turn in data):
+        return [(str(speaker), str(said)) for turn in data for speaker, said in turn.items()]
+    return [(None, line) for line in text.splitlines() if line.strip()]
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def turn_index(text: str) -> bytes:
+    """
+    Byte spans of the turns of ``transcript_turns(text)``, packed for storage.
+
+    The packed array starts with 1 for a diarized (JSON) transcript and 0 for
+    a plain one, followed by a (start, end) pair per turn: the UTF-8 byte span
+    of the turn's JSON object or line. Turns of an object holding several
+    speakers share its span.
+    """
+    spans: List[Tuple[int, int]] = []
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    diarized = isinstance(data, list) and all(isinstance(turn, dict) for turn in data)
+    if diarized:
+        decoder = json.JSONDecoder()
+        position = text.index("[") + 1
+        for turn in data:
+            position = _WHITESPACE.match(text, position).end()
+            _, end = decoder.raw_decode(text, position)
+            spans.extend([(position, end)] * len(turn))
+            position = _WHITESPACE.match(text, end).end() + 1  # past the comma
+    else:
+        position = 0
+        for piece in text.splitlines(keepends=True):
+            line = (piece.splitlines() or [""])[0]
+            if line.strip():
+                spans.append((position, position + len(line)))
+            position += len(piece)
+
+    if not text.isascii():
+        # Character offsets to byte offsets, in one pass over the increasing positions
+        converted = []
+        last_char = last_byte = 0
+        for start, end in spans:
+            if converted and start < last_char:
+                converted.append(converted[-1])  # another speaker of the same object
+                continue
+            start_byte = last_byte + len(text[last_char:start].encode("utf-8"))
+            end_byte = start_byte + len(text[start:end].encode("utf-8"))
+            converted.append((start_byte, end_byte))
+            last_char, last_byte = end, end_byte
+        spans = converted
+
+    return array("I", [int(diarized)] + [offset for span in spans for offset in span]).tobytes()
+
+
+def _window(turns: Turns, offset: int, limit: Optional[int]) -> Turns:
+    return turns[offset:] if limit is None else turns[offset:offset + limit]
+
+
+class FileContentStore:
+    """Stores each conversation transcript in its own ``conversations/<id>.txt`` file."""
+
+    def __init__(self, base_path: Path):
+        self.base_path = base_path
+
+    def put(self, session: Session, conversation_id: str, text: str) -> str:
+        """Write a transcript and return its path relative to ``base_path``."""
+        conversation_file_rel = f"{session.conversations_dir}/{conversation_id}.txt"
+        conversation_file_abs = self.base_path / conversation_file_rel
+        conversation_file_abs.parent.mkdir(parents=True, exist_ok=True)
+        with open(conversation_file_abs, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return conversation_file_rel
+
+    def get(self, session_id: str, conversation: Conversation) -> Optional[str]:
+        conversation_file = self.base_path / conversation.file_path
+        if not conversation_file.is_file():
+            return None
+        try:
+            with open(conversation_file, 'r', encoding='utf-8') as f:
+                return f.read()
+        except Exception as e:
+            print(f"Error reading conversation file: {e}")
+            return None
+
+    def size(self, session_id: str, conversation: Conversation) -> Optional[int]:
+        """Size of the transcript in bytes."""
+        conversation_file = self.base_path / conversation.file_path
+        if not conversation_file.is_file():
+            return None
+        return conversation_file.stat().st_size
+
+    def iter_range(self, session_id: str, conversation: Conversation, start: int, end: int) -> Iterator[bytes]:
+        """Yield the bytes [start, end) of the transcript in chunks."""
+        with open(self.base_path / conversation.file_path, "rb") as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def get_turns(
+        self, session_id: str, conversation: Conversation, offset: int, limit: Optional[int]
+    ) -> Optional[Tuple[Turns, int]]:
+        """A window of the transcript's turns and the total number of turns."""
+        text = self.get(session_id, conversation)
+        if text is None:
+            return None
+        turns = transcript_turns(text)
+        return _window(turns, offset, limit), len(turns)
+
+    def delete(self, session_id: str, conversation: Conversation) -> None:
+        conversation_file = (self.base_path / conversation.file_path).resolve()
+        if conversation_file.is_file():
+            try:
+                conversation_file.unlink()
+            except Exception as e:
+                print(f"Error deleting conversation file {conversation_file}: {e}")
+
+    def drop_session(self, session_id: str) -> None:
+        """Forget any cached state before the session directory is removed."""
+
+
+class _Segment:
+    """In-memory view of one session's segment index."""
+
+    def __init__(self, session_dir: Path):
+        self.session_dir = session_dir
+        self.index_path = session_dir / "segment.idx"
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.size = 0
+        self.dead_bytes = 0
+        # conversation_id -> (content hash, offset, length)
+        self.entries: Dict[str, Tuple[str, int, int]] = {}
+        # content hash -> (offset, length, reference count); the "<hash>:turns" blob
+        # holds the transcript's turn index and lives as long as the transcript
+        self.blobs: Dict[str, Tuple[int, int, int]] = {}
+        self._map: Optional[mmap.mmap] = None
+        self._map_file = None
+
+    @property
+    def data_path(self) -> Path:
+        return self.session_dir / f"segment-{self.generation}.dat"
+
+    def load(self) -> None:
+        if not self.index_path.exists():
+            return
+        good_offset = 0
+        with open(self.index_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn write at the tail
+                good_offset += len(line)
+                record = json.loads(line)
+                if record["op"] == "data":
+                    self.generation = record["generation"]
+                elif record["op"] == "put":
+                    self._add_entry(
+                        record["conversation_id"], record["hash"], record["offset"], record["length"], record.get("turns")
+                    )
+                elif record["op"] == "del":
+                    self._remove_entry(record["conversation_id"])
+        if good_offset < self.index_path.stat().st_size:
+            with open(self.index_path, "r+b") as f:
+                f.truncate(good_offset)
+        # Bytes past the last indexed blob belong to an append that was never indexed
+        self.size = max((offset + length for offset, length, _ in self.blobs.values()), default=0)
+        self.dead_bytes = self.size - sum(length for _, length, _ in self.blobs.values())
+        if self.data_path.exists() and self.data_path.stat().st_size > self.size:
+            with open(self.data_path, "r+b") as f:
+                f.truncate(self.size)
+
+        # Data files of an interrupted compaction
+        for path in self.session_dir.glob("segment-*.dat"):
+            if path != self.data_path:
+                path.unlink(missing_ok=True)
+
+    def _add_entry(
+        self, conversation_id: str, digest: str, offset: int, length: int, turns: Optional[List[int]] = None
+    ) -> None:
+        _, _, refs = self.blobs.get(digest, (offset, length, 0))
+        self.blobs[digest] = (offset, length, refs + 1)
+        self.entries[conversation_id] = (digest, offset, length)
+        if turns is not None:
+            self.blobs[digest + TURNS_SUFFIX] = (turns[0], turns[1], 1)
+
+    def _remove_entry(self, conversation_id: str) -> Optional[Tuple[str, int, int]]:
+        entry = self.entries.pop(conversation_id, None)
+        if entry is None:
+            return None
+        digest, offset, length = entry
+        _, _, refs = self.blobs[digest]
+        if refs > 1:
+            self.blobs[digest] = (offset, length, refs - 1)
+        else:
+            del self.blobs[digest]
+            self.dead_bytes += length
+            turns = self.blobs.pop(digest + TURNS_SUFFIX, None)
+            if turns is not None:
+                self.dead_bytes += turns[1]
+        return entry
+
+    def append_index(self, records: List[dict]) -> None:
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def view(self, offset: int, length: int) -> memoryview:
+        """Return a read-only slice of the memory-mapped data file."""
+        if self._map is None or offset + length > len(self._map):
+            self.close_map()
+            self._map_file = open(self.data_path, "rb")
+            self._map = mmap.mmap(self._map_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)[offset:offset + length]
+
+    def close_map(self) -> None:
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A reader still holds a view; the mapping is released with it
+                pass
+            self._map = None
+        if self._map_file is not None:
+            self._map_file.close()
+            self._map_file = None
+
+
+class SegmentContentStore:
+    """
+    Packs transcripts into one append-only segment file per session.
+
+    Each session directory holds ``segment.idx`` (a JSON-lines offset index) and
+    ``segment-<generation>.dat`` (the packed transcripts). Reads are served from
+    a memory map of the data file. Identical transcripts within a session are
+    stored once (keyed by SHA-256), and the data file is rewritten without dead
+    blobs once deletions make up ``compact_ratio`` of it.
+
+    Conversations still stored as individual files (the ``FileContentStore``
+    layout) are read transparently until ``migrate_session`` packs them.
+    """
+
+    def __init__(self, base_path: Path, compact_ratio: float = 0.5, compact_min_bytes: int = 64 * 1024):
+        self.base_path = base_path
+        self.sessions_dir = base_path / "sessions"
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self._legacy = FileContentStore(base_path)
+        self._segments: Dict[str, _Segment] = {}
+        self._segments_lock = threading.Lock()
+
+    def _segment(self, session_id: str) -> _Segment:
+        with self._segments_lock:
+            segment = self._segments.get(session_id)
+            if segment is None:
+                segment = _Segment(self.sessions_dir / session_id)
+                segment.load()
+                self._segments[session_id] = segment
+            return segment
+
+    def _index_path_rel(self, session_id: str) -> str:
+        return f"sessions/{session_id}/segment.idx"
+
+    @staticmethod
+    def _is_legacy(conversation: Conversation) -> bool:
+        """Whether the transcript is still a per-conversation file rather than a segment entry."""
+        return conversation.file_path.endswith(".txt")
+
+    def put(self, session: Session, conversation_id: str, text: str) -> str:
+        """Append a transcript (or reuse an identical one) and return the segment index path."""
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        segment = self._segment(session.session_id)
+
+        with segment.lock:
+            segment.session_dir.mkdir(parents=True, exist_ok=True)
+            appended = b""
+            if digest in segment.blobs:
+                offset, length, _ = segment.blobs[digest]
+            else:
+                offset, length = segment.size, len(data)
+                appended += data
+            # The turn index follows its transcript, so a turn window never needs the whole text
+            turns = segment.blobs.get(digest + TURNS_SUFFIX)
+            if turns is None:
+                index = turn_index(text)
+                turns = (segment.size + len(appended), len(index))
+                appended += index
+            if appended:
+                with open(segment.data_path, "ab") as f:
+                    f.write(appended)
+                    f.flush()
+                    os.fsync(f.fileno())
+                segment.size += len(appended)
+
+            records = [{
+                "op": "put", "conversation_id": conversation_id, "hash": digest, "offset": offset, "length": length,
+                "turns": [turns[0], turns[1]],
+            }]
+            if not segment.index_path.exists():
+                records.insert(0, {"op": "data", "generation": segment.generation})
+            segment.append_index(records)
+            segment._add_entry(conversation_id, digest, offset, length, [turns[0], turns[1]])
+
+        return self._index_path_rel(session.session_id)
+
+    def get(self, session_id: str, conversation: Conversation) -> Optional[str]:
+        segment = self._segment(session_id)
+        with segment.lock:
+            entry = segment.entries.get(conversation.conversation_id)
+            if entry is not None:
+                _, offset, length = entry
+                return bytes(segment.view(offset, length)).decode("utf-8")
+        if not self._is_legacy(conversation):
+            return None
+        return self._legacy.get(session_id, conversation)
+
+    def size(self, session_id: str, conversation: Conversation) -> Optional[int]:
+        segment = self._segment(session_id)
+        with segment.lock:
+            entry = segment.entries.get(conversation.conversation_id)
+        if entry is None:
+            return self._legacy.size(session_id, conversation) if self._is_legacy(conversation) else None
+        return entry[2]
+
+    def iter_range(self, session_id: str, conversation: Conversation, start: int, end: int) -> Iterator[bytes]:
+        segment = self._segment(session_id)
+        with segment.lock:
+            entry = segment.entries.get(conversation.conversation_id)
+        if entry is None:
+            if self._is_legacy(conversation):
+                yield from self._legacy.iter_range(session_id, conversation, start, end)
+            return
+
+        digest = entry[0]
+        position = start
+        while position < end:
+            with segment.lock:
+                # Re-resolve the blob each time: a compaction may have moved it
+                blob = segment.blobs.get(digest)
+                if blob is None:
+                    return  # deleted while streaming
+                offset = blob[0]
+                length = min(READ_CHUNK_SIZE, end - position)
+                chunk = bytes(segment.view(offset + position, length))
+            position += length
+            yield chunk
+
+    def get_turns(
+        self, session_id: str, conversation: Conversation, offset: int, limit: Optional[int]
+    ) -> Optional[Tuple[Turns, int]]:
+        """
+        A window of the transcript's turns and the total number of turns.
+
+        Only the window's slice of the turn index and the bytes of its turns
+        are read from the segment.
+        """
+        segment = self._segment(session_id)
+        with segment.lock:
+            entry = segment.entries.get(conversation.conversation_id)
+            turns = None if entry is None else segment.blobs.get(entry[0] + TURNS_SUFFIX)
+            if turns is not None:
+                window = self._read_window(segment, entry[1], turns[0], turns[1], offset, limit)
+        if entry is None:
+            return self._legacy.get_turns(session_id, conversation, offset, limit) if self._is_legacy(conversation) else None
+        if turns is None:
+            # Stored before turn indexes existed
+            text = self.get(session_id, conversation)
+            if text is None:
+                return None
+            all_turns = transcript_turns(text)
+            return _window(all_turns, offset, limit), len(all_turns)
+
+        diarized, spans, skip, count, data, total = window
+        result: Turns = []
+        previous = None
+        for start, end in spans:
+            if (start, end) == previous:
+                continue  # another speaker of the same object
+            previous = (start, end)
+            text = data[start - spans[0][0]:end - spans[0][0]].decode("utf-8")
+            if diarized:
+                result.extend((str(speaker), str(said)) for speaker, said in json.loads(text).items())
+            else:
+                result.append((None, text))
+        return result[skip:skip + count], total
+
+    @staticmethod
+    def _read_window(
+        segment: _Segment, transcript_offset: int, index_offset: int, index_length: int, offset: int, limit: Optional[int]
+    ) -> tuple:
+        """Read the turn spans and transcript bytes of a window (lock held)."""
+        item = array("I").itemsize
+
+        def read(position: int, count: int) -> array:
+            values = array("I")
+            values.frombytes(segment.view(index_offset + item * position, item * count))
+            return values
+
+        def spans(first: int, last: int) -> List[Tuple[int, int]]:
+            values = read(1 + 2 * first, 2 * (last - first))
+            return list(zip(values[0::2], values[1::2]))
+
+        total = (index_length // item - 1) // 2
+        diarized = bool(read(0, 1)[0])
+        first = min(offset, total)
+        end = total if limit is None else min(total, first + limit)
+        if first == end:
+            return diarized, [], 0, 0, b"", total
+        window = spans(first, end)
+        # A window starting inside a multi-speaker object needs the whole object
+        start = first
+        while diarized and start > 0 and spans(start - 1, start)[0] == window[0]:
+            start -= 1
+        window = [window[0]] * (first - start) + window
+        data = bytes(segment.view(transcript_offset + window[0][0], window[-1][1] - window[0][0]))
+        return diarized, window, first - start, end - first, data, total
+
+    def delete(self, session_id: str, conversation: Conversation) -> None:
+        segment = self._segment(session_id)
+        with segment.lock:
+            if segment.entries.get(conversation.conversation_id) is None:
+                # A segment entry that is already gone (e.g. a retried delete) is a no-op:
+                # its file_path is the session's segment index, not a file of its own
+                if self._is_legacy(conversation):
+                    self._legacy.delete(session_id, conversation)
+                return
+            segment.append_index([{"op": "del", "conversation_id": conversation.conversation_id}])
+            segment._remove_entry(conversation.conversation_id)
+            if segment.dead_bytes >= self.compact_min_bytes and segment.dead_bytes >= self.compact_ratio * segment.size:
+                self._compact(segment)
+
+    def drop_session(self, session_id: str) -> None:
+        with self._segments_lock:
+            segment = self._segments.pop(session_id, None)
+        if segment is not None:
+            with segment.lock:
+                segment.close_map()
+
+    def _compact(self, segment: _Segment) -> None:
+        """Rewrite the data file with live blobs only and atomically swap the index (lock held)."""
+        old_data_path = segment.data_path
+        new_generation = segment.generation + 1
+        new_data_path = segment.session_dir / f"segment-{new_generation}.dat"
+
+        relocated: Dict[str, Tuple[int, int]] = {}
+        offset = 0
+        with open(old_data_path, "rb") as src, open(new_data_path, "wb") as dst:
+            for digest, (old_offset, length, _) in sorted(segment.blobs.items(), key=lambda item: item[1][0]):
+                src.seek(old_offset)
+                dst.write(src.read(length))
+                relocated[digest] = (offset, length)
+                offset += length
+            dst.flush()
+            os.fsync(dst.fileno())
+
+        records = [{"op": "data", "generation": new_generation}]
+        for conversation_id, (digest, _, _) in segment.entries.items():
+            new_offset, length = relocated[digest]
+            record = {"op": "put", "conversation_id": conversation_id, "hash": digest, "offset": new_offset, "length": length}
+            if digest + TURNS_SUFFIX in relocated:
+                record["turns"] = list(relocated[digest + TURNS_SUFFIX])
+            records.append(record)
+        tmp_index_path = segment.index_path.with_name("segment.idx.tmp")
+        with open(tmp_index_path, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_index_path, segment.index_path)
+
+        segment.close_map()
+        old_data_path.unlink(missing_ok=True)
+        segment.generation = new_generation
+        segment.size = offset
+        segment.dead_bytes = 0
+        segment.blobs = {digest: (off, length, segment.blobs[digest][2]) for digest, (off, length) in relocated.items()}
+        segment.entries = {cid: (digest, *relocated[digest]) for cid, (digest, _, _) in segment.entries.items()}
+
+    def migrate_session(self, session: Session) -> Dict[str, str]:
+        """
+        Pack a session's per-file transcripts into its segment.
+
+        Returns the new ``file_path`` for every migrated conversation. The
+        original files are kept until ``remove_legacy_files`` is called, once
+        the new paths are recorded in the session store.
+        """
+        migrated = {}
+        for conversation in session.conversations:
+            if not self._is_legacy(conversation):
+                continue
+            text = self._legacy.get(session.session_id, conversation)
+            if text is None:
+                continue
+            migrated[conversation.conversation_id] = self.put(session, conversation.conversation_id, text)
+        return migrated
+
+    def remove_legacy_files(self, session: Session, conversation_ids: List[str]) -> None:
+        """Delete per-file transcripts that were migrated into the segment."""
+        for conversation in session.conversations:
+            if conversation.conversation_id in conversation_ids and self._is_legacy(conversation):
+                self._legacy.delete(session.session_id, conversation)
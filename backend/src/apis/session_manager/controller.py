@@ -1,7 +1,101 @@
-from fastapi import HTTPException
+import asyncio
+from typing import AsyncIterator, Optional, Tuple
+from fastapi import HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from .service import SessionService
-from .models import Session, SessionCreate, SessionUpdate, Conversation, ConversationCreate
+from .models import (
+    Session, SessionCreate, SessionUpdate, Conversation, ConversationCreate, SessionPage,
+    ConversationImport, ImportItemError, ImportProgress, ChangeFeed,
+)
 from ...commons.router import make_router
+from ...commons.conditional import make_etag, http_date, not_modified_response, set_validators, validator_headers
+
+# Transcripts written to the content store per step of a bulk import
+IMPORT_CHUNK_SIZE = 500
+IMPORT_POLL_INTERVAL = 1.0
+
+# Conversation content is served as UTF-8 text
+CONTENT_MEDIA_TYPE = "text/plain; charset=utf-8"
+
+# (index, text, error) for each item of a bulk import
+ImportItem = Tuple[int, Optional[str], Optional[str]]
+
+
+def _parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range ``Range: bytes=...`` header into a [start, end) pair.
+
+    Returns None when the header is absent or uses another unit/several ranges
+    (the full content is served), raises 416 when the range is unsatisfiable.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) + 1 if last else size
+        else:
+            # Suffix range: the last N bytes
+            start, end = max(0, size - int(last)), size
+    except ValueError:
+        return None
+    end = min(end, size)
+    if start >= size or start >= end:
+        raise HTTPException(
+            status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+async def _ndjson_items(request: Request) -> AsyncIterator[ImportItem]:
+    """Parse a streamed NDJSON body of {"text": ...} objects line by line."""
+    buffer = bytearray()
+    index = 0
+    async for chunk in request.stream():
+        # Only the new bytes can hold a newline: the buffer is the tail of an unfinished line
+        start, scanned = 0, len(buffer)
+        buffer += chunk
+        end = buffer.find(b"\n", scanned)
+        while end != -1:
+            line = bytes(buffer[start:end])
+            if line.strip():
+                yield _parse_ndjson_line(index, line)
+                index += 1
+            start = end + 1
+            end = buffer.find(b"\n", start)
+        del buffer[:start]
+    if buffer.strip():
+        yield _parse_ndjson_line(index, bytes(buffer))
+
+
+def _parse_ndjson_line(index: int, line: bytes) -> ImportItem:
+    try:
+        return index, ConversationCreate.model_validate_json(line).text, None
+    except ValidationError as e:
+        return index, None, f"Invalid item: {e.errors()[0]['msg']}"
+
+
+async def _json_items(payload: ConversationImport) -> AsyncIterator[ImportItem]:
+    for index, item in enumerate(payload.items):
+        yield index, item.text, None
+
+
+class _ImportResponse(StreamingResponse):
+    """
+    Streaming response whose body generator reads the request body itself.
+
+    StreamingResponse listens for client disconnects on the receive channel
+    the request body arrives on; here a disconnect surfaces while the body is
+    read instead, and the progress loop checks for it afterwards.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
 
 
 @make_router()
@@ -15,21 +109,69 @@ def controller(router, session_service: SessionService) -> None:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to create session: {str(e)}")
     
+    def session_etag(session_id: str) -> str:
+        version = session_service.get_session_version(session_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        return make_etag("session", session_id, version)
+    
     @router.get("/sessions", response_model=list[Session])
-    def list_sessions():
+    def list_sessions(request: Request, response: Response):
         """List all sessions."""
+        etag = make_etag("sessions", session_service.get_version())
+        if not_modified := not_modified_response(request, etag):
+            return not_modified
+        set_validators(response, etag)
         try:
             sessions = session_service.list_sessions()
             return sessions
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to list sessions: {str(e)}")
     
+    @router.get("/sessions/summaries", response_model=SessionPage)
+    def list_session_summaries(
+        request: Request,
+        response: Response,
+        limit: int = Query(50, ge=1, le=500),
+        cursor: Optional[str] = None,
+    ):
+        """List compact session summaries, most recently updated first (cursor-paginated)."""
+        etag = make_etag("summaries", session_service.get_version(), limit, cursor)
+        if not_modified := not_modified_response(request, etag):
+            return not_modified
+        set_validators(response, etag)
+        try:
+            return session_service.list_session_summaries(limit=limit, cursor=cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    @router.get("/changes", response_model=ChangeFeed)
+    async def get_changes(
+        since: int = Query(0, ge=0),
+        wait: float = Query(0, ge=0, le=60),
+        limit: int = Query(500, ge=1, le=5000),
+    ):
+        """
+        Get the sessions and conversations created, updated or deleted after seq ``since``.
+        
+        With ``wait``, the request is held for up to that many seconds until a
+        change arrives (long poll). Pass the returned ``seq`` as ``since`` on the
+        next call; ``reset`` means the client must refetch the full listing.
+        """
+        await session_service.wait_for_changes(since, wait)
+        return session_service.get_changes(since, limit)
+    
     @router.get("/sessions/{session_id}", response_model=Session)
-    def get_session(session_id: str):
+    def get_session(session_id: str, request: Request, response: Response):
         """Get a session by ID."""
+        etag = session_etag(session_id)
         session = session_service.get_session(session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
+        last_modified = http_date(session.updated_at)
+        if not_modified := not_modified_response(request, etag, last_modified):
+            return not_modified
+        set_validators(response, etag, last_modified)
         return session
     
     @router.put("/sessions/{session_id}", response_model=Session)
@@ -65,21 +207,88 @@ def controller(router, session_service: SessionService) -> None:
             raise HTTPException(status_code=404, detail="Session not found")
         return conversation
     
+    @router.get("/sessions/{session_id}/conversations", response_model=list[Conversation])
+    def list_conversations(session_id: str, request: Request, response: Response):
+        """List the conversations of a session."""
+        etag = session_etag(session_id)
+        if not_modified := not_modified_response(request, etag):
+            return not_modified
+        set_validators(response, etag)
+        conversations = session_service.list_conversations(session_id)
+        if conversations is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        return conversations
+    
     @router.get("/sessions/{session_id}/conversations/{conversation_id}", response_model=Conversation)
-    def get_conversation(session_id: str, conversation_id: str):
+    def get_conversation(session_id: str, conversation_id: str, request: Request, response: Response):
         """Get a specific conversation from a session."""
         conversation = session_service.get_conversation(session_id, conversation_id)
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
+        etag = make_etag("conversation", session_id, conversation_id, session_service.get_session_version(session_id))
+        if not_modified := not_modified_response(request, etag):
+            return not_modified
+        set_validators(response, etag)
         return conversation
     
     @router.get("/sessions/{session_id}/conversations/{conversation_id}/content")
-    def get_conversation_content(session_id: str, conversation_id: str):
-        """Get the content of a conversation file."""
-        content = session_service.get_conversation_content(session_id, conversation_id)
-        if content is None:
+    def get_conversation_content(
+        session_id: str,
+        conversation_id: str,
+        request: Request,
+        offset: Optional[int] = Query(None, ge=0),
+        limit: Optional[int] = Query(None, ge=1),
+    ):
+        """
+        Stream the content of a conversation as text/plain.
+        
+        Supports single byte ranges (Range: bytes=start-end). With offset/limit,
+        only that window of speaker turns is returned, one "speaker: text" turn
+        per line, and X-Total-Turns gives the number of turns.
+        
+        Transcripts never change once added, so the validators only depend on
+        the conversation and the requested window.
+        """
+        conversation = session_service.get_conversation(session_id, conversation_id)
+        if not conversation:
             raise HTTPException(status_code=404, detail="Conversation content not found")
-        return content
+        etag = make_etag("content", session_id, conversation_id, offset, limit)
+        last_modified = http_date(conversation.added_at)
+        if not_modified := not_modified_response(request, etag, last_modified):
+            return not_modified
+        
+        if offset is not None or limit is not None:
+            result = session_service.get_conversation_turns(session_id, conversation_id, offset or 0, limit)
+            if result is None:
+                raise HTTPException(status_code=404, detail="Conversation content not found")
+            lines, total = result
+            return Response(
+                content="\n".join(lines),
+                media_type=CONTENT_MEDIA_TYPE,
+                headers={"X-Total-Turns": str(total), **validator_headers(etag, last_modified)},
+            )
+        
+        size = session_service.get_conversation_content_size(session_id, conversation_id)
+        if size is None:
+            raise HTTPException(status_code=404, detail="Conversation content not found")
+        
+        headers = {"Accept-Ranges": "bytes", **validator_headers(etag, last_modified)}
+        byte_range = _parse_range(request.headers.get("range"), size)
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+        else:
+            start, end = 0, size
+            status_code = 200
+        headers["Content-Length"] = str(end - start)
+        
+        return StreamingResponse(
+            session_service.iter_conversation_content(session_id, conversation_id, start, end),
+            status_code=status_code,
+            media_type=CONTENT_MEDIA_TYPE,
+            headers=headers,
+        )
     
     @router.delete("/sessions/{session_id}/conversations/{conversation_id}", status_code=204)
     def delete_conversation(session_id: str, conversation_id: str):
@@ -88,3 +297,79 @@ def controller(router, session_service: SessionService) -> None:
         if not success:
             raise HTTPException(status_code=404, detail="Conversation not found")
         return None
+    
+    @router.post("/sessions/{session_id}/conversations/bulk")
+    async def import_conversations(session_id: str, request: Request, wait_indexed: bool = False):
+        """
+        Bulk-import conversations into a session.
+        
+        Accepts {"items": [{"text": ...}, ...]} or a streamed NDJSON body
+        (Content-Type: application/x-ndjson) with one {"text": ...} per line.
+        Progress is streamed back as NDJSON ImportProgress events while the
+        body is read: "received" after every chunk of items, "stored" once
+        every item is in the session store, "indexing" while the RAG
+        ingestion runs (with wait_indexed=true) and a final "done". Each event
+        lists the item failures found since the previous one.
+        """
+        if session_service.get_session(session_id) is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        if "ndjson" in request.headers.get("content-type", ""):
+            items = _ndjson_items(request)
+        else:
+            try:
+                items = _json_items(ConversationImport.model_validate_json(await request.body()))
+            except ValidationError as e:
+                raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+        
+        progress = ImportProgress(event="received")
+        staged, staged_indexes = [], []
+        chunk = []
+        
+        def emit(event: str, **fields) -> str:
+            line = progress.model_copy(update={"event": event, "stored": len(staged), **fields}).model_dump_json()
+            progress.failed = []
+            return line + "\n"
+        
+        async def flush_chunk():
+            conversations, failed = await run_in_threadpool(session_service.stage_conversations, session_id, chunk)
+            failed_indexes = {f.index for f in failed}
+            staged.extend(conversations)
+            staged_indexes.extend(index for index, _ in chunk if index not in failed_indexes)
+            progress.failed.extend(failed)
+            chunk.clear()
+        
+        async def events():
+            # The body is read (and staged chunk by chunk) while progress is streamed back
+            async for index, text, error in items:
+                progress.received += 1
+                if error:
+                    progress.failed.append(ImportItemError(index=index, error=error))
+                    continue
+                chunk.append((index, text))
+                if len(chunk) >= IMPORT_CHUNK_SIZE:
+                    await flush_chunk()
+                    yield emit("received", stored=0)
+            if chunk:
+                await flush_chunk()
+            
+            # One store transaction for the whole import
+            if not await run_in_threadpool(session_service.commit_conversations, session_id, staged):
+                progress.failed.extend(
+                    ImportItemError(index=index, error="Session not found") for index in staged_indexes
+                )
+                staged.clear()
+            conversation_ids = [c.conversation_id for c in staged]
+            yield emit("stored", conversation_ids=conversation_ids)
+            
+            while wait_indexed and conversation_ids:
+                pending, indexed, index_failed = session_service.get_index_progress(session_id, conversation_ids)
+                if not pending or await request.is_disconnected():
+                    break
+                yield emit("indexing", indexed=indexed, index_failed=index_failed)
+                await asyncio.sleep(IMPORT_POLL_INTERVAL)
+            
+            pending, indexed, index_failed = session_service.get_index_progress(session_id, conversation_ids)
+            yield emit("done", indexed=indexed, index_failed=index_failed)
+        
+        return _ImportResponse(events(), media_type="application/x-ndjson")
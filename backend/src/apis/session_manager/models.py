@@ -7,6 +7,7 @@ class Conversation(BaseModel):
     conversation_id: str
     file_path: str
     added_at: str
+    index_status: Optional[str] = None  # RAG ingestion: "pending", "indexed" or "failed"
 
 
 class Session(BaseModel):
@@ -17,9 +18,42 @@ class Session(BaseModel):
     updated_at: str
     conversations_dir: str
     last_conversation_added: Optional[str] = None
+    index_status: Optional[str] = None  # RAG ingestion: "pending", "indexed" or "failed"
     conversations: List[Conversation] = []
 
 
+class SessionSummary(BaseModel):
+    session_id: str
+    name: str
+    description: Optional[str] = None
+    created_at: str
+    updated_at: str
+    last_conversation_added: Optional[str] = None
+    conversation_count: int = 0
+
+
+class SessionPage(BaseModel):
+    items: List[SessionSummary] = []
+    next_cursor: Optional[str] = None
+
+
+class Change(BaseModel):
+    seq: int
+    kind: str  # "session" or "conversation"
+    op: str  # "created", "updated" or "deleted"
+    session_id: str
+    conversation_id: Optional[str] = None
+    session: Optional[SessionSummary] = None  # current state, unless deleted
+    conversation: Optional[Conversation] = None  # current state, unless deleted
+
+
+class ChangeFeed(BaseModel):
+    seq: int  # pass as ``since`` on the next poll
+    reset: bool = False  # changes since the requested seq are gone: refetch everything
+    has_more: bool = False
+    changes: List[Change] = []
+
+
 class SessionCreate(BaseModel):
     name: str
     description: Optional[str] = None
@@ -34,6 +68,25 @@ class ConversationCreate(BaseModel):
     text: str
 
 
+class ConversationImport(BaseModel):
+    items: List[ConversationCreate]
+
+
+class ImportItemError(BaseModel):
+    index: int
+    error: str
+
+
+class ImportProgress(BaseModel):
+    event: str  # "received", "stored", "indexing" or "done"
+    received: int = 0
+    stored: int = 0
+    indexed: int = 0
+    index_failed: int = 0
+    failed: List[ImportItemError] = []  # failures found since the previous event
+    conversation_ids: List[str] = []
+
+
 class SessionsData(BaseModel):
     sessions: List[Session] = []
 
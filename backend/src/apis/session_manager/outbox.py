@@ -0,0 +1,197 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from ..rag import schemas as rag_schemas
+
+# Ingestion status of sessions and conversations in the RAG service
+INDEX_PENDING = "pending"
+INDEX_DONE = "indexed"
+INDEX_FAILED = "failed"
+
+# ("session", session_id, None) or ("conversation", session_id, conversation_id)
+Job = Tuple[str, str, Optional[str]]
+
+
+class IngestionOutbox:
+    """
+    Background delivery of sessions and conversations to the RagService.
+
+    The outbox itself is the ``index_status`` field stored in the session store:
+    anything still ``pending`` is (re)queued when the outbox starts, so nothing
+    is lost across restarts. Workers run on the application event loop, drain
+    the queue in batches, and retry failed batches with exponential backoff
+    before marking their items ``failed``. Conversation ids are passed to the
+    RagService as idempotency keys, so a retried batch never indexes twice.
+    """
+
+    def __init__(
+        self,
+        session_service,
+        rag_service,
+        workers: int = 2,
+        batch_size: int = 128,
+        max_attempts: int = 5,
+        retry_base_delay: float = 1.0,
+    ):
+        self.session_service = session_service
+        self.rag_service = rag_service
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._attempts: Dict[Job, int] = {}
+
+    # --- Lifecycle ---
+
+    async def start(self) -> None:
+        """Start the workers on the running loop and requeue pending items."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"ingestion-outbox-{i}") for i in range(self.workers)
+        ]
+
+        pending = 0
+        for session in self.session_service.store.list_sessions():
+            if session.index_status == INDEX_PENDING:
+                self._queue.put_nowait(("session", session.session_id, None))
+                pending += 1
+            for conversation in session.conversations:
+                if conversation.index_status == INDEX_PENDING:
+                    self._queue.put_nowait(("conversation", session.session_id, conversation.conversation_id))
+                    pending += 1
+        if pending:
+            print(f"Ingestion outbox resumed {pending} pending item(s)")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+    # --- Producers (thread-safe) ---
+
+    def enqueue_session(self, session_id: str) -> None:
+        self._enqueue(("session", session_id, None))
+
+    def enqueue_conversation(self, session_id: str, conversation_id: str) -> None:
+        self._enqueue(("conversation", session_id, conversation_id))
+
+    def enqueue_conversations(self, session_id: str, conversation_ids: List[str]) -> None:
+        self._enqueue(*[("conversation", session_id, conversation_id) for conversation_id in conversation_ids])
+
+    def _enqueue(self, *jobs: Job) -> None:
+        # Before start() the items simply stay pending in the store and are picked up at startup
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._put_jobs, jobs)
+
+    def _put_jobs(self, jobs: Tuple[Job, ...]) -> None:
+        for job in jobs:
+            self._queue.put_nowait(job)
+
+    # --- Workers ---
+
+    async def _worker(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._process(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error: Ingestion batch of {len(batch)} item(s) failed: {e}")
+                self._retry(batch, e)
+
+    async def _process(self, batch: List[Job]) -> None:
+        store = self.session_service.store
+
+        # Sessions first so their conversations have a parent row
+        for job in [job for job in batch if job[0] == "session"]:
+            session = store.get_session(job[1])
+            if session is None or session.index_status != INDEX_PENDING:
+                continue
+            await self.rag_service.create_session(rag_schemas.SessionCreate(
+                session_name=session.name,
+                session_description=session.description,
+                session_id=session.session_id,
+            ))
+            if store.get_session(job[1]) is None:
+                # Deleted meanwhile: the collector may have run before the row existed
+                await self.rag_service.delete_sessions([job[1]])
+                continue
+            await self._set_statuses({job: INDEX_DONE})
+
+        jobs, conversations = [], []
+        for job in [job for job in batch if job[0] == "conversation"]:
+            conversation = store.get_conversation(job[1], job[2])
+            if conversation is None or conversation.index_status != INDEX_PENDING:
+                continue  # deleted or already handled
+            jobs.append(job)
+            conversations.append(conversation)
+
+        # Read all transcripts of the batch in one trip to the threadpool
+        texts = await asyncio.to_thread(self._read_texts, jobs, conversations)
+        statuses: Dict[Job, str] = {}
+        items = []
+        for job, text in zip(jobs, texts):
+            if text is None:
+                statuses[job] = INDEX_FAILED
+                continue
+            statuses[job] = INDEX_DONE
+            items.append(rag_schemas.ConversationCreate(conv_text=text, session_id=job[1], conversation_id=job[2]))
+
+        if items:
+            await self.rag_service.save_conversations(items)
+            # Conversations deleted while they were saved may have been collected
+            # before their rows existed, so remove those rows here
+            deleted = [
+                item.conversation_id for item in items
+                if store.get_conversation(item.session_id, item.conversation_id) is None
+            ]
+            if deleted:
+                await self.rag_service.delete_conversations(deleted)
+        # One journal record for the whole batch
+        await self._set_statuses(statuses)
+
+    def _read_texts(self, jobs: List[Job], conversations: list) -> List[Optional[str]]:
+        content_store = self.session_service.content_store
+        return [content_store.get(job[1], conversation) for job, conversation in zip(jobs, conversations)]
+
+    def _retry(self, batch: List[Job], error: Exception) -> None:
+        failed: Dict[Job, str] = {}
+        for job in batch:
+            attempts = self._attempts.get(job, 0) + 1
+            if attempts >= self.max_attempts:
+                self._attempts.pop(job, None)
+                print(f"Error: Giving up on ingesting {job} after {attempts} attempt(s): {error}")
+                failed[job] = INDEX_FAILED
+                continue
+            self._attempts[job] = attempts
+            delay = self.retry_base_delay * (2 ** (attempts - 1))
+            self._loop.call_later(delay, self._queue.put_nowait, job)
+        if failed:
+            asyncio.ensure_future(self._set_statuses(failed))
+
+    async def _set_statuses(self, statuses: Dict[Job, str]) -> None:
+        """Record the outcome of jobs; all conversation updates go in one store mutation."""
+        store = self.session_service.store
+        futures = [
+            store.update_session(session_id, {"index_status": status})
+            for (kind, session_id, _), status in statuses.items() if kind == "session"
+        ]
+        updates = [
+            (session_id, conversation_id, {"index_status": status})
+            for (kind, session_id, conversation_id), status in statuses.items() if kind == "conversation"
+        ]
+        if updates:
+            futures.append(store.update_conversations(updates))
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        for job in statuses:
+            self._attempts.pop(job, None)
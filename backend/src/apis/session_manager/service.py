@@ -1,16 +1,23 @@
+import asyncio
+import base64
 import json
-import os
-import shutil
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 
-from .models import Session, SessionCreate, SessionUpdate, Conversation, SessionsData
+from .models import (
+    Session, SessionCreate, SessionUpdate, Conversation, SessionSummary, SessionPage, ImportItemError,
+    Change, ChangeFeed,
+)
+from .store import SessionStore
+from .content import FileContentStore, SegmentContentStore
+from .collector import GarbageCollector
+from .outbox import IngestionOutbox, INDEX_PENDING, INDEX_DONE, INDEX_FAILED
 
 
 class SessionService:
-    def __init__(self, base_path: str = None, rag_service=None):
+    def __init__(self, base_path: str = None, rag_service=None, content_backend: str = "files"):
         # Get the directory where this file is located
         if base_path is None:
             self.base_path = Path(__file__).parent
@@ -24,31 +31,25 @@ class SessionService:
         # Create sessions directory if it doesn't exist
         self.sessions_dir.mkdir(exist_ok=True)
         
-        # Initialize sessions.json if it doesn't exist
-        if not self.sessions_json_path.exists():
-            self._save_sessions_data(SessionsData(sessions=[]))
-    
-    def _load_sessions_data(self) -> SessionsData:
-        """Load sessions data from JSON file."""
-        if not self.sessions_json_path.exists():
-            return SessionsData(sessions=[])
+        # Sessions are kept in memory and journaled; sessions.json is the compacted snapshot
+        self.store = SessionStore(self.base_path)
         
-        try:
-            with open(self.sessions_json_path, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-                if not content:
-                    # File exists but is empty
-                    return SessionsData(sessions=[])
-                data = json.loads(content)
-                return SessionsData(**data)
-        except (json.JSONDecodeError, ValueError) as e:
-            # If JSON is invalid, initialize with empty sessions
-            return SessionsData(sessions=[])
+        # Transcripts are stored either one file per conversation or packed in per-session segments
+        if content_backend == "files":
+            self.content_store = FileContentStore(self.base_path)
+        elif content_backend == "segments":
+            self.content_store = SegmentContentStore(self.base_path)
+        else:
+            raise ValueError(f"Unknown content backend: {content_backend}")
+        
+        # Sessions and conversations are pushed to the RAG service by a background outbox
+        self.outbox = IngestionOutbox(self, rag_service) if rag_service else None
+        # Deletions leave tombstones that are cleaned up by a background collector
+        self.collector = GarbageCollector(self, rag_service)
     
-    def _save_sessions_data(self, data: SessionsData) -> None:
-        """Save sessions data to JSON file."""
-        with open(self.sessions_json_path, 'w', encoding='utf-8') as f:
-            json.dump(data.model_dump(), f, indent=2, ensure_ascii=False)
+    def close(self) -> None:
+        """Flush the session store to its snapshot."""
+        self.store.close()
     
     def _generate_session_id(self) -> str:
         """Generate a unique session ID."""
@@ -78,27 +79,6 @@ class SessionService:
         conversations_dir_abs = session_dir / "conversations"
         conversations_dir_abs.mkdir(exist_ok=True)
         
-        # Create session in RAG service if available (using same UUID)
-        if self.rag_service:
-            try:
-                import asyncio
-                from ..rag import schemas as rag_schemas
-                # Create RAG session with the same UUID
-                rag_session_data = rag_schemas.SessionCreate(
-                    session_name=session_data.name,
-                    session_description=session_data.description,
-                    session_id=session_id  # Pass the same UUID
-                )
-                # Run async function - use asyncio.run() which creates a new event loop
-                # This is safe to use in sync code
-                asyncio.run(self.rag_service.create_session(rag_session_data))
-                print(f"Successfully created RAG session with ID: {session_id}")
-            except Exception as e:
-                print(f"Error: Failed to create RAG session: {e}")
-                import traceback
-                traceback.print_exc()
-                # Don't fail the session creation, just log the error
-        
         session = Session(
             session_id=session_id,
             name=session_data.name,
@@ -106,165 +86,258 @@ class SessionService:
             created_at=timestamp,
             updated_at=timestamp,
             conversations_dir=conversations_dir_rel,
+            index_status=INDEX_PENDING if self.outbox else None,
             conversations=[]
         )
         
-        # Load existing sessions and add new one
-        sessions_data = self._load_sessions_data()
-        sessions_data.sessions.append(session)
-        self._save_sessions_data(sessions_data)
+        session = self.store.create_session(session).result()
+        
+        # The RAG session (same UUID) is created in the background
+        if self.outbox:
+            self.outbox.enqueue_session(session_id)
         
         return session
     
     def get_session(self, session_id: str) -> Optional[Session]:
         """Get a session by ID."""
-        sessions_data = self._load_sessions_data()
-        for session in sessions_data.sessions:
-            if session.session_id == session_id:
-                return session
-        return None
+        return self.store.get_session(session_id)
     
     def list_sessions(self) -> List[Session]:
         """List all sessions."""
-        sessions_data = self._load_sessions_data()
-        return sessions_data.sessions
+        return self.store.list_sessions()
     
-    def update_session(self, session_id: str, update_data: SessionUpdate) -> Optional[Session]:
-        """Update a session."""
-        sessions_data = self._load_sessions_data()
-        
-        for i, session in enumerate(sessions_data.sessions):
-            if session.session_id == session_id:
-                # Update fields if provided
-                if update_data.name is not None:
-                    session.name = update_data.name
-                if update_data.description is not None:
-                    session.description = update_data.description
-                
-                session.updated_at = self._get_current_timestamp()
-                
-                sessions_data.sessions[i] = session
-                self._save_sessions_data(sessions_data)
-                
-                return session
-        
-        return None
+    def get_version(self) -> int:
+        """Version of the whole session store; changes with every mutation."""
+        return self.store.version
     
-    def delete_session(self, session_id: str) -> bool:
-        """Delete a session (hard delete - removes everything)."""
-        sessions_data = self._load_sessions_data()
-        
-        session_found = False
-        updated_sessions = []
-        
-        for session in sessions_data.sessions:
-            if session.session_id == session_id:
-                session_found = True
-                # Delete the session directory and all its contents
-                session_dir = (self.sessions_dir / session_id).resolve()
-                if session_dir.exists() and session_dir.is_dir():
-                    try:
-                        shutil.rmtree(str(session_dir))
-                    except Exception as e:
-                        # Log error but continue with deletion from JSON
-                        print(f"Error: Failed to delete session directory {session_dir}: {e}")
-                        # Still remove from JSON even if file deletion fails
-            else:
-                updated_sessions.append(session)
+    def get_session_version(self, session_id: str) -> Optional[int]:
+        """Version of a session and its conversations (None if the session does not exist)."""
+        return self.store.get_session_version(session_id)
+    
+    def list_session_summaries(self, limit: int = 50, cursor: Optional[str] = None) -> SessionPage:
+        """List compact session summaries, most recently updated first."""
+        before = self._decode_cursor(cursor) if cursor else None
+        sessions, next_key = self.store.list_sessions_by_updated(limit, before)
+        
+        items = [self._summarize(session) for session in sessions]
+        next_cursor = self._encode_cursor(next_key) if next_key else None
+        return SessionPage(items=items, next_cursor=next_cursor)
+    
+    def _summarize(self, session: Session) -> SessionSummary:
+        return SessionSummary(
+            session_id=session.session_id,
+            name=session.name,
+            description=session.description,
+            created_at=session.created_at,
+            updated_at=session.updated_at,
+            last_conversation_added=session.last_conversation_added,
+            conversation_count=len(session.conversations),
+        )
+    
+    def get_changes(self, since: int, limit: int = 500) -> ChangeFeed:
+        """
+        Get the sessions and conversations changed after seq ``since``.
+        
+        Several changes to the same item are folded into one entry carrying its
+        current state. When a session is deleted, its conversations are gone too.
+        """
+        entries = self.store.list_changes(since)
+        if entries is None:
+            return ChangeFeed(seq=self.store.changes_version, reset=True)
+        if not entries:
+            return ChangeFeed(seq=max(since, self.store.changes_version))
+        
+        # item -> (first op, seq of its last change), in the order of their last change
+        folded = {}
+        for seq, kind, op, session_id, conversation_id in entries:
+            key = (kind, session_id, conversation_id)
+            first_op = folded.pop(key, (op, seq))[0]
+            folded[key] = (first_op, seq)
         
-        if session_found:
-            sessions_data.sessions = updated_sessions
-            self._save_sessions_data(sessions_data)
-            return True
+        items = list(folded.items())
+        has_more = len(items) > limit
+        if has_more:
+            # Pages end on a seq boundary, or a change sharing the cursor's seq would be skipped
+            boundary = items[limit][1][1]
+            page = [item for item in items[:limit] if item[1][1] != boundary]
+            items = page or [item for item in items if item[1][1] <= boundary]
+            has_more = len(items) < len(folded)
         
-        return False
+        changes = []
+        for (kind, session_id, conversation_id), (first_op, seq) in items:
+            change = Change(seq=seq, kind=kind, op="deleted", session_id=session_id, conversation_id=conversation_id)
+            if kind == "session":
+                session = self.store.get_session(session_id)
+                if session is not None:
+                    change.session = self._summarize(session)
+            else:
+                change.conversation = self.store.get_conversation(session_id, conversation_id)
+            if change.session is not None or change.conversation is not None:
+                change.op = "created" if first_op == "created" else "updated"
+            changes.append(change)
+        
+        # Everything up to the last returned change has been delivered
+        next_seq = items[-1][1][1] if has_more else entries[-1][0]
+        return ChangeFeed(seq=next_seq, has_more=has_more, changes=changes)
     
-    def delete_all_sessions(self) -> int:
-        """Delete all sessions (hard delete - removes everything)."""
-        sessions_data = self._load_sessions_data()
+    async def wait_for_changes(self, since: int, timeout: float) -> None:
+        """Wait until a change newer than seq ``since`` is recorded, or the timeout expires."""
+        if timeout <= 0 or self.store.changes_version > since:
+            return
         
-        deleted_count = 0
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
         
-        # Delete all session directories
-        for session in sessions_data.sessions:
-            session_dir = (self.sessions_dir / session.session_id).resolve()
-            if session_dir.exists() and session_dir.is_dir():
+        def notify(seq: int) -> None:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(changed.set)
+        
+        self.store.add_listener(notify)
+        try:
+            deadline = loop.time() + timeout
+            # Batches that only touch tombstones wake us up without recording a change
+            while self.store.changes_version <= since:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                changed.clear()
                 try:
-                    shutil.rmtree(str(session_dir))
-                    deleted_count += 1
-                except Exception as e:
-                    print(f"Error: Failed to delete session directory {session_dir}: {e}")
+                    await asyncio.wait_for(changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return
+        finally:
+            self.store.remove_listener(notify)
+    
+    def _encode_cursor(self, key: tuple) -> str:
+        """Encode an (updated_at, session_id) key as an opaque cursor."""
+        return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii")
+    
+    def _decode_cursor(self, cursor: str) -> tuple:
+        """Decode a cursor produced by _encode_cursor (raises ValueError if invalid)."""
+        try:
+            updated_at, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return (str(updated_at), str(session_id))
+        except Exception as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+    
+    def list_conversations(self, session_id: str) -> Optional[List[Conversation]]:
+        """List the conversations of a session."""
+        session = self.store.get_session(session_id)
+        if not session:
+            return None
+        return session.conversations
+    
+    def update_session(self, session_id: str, update_data: SessionUpdate) -> Optional[Session]:
+        """Update a session."""
+        # Update fields if provided
+        changes = {}
+        if update_data.name is not None:
+            changes["name"] = update_data.name
+        if update_data.description is not None:
+            changes["description"] = update_data.description
+        changes["updated_at"] = self._get_current_timestamp()
         
-        # Clear all sessions from JSON
-        sessions_data.sessions = []
-        self._save_sessions_data(sessions_data)
+        return self.store.update_session(session_id, changes).result()
+    
+    def delete_session(self, session_id: str) -> bool:
+        """Delete a session (hard delete - files and RAG data are removed in the background)."""
+        session = self.store.delete_session(session_id).result()
+        if not session:
+            return False
         
-        return deleted_count
+        self.collector.wake()
+        return True
+    
+    def delete_all_sessions(self) -> int:
+        """Delete all sessions (hard delete - files and RAG data are removed in the background)."""
+        sessions = self.store.delete_all_sessions().result()
+        self.collector.wake()
+        return len(sessions)
     
     def add_conversation(self, session_id: str, conversation_text: str) -> Optional[Conversation]:
         """Add a conversation to a session."""
-        sessions_data = self._load_sessions_data()
-        
-        for i, session in enumerate(sessions_data.sessions):
-            if session.session_id == session_id:
-                # Generate conversation ID
-                conversation_id = self._generate_conversation_id()
-                timestamp = self._get_current_timestamp()
-                
-                # Store relative path
-                conversation_file_rel = f"{session.conversations_dir}/{conversation_id}.txt"
-                
-                # Use absolute path for file operations
-                conversation_file_abs = self.base_path / conversation_file_rel
-                conversation_file_abs.parent.mkdir(parents=True, exist_ok=True)
-                with open(conversation_file_abs, 'w', encoding='utf-8') as f:
-                    f.write(conversation_text)
-                
-                conversation = Conversation(
-                    conversation_id=conversation_id,
-                    file_path=conversation_file_rel,
-                    added_at=timestamp
-                )
-                
-                # Save conversation to RAG service if available
-                if self.rag_service:
-                    try:
-                        import asyncio
-                        from ..rag import schemas as rag_schemas
-                        # Create RAG conversation with the same session_id (UUID)
-                        rag_conv_data = rag_schemas.ConversationCreate(
-                            conv_text=conversation_text,
-                            session_id=session_id  # Use the same UUID
-                        )
-                        # Run async function
-                        asyncio.run(self.rag_service.save_conversation(rag_conv_data))
-                        print(f"Successfully saved conversation to RAG for session: {session_id}")
-                    except Exception as e:
-                        print(f"Warning: Failed to save conversation to RAG: {e}")
-                        import traceback
-                        traceback.print_exc()
-                        # Don't fail the conversation creation, just log the error
-                
-                # Update session
-                session.conversations.append(conversation)
-                session.last_conversation_added = timestamp
-                session.updated_at = timestamp
-                
-                sessions_data.sessions[i] = session
-                self._save_sessions_data(sessions_data)
-                
-                return conversation
-        
-        return None
+        session = self.store.get_session(session_id)
+        if not session:
+            return None
+        
+        # Generate conversation ID
+        conversation_id = self._generate_conversation_id()
+        timestamp = self._get_current_timestamp()
+        
+        # Store the transcript; the returned path is relative to base_path
+        conversation_file_rel = self.content_store.put(session, conversation_id, conversation_text)
+        
+        conversation = Conversation(
+            conversation_id=conversation_id,
+            file_path=conversation_file_rel,
+            added_at=timestamp,
+            index_status=INDEX_PENDING if self.outbox else None
+        )
+        
+        # Update session
+        if not self.store.add_conversation(session_id, conversation).result():
+            # The session was deleted meanwhile
+            self.content_store.delete(session_id, conversation)
+            return None
+        
+        # Indexing in the RAG service happens in the background; index_status tracks it
+        if self.outbox:
+            self.outbox.enqueue_conversation(session_id, conversation_id)
+        
+        return conversation
+    
+    def stage_conversations(
+        self, session_id: str, items: List[Tuple[int, str]]
+    ) -> Tuple[List[Conversation], List[ImportItemError]]:
+        """Write the transcripts of a bulk import; they stay invisible until commit_conversations."""
+        session = self.store.get_session(session_id)
+        if not session:
+            return [], [ImportItemError(index=index, error="Session not found") for index, _ in items]
+        
+        conversations, failed = [], []
+        for index, text in items:
+            conversation_id = self._generate_conversation_id()
+            try:
+                file_path = self.content_store.put(session, conversation_id, text)
+            except Exception as e:
+                failed.append(ImportItemError(index=index, error=str(e)))
+                continue
+            conversations.append(Conversation(
+                conversation_id=conversation_id,
+                file_path=file_path,
+                added_at=self._get_current_timestamp(),
+                index_status=INDEX_PENDING if self.outbox else None
+            ))
+        return conversations, failed
+    
+    def commit_conversations(self, session_id: str, conversations: List[Conversation]) -> bool:
+        """Add staged conversations to their session in a single store transaction."""
+        if not self.store.add_conversations(session_id, conversations).result():
+            # The session was deleted meanwhile
+            for conversation in conversations:
+                self.content_store.delete(session_id, conversation)
+            return False
+        
+        if self.outbox:
+            self.outbox.enqueue_conversations(session_id, [c.conversation_id for c in conversations])
+        return True
+    
+    def get_index_progress(self, session_id: str, conversation_ids: List[str]) -> Tuple[int, int, int]:
+        """Count (pending, indexed, failed) RAG ingestion statuses of the given conversations."""
+        pending = indexed = failed = 0
+        for conversation_id in conversation_ids:
+            conversation = self.store.get_conversation(session_id, conversation_id)
+            if conversation is None or conversation.index_status == INDEX_FAILED:
+                failed += 1
+            elif conversation.index_status == INDEX_DONE:
+                indexed += 1
+            else:
+                pending += 1
+        return pending, indexed, failed
     
     def get_conversation(self, session_id: str, conversation_id: str) -> Optional[Conversation]:
         """Get a specific conversation from a session."""
-        session = self.get_session(session_id)
-        if session:
-            for conversation in session.conversations:
-                if conversation.conversation_id == conversation_id:
-                    return conversation
-        return None
+        return self.store.get_conversation(session_id, conversation_id)
     
     def get_conversation_content(self, session_id: str, conversation_id: str) -> Optional[str]:
         """Get the content of a conversation file."""
@@ -272,52 +345,68 @@ class SessionService:
         if not conversation:
             return None
         
-        # Resolve the file path
-        conversation_file = self.base_path / conversation.file_path
-        if conversation_file.exists():
-            try:
-                with open(conversation_file, 'r', encoding='utf-8') as f:
-                    return f.read()
-            except Exception as e:
-                print(f"Error reading conversation file: {e}")
-                return None
-        return None
+        return self.content_store.get(session_id, conversation)
+    
+    def get_conversation_content_size(self, session_id: str, conversation_id: str) -> Optional[int]:
+        """Get the size in bytes of a conversation's content."""
+        conversation = self.get_conversation(session_id, conversation_id)
+        if not conversation:
+            return None
+        return self.content_store.size(session_id, conversation)
+    
+    def iter_conversation_content(self, session_id: str, conversation_id: str, start: int, end: int) -> Iterator[bytes]:
+        """Stream the bytes [start, end) of a conversation's content."""
+        conversation = self.get_conversation(session_id, conversation_id)
+        if not conversation:
+            return iter(())
+        return self.content_store.iter_range(session_id, conversation, start, end)
+    
+    def get_conversation_turns(
+        self, session_id: str, conversation_id: str, offset: int, limit: Optional[int]
+    ) -> Optional[Tuple[List[str], int]]:
+        """Get a window of speaker turns, rendered one per line, and the total number of turns."""
+        conversation = self.get_conversation(session_id, conversation_id)
+        if not conversation:
+            return None
+        
+        result = self.content_store.get_turns(session_id, conversation, offset, limit)
+        if result is None:
+            return None
+        window, total = result
+        lines = [f"{speaker}: {text}" if speaker is not None else text for speaker, text in window]
+        return lines, total
     
     def delete_conversation(self, session_id: str, conversation_id: str) -> bool:
-        """Delete a conversation from a session (hard delete)."""
-        sessions_data = self._load_sessions_data()
-        
-        for i, session in enumerate(sessions_data.sessions):
-            if session.session_id == session_id:
-                conversation_found = False
-                updated_conversations = []
-                
-                for conversation in session.conversations:
-                    if conversation.conversation_id == conversation_id:
-                        conversation_found = True
-                        # Delete the conversation file
-                        conversation_file = (self.base_path / conversation.file_path).resolve()
-                        if conversation_file.exists():
-                            try:
-                                conversation_file.unlink()
-                            except Exception as e:
-                                print(f"Error deleting conversation file {conversation_file}: {e}")
-                    else:
-                        updated_conversations.append(conversation)
-                
-                if conversation_found:
-                    session.conversations = updated_conversations
-                    session.updated_at = self._get_current_timestamp()
-                    # Update last_conversation_added if needed
-                    if not session.conversations:
-                        session.last_conversation_added = None
-                    else:
-                        # Set to the most recent conversation
-                        latest = max(session.conversations, key=lambda c: c.added_at)
-                        session.last_conversation_added = latest.added_at
-                    
-                    sessions_data.sessions[i] = session
-                    self._save_sessions_data(sessions_data)
-                    return True
-        
-        return False
+        """Delete a conversation from a session (hard delete - content is removed in the background)."""
+        conversation = self.store.delete_conversation(
+            session_id, conversation_id, self._get_current_timestamp()
+        ).result()
+        if not conversation:
+            return False
+        
+        self.collector.wake()
+        return True
+    
+    def migrate_content_to_segments(self) -> int:
+        """Pack every per-file transcript into its session's segment (segments backend only)."""
+        if not isinstance(self.content_store, SegmentContentStore):
+            raise RuntimeError("Content migration requires the 'segments' content backend")
+        
+        migrated_count = 0
+        for session in self.store.list_sessions():
+            migrated = self.content_store.migrate_session(session)
+            for conversation_id, file_path in migrated.items():
+                self.store.update_conversation(session.session_id, conversation_id, {"file_path": file_path}).result()
+            # Only drop the old files once the store points at the segment
+            self.content_store.remove_legacy_files(session, list(migrated))
+            migrated_count += len(migrated)
+        
+        return migrated_count
+
+
+if __name__ == "__main__":
+    # Migrate existing per-file transcripts into packed segments (with the backend stopped):
+    #   python -m src.apis.session_manager.service
+    service = SessionService(content_backend="segments")
+    print(f"Migrated {service.migrate_content_to_segments()} conversation(s) to segments")
+    service.close()
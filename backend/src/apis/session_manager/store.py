@@ -0,0 +1,797 @@
+import bisect
+import collections
+import itertools
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .models import Session, Conversation, SessionsData
+
+# (seq, kind, op, session_id, conversation_id) -- kind is "session" or "conversation",
+# op is "created", "updated" or "deleted"
+ChangeEntry = Tuple[int, str, str, str, Optional[str]]
+
+
+def _fsync_dir(path: Path) -> None:
+    """Flush a directory entry so a rename survives a crash (no-op where unsupported)."""
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class SessionStore:
+    """
+    In-memory session storage backed by an append-only journal.
+
+    Every mutation is appended as one JSON line to ``sessions.journal`` before it
+    is applied in memory, so a request only pays for the size of its change. A
+    background thread periodically folds the journal into the ``sessions.json``
+    snapshot. Sessions are treated as immutable: mutations replace the stored
+    model with an updated copy, so readers never observe a half-applied change.
+    Lockless reads are served from a committed copy of the indexes that a batch
+    only updates once it is durable, so they never see a mutation that a failed
+    flush rolls back.
+
+    Sessions are indexed by ``session_id``, conversations by
+    ``(session_id, conversation_id)``, and a sorted ``(updated_at, session_id)``
+    index serves keyset-paginated listings.
+
+    Mutations are executed by a single writer thread and return futures. The
+    writer drains every mutation queued while the previous batch was being
+    flushed, applies them in order and makes the whole batch durable with one
+    journal write and one fsync (group commit).
+
+    Deleting a session or conversation leaves a tombstone: the item disappears
+    from every read immediately, and the tombstone is kept (and snapshotted)
+    until a collector has removed the item's files and RAG data and purges it.
+
+    The last ``change_log_size`` changes to sessions and conversations are kept
+    in a ring keyed by seq for incremental client sync; clients asking for
+    changes older than the ring (or than the last restart) must resync.
+    """
+
+    def __init__(
+        self,
+        base_path: Path,
+        compact_threshold: int = 1000,
+        fsync: bool = True,
+        max_batch_size: int = 256,
+        change_log_size: int = 10000,
+    ):
+        self.snapshot_path = base_path / "sessions.json"
+        self.journal_path = base_path / "sessions.journal"
+        self.rotated_journal_path = base_path / "sessions.journal.1"
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+        self.max_batch_size = max_batch_size
+
+        self._lock = threading.RLock()
+        self._reset()
+        self._seq = 0
+        self._journal_entries = 0
+        self._changes: "collections.deque[ChangeEntry]" = collections.deque(maxlen=change_log_size)
+        self._changes_floor = 0
+        self._listeners: List[Callable[[int], None]] = []
+        # Keys changed by the batch being written, published once it is durable
+        self._dirty_sessions: Set[str] = set()
+        self._dirty_conversations: Set[Tuple[str, str]] = set()
+        self._dirty_all = True  # publishes the recovered state
+
+        self._recover()
+        self._publish()
+
+        self._journal = open(self.journal_path, "ab")
+        self._journal_size = self._journal.tell()
+        self._pending: List[bytes] = []
+
+        self._queue: "queue.Queue[Optional[Tuple[Callable, Future]]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="session-store-writer", daemon=True)
+        self._writer.start()
+
+        self._compact_requested = threading.Event()
+        self._closed = False
+        self._compactor = threading.Thread(
+            target=self._compact_loop, name="session-store-compactor", daemon=True
+        )
+        self._compactor.start()
+
+    def _reset(self) -> None:
+        self._sessions: Dict[str, Session] = {}
+        self._conversations: Dict[Tuple[str, str], Conversation] = {}
+        self._by_updated: List[Tuple[str, str]] = []
+        # seq of the last record that changed each session (drives ETags)
+        self._versions: Dict[str, int] = {}
+        self._session_tombstones: Dict[str, Session] = {}
+        self._conversation_tombstones: Dict[Tuple[str, str], Conversation] = {}
+
+    # --- Recovery ---
+
+    def _recover(self) -> None:
+        """Load the snapshot, then replay any journal records newer than it."""
+        snapshot_seq = self._load_snapshot()
+        self._seq = snapshot_seq
+        self._changes_floor = snapshot_seq
+
+        replayed = 0
+        for path in (self.rotated_journal_path, self.journal_path):
+            replayed += self._replay_journal(path, truncate=path == self.journal_path)
+
+        if replayed or self.rotated_journal_path.exists() or not self.snapshot_path.exists():
+            # Fold everything we just replayed into a fresh snapshot so the next
+            # start does not have to replay it again.
+            self._write_snapshot(self._capture())
+            self.rotated_journal_path.unlink(missing_ok=True)
+            with open(self.journal_path, "wb"):
+                pass
+        if replayed:
+            print(f"Session store recovered {replayed} journal record(s) up to seq {self._seq}")
+
+    def _load_snapshot(self) -> int:
+        if not self.snapshot_path.exists():
+            return 0
+
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+            if not content:
+                return 0
+            data = json.loads(content)
+            sessions_data = SessionsData(**data)
+        except (json.JSONDecodeError, ValueError) as e:
+            # Keep the unreadable file around instead of overwriting it on the next compaction
+            corrupt_path = self.snapshot_path.with_name(f"sessions.json.corrupt-{int(time.time())}")
+            os.replace(self.snapshot_path, corrupt_path)
+            print(f"Error: Invalid sessions snapshot moved to {corrupt_path}: {e}")
+            return 0
+
+        self._seq = int(data.get("seq", 0))
+        for session in sessions_data.sessions:
+            self._put_session(session, added=session.conversations)
+        tombstones = data.get("tombstones", {})
+        for session in tombstones.get("sessions", []):
+            self._session_tombstones[session["session_id"]] = Session(**session)
+        for item in tombstones.get("conversations", []):
+            conversation = Conversation(**item["conversation"])
+            self._conversation_tombstones[(item["session_id"], conversation.conversation_id)] = conversation
+        return int(data.get("seq", 0))
+
+    def _replay_journal(self, path: Path, truncate: bool) -> int:
+        if not path.exists():
+            return 0
+
+        replayed = 0
+        good_offset = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn write at the tail
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+                good_offset += len(line)
+                # Records can be in both journals if a crash interrupted compact()
+                if record["seq"] <= self._seq:
+                    continue
+                self._seq = record["seq"]
+                self._apply(record)
+                replayed += 1
+
+        if truncate and good_offset < path.stat().st_size:
+            print(f"Warning: Discarding incomplete journal tail in {path} after byte {good_offset}")
+            with open(path, "r+b") as f:
+                f.truncate(good_offset)
+        return replayed
+
+    def _rebuild(self) -> None:
+        """Reload the in-memory state from disk after a failed journal write."""
+        self._reset()
+        snapshot_seq = self._load_snapshot()
+        self._seq = snapshot_seq
+        self._changes.clear()
+        self._changes_floor = snapshot_seq
+        for path in (self.rotated_journal_path, self.journal_path):
+            self._replay_journal(path, truncate=False)
+        # Back to the published state: nothing to publish
+        self._dirty_sessions.clear()
+        self._dirty_conversations.clear()
+        self._dirty_all = False
+
+    # --- Group commit writer ---
+
+    def _submit(self, mutation: Callable) -> Future:
+        future: Future = Future()
+        if self._closed:
+            future.set_exception(RuntimeError("Session store is closed"))
+            return future
+        self._queue.put((mutation, future))
+        return future
+
+    def _write_loop(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            # Everything that queued up during the previous flush joins this batch
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[Tuple[Callable, Future]]) -> None:
+        outcomes = []
+        with self._lock:
+            for mutation, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    outcomes.append((future, mutation(), None))
+                except Exception as e:
+                    outcomes.append((future, None, e))
+
+            try:
+                self._flush_pending()
+            except Exception as e:
+                print(f"Error: Session journal write failed, reloading state from disk: {e}")
+                self._journal.truncate(self._journal_size)
+                self._pending = []
+                self._rebuild()
+                for future, _, _ in outcomes:
+                    future.set_exception(e)
+                return
+            self._publish()
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        seq = self._seq
+        for listener in list(self._listeners):
+            try:
+                listener(seq)
+            except Exception as e:
+                print(f"Error: Session store listener failed: {e}")
+
+    def _stage(self, record: dict) -> int:
+        """Apply a record in memory and queue it for the next journal flush."""
+        seq = self._seq + 1
+        record["seq"] = seq
+        self._seq = seq
+        try:
+            self._apply(record)
+        except Exception:
+            self._seq = seq - 1
+            raise
+        self._pending.append(
+            (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        )
+        return seq
+
+    def _flush_pending(self) -> None:
+        """Write all staged records with a single write and fsync."""
+        if not self._pending:
+            return
+        data = b"".join(self._pending)
+        self._journal.write(data)
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+        self._journal_size += len(data)
+        self._journal_entries += len(self._pending)
+        self._pending = []
+        if self._journal_entries >= self.compact_threshold:
+            self._compact_requested.set()
+
+    def _publish(self) -> None:
+        """Copy the changes of a durable batch to the indexes served to lockless reads."""
+        if self._dirty_all:
+            self._committed_sessions = dict(self._sessions)
+            self._committed_conversations = dict(self._conversations)
+            self._committed_versions = dict(self._versions)
+        else:
+            for session_id in self._dirty_sessions:
+                session = self._sessions.get(session_id)
+                if session is None:
+                    self._committed_sessions.pop(session_id, None)
+                    self._committed_versions.pop(session_id, None)
+                else:
+                    self._committed_sessions[session_id] = session
+                    self._committed_versions[session_id] = self._versions[session_id]
+            for key in self._dirty_conversations:
+                conversation = self._conversations.get(key)
+                if conversation is None:
+                    self._committed_conversations.pop(key, None)
+                else:
+                    self._committed_conversations[key] = conversation
+        self._committed_seq = self._seq
+        self._dirty_sessions.clear()
+        self._dirty_conversations.clear()
+        self._dirty_all = False
+
+    def _record_change(self, kind: str, op: str, session_id: str, conversation_id: Optional[str] = None) -> None:
+        if len(self._changes) == self._changes.maxlen:
+            # The evicted change is no longer available to clients
+            self._changes_floor = self._changes[0][0]
+        self._changes.append((self._seq, kind, op, session_id, conversation_id))
+
+    def _put_session(
+        self,
+        session: Session,
+        added: List[Conversation] = (),
+        removed: List[str] = (),
+    ) -> None:
+        """
+        Store a session version and keep the indexes in sync.
+
+        Only the conversations in ``added`` (new or replaced) and ``removed``
+        (ids) are re-indexed, so a mutation costs the size of its change
+        rather than the size of the session.
+        """
+        previous = self._sessions.get(session.session_id)
+        if previous is not None:
+            self._unindex_updated(previous)
+        self._sessions[session.session_id] = session
+        self._versions[session.session_id] = self._seq
+        self._dirty_sessions.add(session.session_id)
+        bisect.insort(self._by_updated, (session.updated_at, session.session_id))
+        for conversation in added:
+            key = (session.session_id, conversation.conversation_id)
+            self._conversations[key] = conversation
+            self._dirty_conversations.add(key)
+        for conversation_id in removed:
+            key = (session.session_id, conversation_id)
+            self._conversations.pop(key, None)
+            self._dirty_conversations.add(key)
+
+    def _drop_session(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.pop(session_id, None)
+        self._versions.pop(session_id, None)
+        self._dirty_sessions.add(session_id)
+        if session is not None:
+            self._unindex_updated(session)
+            for conversation in session.conversations:
+                key = (session.session_id, conversation.conversation_id)
+                self._conversations.pop(key, None)
+                self._dirty_conversations.add(key)
+        return session
+
+    def _unindex_updated(self, session: Session) -> None:
+        key = (session.updated_at, session.session_id)
+        i = bisect.bisect_left(self._by_updated, key)
+        if i < len(self._by_updated) and self._by_updated[i] == key:
+            del self._by_updated[i]
+
+    def _apply(self, record: dict) -> None:
+        """Apply a journal record to the in-memory state (used live and during replay)."""
+        op = record["op"]
+
+        if op == "create_session":
+            session = Session(**record["session"])
+            self._put_session(session, added=session.conversations)
+            self._record_change("session", "created", record["session"]["session_id"])
+
+        elif op == "update_session":
+            session = self._sessions.get(record["session_id"])
+            if session:
+                self._put_session(session.model_copy(update=record["changes"]))
+                self._record_change("session", "updated", session.session_id)
+
+        elif op == "delete_session":
+            session = self._drop_session(record["session_id"])
+            if session:
+                self._session_tombstones[session.session_id] = session
+                self._record_change("session", "deleted", session.session_id)
+
+        elif op == "delete_all_sessions":
+            for session_id in self._sessions:
+                self._record_change("session", "deleted", session_id)
+            session_tombstones = {**self._session_tombstones, **self._sessions}
+            conversation_tombstones = self._conversation_tombstones
+            self._reset()
+            self._dirty_all = True
+            self._session_tombstones = session_tombstones
+            self._conversation_tombstones = conversation_tombstones
+
+        elif op == "add_conversation":
+            session = self._sessions.get(record["session_id"])
+            if session:
+                conversation = Conversation(**record["conversation"])
+                self._put_session(session.model_copy(update={
+                    "conversations": session.conversations + [conversation],
+                    "last_conversation_added": conversation.added_at,
+                    "updated_at": conversation.added_at,
+                }), added=[conversation])
+                self._record_change("conversation", "created", session.session_id, conversation.conversation_id)
+                self._record_change("session", "updated", session.session_id)
+
+        elif op == "add_conversations":
+            session = self._sessions.get(record["session_id"])
+            if session and record["conversations"]:
+                conversations = [Conversation(**c) for c in record["conversations"]]
+                last_added = max(c.added_at for c in conversations)
+                self._put_session(session.model_copy(update={
+                    "conversations": session.conversations + conversations,
+                    "last_conversation_added": last_added,
+                    "updated_at": last_added,
+                }), added=conversations)
+                for conversation in conversations:
+                    self._record_change("conversation", "created", session.session_id, conversation.conversation_id)
+                self._record_change("session", "updated", session.session_id)
+
+        elif op == "update_conversation":
+            session = self._sessions.get(record["session_id"])
+            current = self._conversations.get((record["session_id"], record["conversation_id"]))
+            if session and current:
+                updated = current.model_copy(update=record["changes"])
+                self._put_session(session.model_copy(update={
+                    "conversations": self._replace_conversation(session.conversations, current, updated),
+                }), added=[updated])
+                self._record_change("conversation", "updated", session.session_id, record["conversation_id"])
+
+        elif op == "update_conversations":
+            by_session: Dict[str, Dict[str, dict]] = {}
+            for session_id, conversation_id, changes in record["updates"]:
+                by_session.setdefault(session_id, {})[conversation_id] = changes
+            for session_id, updates in by_session.items():
+                session = self._sessions.get(session_id)
+                if not session:
+                    continue
+                # One pass (and one new session version) per session, however many conversations changed
+                conversations, replaced = [], []
+                for conversation in session.conversations:
+                    changes = updates.get(conversation.conversation_id)
+                    if changes is not None:
+                        conversation = conversation.model_copy(update=changes)
+                        replaced.append(conversation)
+                    conversations.append(conversation)
+                if replaced:
+                    self._put_session(session.model_copy(update={"conversations": conversations}), added=replaced)
+                    for conversation in replaced:
+                        self._record_change("conversation", "updated", session_id, conversation.conversation_id)
+
+        elif op == "delete_conversation":
+            session = self._sessions.get(record["session_id"])
+            conversation = self._conversations.get((record["session_id"], record["conversation_id"]))
+            if session and conversation:
+                self._conversation_tombstones[(session.session_id, conversation.conversation_id)] = conversation
+                conversations = self._replace_conversation(session.conversations, conversation, None)
+                last_added = session.last_conversation_added
+                if conversation.added_at == last_added:
+                    last_added = max((c.added_at for c in conversations), default=None)
+                self._put_session(session.model_copy(update={
+                    "conversations": conversations,
+                    "last_conversation_added": last_added,
+                    "updated_at": record["updated_at"],
+                }), removed=[conversation.conversation_id])
+                self._record_change("conversation", "deleted", session.session_id, conversation.conversation_id)
+                self._record_change("session", "updated", session.session_id)
+
+        elif op == "purge_sessions":
+            purged = set(record["session_ids"])
+            for session_id in purged:
+                self._session_tombstones.pop(session_id, None)
+            # Conversation tombstones are covered by their session's cleanup
+            for key in [key for key in self._conversation_tombstones if key[0] in purged]:
+                del self._conversation_tombstones[key]
+
+        elif op == "purge_conversations":
+            for session_id, conversation_id in record["keys"]:
+                self._conversation_tombstones.pop((session_id, conversation_id), None)
+
+        else:
+            raise ValueError(f"Unknown journal operation: {op}")
+
+    @staticmethod
+    def _replace_conversation(
+        conversations: List[Conversation], current: Conversation, replacement: Optional[Conversation]
+    ) -> List[Conversation]:
+        """Copy of ``conversations`` with ``current`` replaced (or removed when ``replacement`` is None)."""
+        # Identity scan: no model comparisons, no per-item attribute lookups
+        i = next(i for i, c in enumerate(conversations) if c is current)
+        return conversations[:i] + ([replacement] if replacement is not None else []) + conversations[i + 1:]
+
+    # --- Compaction ---
+
+    def _capture(self) -> tuple:
+        """Take the references needed for a snapshot (models are immutable, so no deep copy)."""
+        return (
+            self._seq,
+            list(self._sessions.values()),
+            list(self._session_tombstones.values()),
+            list(self._conversation_tombstones.items()),
+        )
+
+    def _write_snapshot(self, state: tuple) -> None:
+        """Atomically replace the snapshot file."""
+        seq, sessions, session_tombstones, conversation_tombstones = state
+        data = {
+            "seq": seq,
+            "sessions": [session.model_dump() for session in sessions],
+            "tombstones": {
+                "sessions": [session.model_dump() for session in session_tombstones],
+                "conversations": [
+                    {"session_id": session_id, "conversation": conversation.model_dump()}
+                    for (session_id, _), conversation in conversation_tombstones
+                ],
+            },
+        }
+        tmp_path = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        _fsync_dir(self.snapshot_path.parent)
+
+    def compact(self) -> None:
+        """Fold the current journal into a new snapshot."""
+        with self._lock:
+            if self._journal_entries == 0 and not self.rotated_journal_path.exists():
+                return
+            # Rotate the journal so writers keep appending while the snapshot is written
+            self._journal.close()
+            if self.rotated_journal_path.exists():
+                # The last snapshot write failed and the rotated journal still holds
+                # records missing from the snapshot: append ours instead of replacing it
+                with open(self.journal_path, "rb") as src, open(self.rotated_journal_path, "ab") as dst:
+                    shutil.copyfileobj(src, dst)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                self._journal = open(self.journal_path, "wb")
+            else:
+                os.replace(self.journal_path, self.rotated_journal_path)
+                self._journal = open(self.journal_path, "ab")
+            self._journal_size = 0
+            self._journal_entries = 0
+            state = self._capture()
+
+        self._write_snapshot(state)
+        self.rotated_journal_path.unlink(missing_ok=True)
+
+    def _compact_loop(self) -> None:
+        while True:
+            self._compact_requested.wait()
+            self._compact_requested.clear()
+            if self._closed:
+                return
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Error: Session store compaction failed: {e}")
+
+    def close(self) -> None:
+        """Drain the writer, stop the compactor and write a final snapshot."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        self._compact_requested.set()
+        self._compactor.join()
+        self.compact()
+        self._journal.close()
+
+    # --- Reads ---
+
+    @property
+    def version(self) -> int:
+        """Sequence number of the last durable mutation."""
+        return self._committed_seq
+
+    def get_session_version(self, session_id: str) -> Optional[int]:
+        """Sequence number of the last mutation that changed a session."""
+        return self._committed_versions.get(session_id)
+
+    @property
+    def changes_version(self) -> int:
+        """Sequence number of the last recorded change to a session or conversation."""
+        with self._lock:
+            return self._changes[-1][0] if self._changes else self._changes_floor
+
+    def list_changes(self, since: int) -> Optional[List[ChangeEntry]]:
+        """
+        Return the changes recorded after seq ``since``, oldest first.
+
+        Returns None when changes after ``since`` are no longer available and
+        the caller has to resync from a full listing.
+        """
+        with self._lock:
+            if since < self._changes_floor:
+                return None
+            if not self._changes or self._changes[-1][0] <= since:
+                return []
+            # Changes are appended in seq order, so the newer ones are at the right end
+            changes = []
+            for entry in reversed(self._changes):
+                if entry[0] <= since:
+                    break
+                changes.append(entry)
+        return changes[::-1]
+
+    def add_listener(self, listener: Callable[[int], None]) -> None:
+        """Call ``listener(seq)`` from the writer thread after every durable batch."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[int], None]) -> None:
+        try:
+            self._listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def get_session(self, session_id: str) -> Optional[Session]:
+        return self._committed_sessions.get(session_id)
+
+    def list_sessions(self) -> List[Session]:
+        return list(self._committed_sessions.values())
+
+    def get_conversation(self, session_id: str, conversation_id: str) -> Optional[Conversation]:
+        return self._committed_conversations.get((session_id, conversation_id))
+
+    def list_session_tombstones(self, limit: int) -> List[Session]:
+        with self._lock:
+            return list(itertools.islice(self._session_tombstones.values(), limit))
+
+    def list_conversation_tombstones(self, limit: int) -> List[Tuple[str, Conversation]]:
+        with self._lock:
+            items = list(itertools.islice(self._conversation_tombstones.items(), limit))
+        return [(session_id, conversation) for (session_id, _), conversation in items]
+
+    def list_sessions_by_updated(
+        self, limit: int, before: Optional[Tuple[str, str]] = None
+    ) -> Tuple[List[Session], Optional[Tuple[str, str]]]:
+        """
+        Return up to ``limit`` sessions, most recently updated first.
+
+        ``before`` is the ``(updated_at, session_id)`` key of the last session of
+        the previous page; the returned key is the cursor for the next page.
+        """
+        with self._lock:
+            end = len(self._by_updated) if before is None else bisect.bisect_left(self._by_updated, before)
+            start = max(0, end - limit)
+            keys = self._by_updated[start:end][::-1]
+            sessions = [self._sessions[session_id] for _, session_id in keys]
+        next_key = keys[-1] if keys and start > 0 else None
+        return sessions, next_key
+
+    # --- Mutations (executed by the writer thread, results delivered through futures) ---
+
+    def create_session(self, session: Session) -> "Future[Session]":
+        def mutation():
+            self._stage({"op": "create_session", "session": session.model_dump()})
+            return self._sessions[session.session_id]
+        return self._submit(mutation)
+
+    def update_session(self, session_id: str, changes: dict) -> "Future[Optional[Session]]":
+        def mutation():
+            if session_id not in self._sessions:
+                return None
+            self._stage({"op": "update_session", "session_id": session_id, "changes": changes})
+            return self._sessions[session_id]
+        return self._submit(mutation)
+
+    def delete_session(self, session_id: str) -> "Future[Optional[Session]]":
+        def mutation():
+            session = self._sessions.get(session_id)
+            if not session:
+                return None
+            self._stage({"op": "delete_session", "session_id": session_id})
+            return session
+        return self._submit(mutation)
+
+    def delete_all_sessions(self) -> "Future[List[Session]]":
+        def mutation():
+            sessions = list(self._sessions.values())
+            self._stage({"op": "delete_all_sessions"})
+            return sessions
+        return self._submit(mutation)
+
+    def add_conversation(self, session_id: str, conversation: Conversation) -> "Future[Optional[Session]]":
+        def mutation():
+            if session_id not in self._sessions:
+                return None
+            self._stage({
+                "op": "add_conversation",
+                "session_id": session_id,
+                "conversation": conversation.model_dump(),
+            })
+            return self._sessions[session_id]
+        return self._submit(mutation)
+
+    def add_conversations(self, session_id: str, conversations: List[Conversation]) -> "Future[Optional[Session]]":
+        """Add many conversations to a session as a single journal record."""
+        def mutation():
+            if session_id not in self._sessions:
+                return None
+            self._stage({
+                "op": "add_conversations",
+                "session_id": session_id,
+                "conversations": [conversation.model_dump() for conversation in conversations],
+            })
+            return self._sessions[session_id]
+        return self._submit(mutation)
+
+    def update_conversation(
+        self, session_id: str, conversation_id: str, changes: dict
+    ) -> "Future[Optional[Conversation]]":
+        def mutation():
+            if (session_id, conversation_id) not in self._conversations:
+                return None
+            self._stage({
+                "op": "update_conversation",
+                "session_id": session_id,
+                "conversation_id": conversation_id,
+                "changes": changes,
+            })
+            return self._conversations[(session_id, conversation_id)]
+        return self._submit(mutation)
+
+    def update_conversations(self, updates: List[Tuple[str, str, dict]]) -> "Future[int]":
+        """
+        Apply ``(session_id, conversation_id, changes)`` updates as a single journal record.
+
+        Updates of conversations that no longer exist are skipped; returns how
+        many were applied.
+        """
+        def mutation():
+            present = [
+                [session_id, conversation_id, changes]
+                for session_id, conversation_id, changes in updates
+                if (session_id, conversation_id) in self._conversations
+            ]
+            if present:
+                self._stage({"op": "update_conversations", "updates": present})
+            return len(present)
+        return self._submit(mutation)
+
+    def delete_conversation(
+        self, session_id: str, conversation_id: str, updated_at: str
+    ) -> "Future[Optional[Conversation]]":
+        def mutation():
+            conversation = self._conversations.get((session_id, conversation_id))
+            if not conversation:
+                return None
+            self._stage({
+                "op": "delete_conversation",
+                "session_id": session_id,
+                "conversation_id": conversation_id,
+                "updated_at": updated_at,
+            })
+            return conversation
+        return self._submit(mutation)
+
+    def purge_sessions(self, session_ids: List[str]) -> Future:
+        """Forget session tombstones once their data has been collected."""
+        def mutation():
+            self._stage({"op": "purge_sessions", "session_ids": list(session_ids)})
+        return self._submit(mutation)
+
+    def purge_conversations(self, keys: List[Tuple[str, str]]) -> Future:
+        """Forget conversation tombstones once their data has been collected."""
+        def mutation():
+            self._stage({"op": "purge_conversations", "keys": [list(key) for key in keys]})
+        return self._submit(mutation)
@@ -1,9 +1,13 @@
 from fastapi.responses import StreamingResponse, Response
-from fastapi import HTTPException
+from fastapi import HTTPException, Request
 from ...commons.router import make_router
+from ...commons.conditional import make_etag, not_modified_response, validator_headers
 from .service import TextToSpeechService
 from .models import TextToSpeechRequest, VoiceOptions
 
+# The same text and voice always give the same audio, so clients may reuse it without revalidating for a day
+AUDIO_CACHE_CONTROL = "private, max-age=86400"
+
 
 @make_router()
 def controller(router, text_to_speech_service: TextToSpeechService) -> None:
@@ -13,16 +17,23 @@ def controller(router, text_to_speech_service: TextToSpeechService) -> None:
         res = text_to_speech_service.run(inputs=inputs)
         return res
     
+    @router.get("/generate")
     @router.post("/generate")
-    async def generate_audio(text: str, voice: str = "Eva"):
+    async def generate_audio(text: str, request: Request, voice: str = "Eva"):
         """Generate audio from text and return as WAV file."""
+        # The ETag is a hash of the inputs, so a revalidation never synthesizes anything
+        etag = make_etag("tts", text_to_speech_service.resolve_voice(voice), text)
+        if request.method == "GET":
+            if not_modified := not_modified_response(request, etag, cache_control=AUDIO_CACHE_CONTROL):
+                return not_modified
         try:
             audio_data = await text_to_speech_service.generate_audio(text, voice)
             return Response(
                 content=audio_data,
                 media_type="audio/wav",
                 headers={
-                    "Content-Disposition": "attachment; filename=speech.wav"
+                    "Content-Disposition": "attachment; filename=speech.wav",
+                    **validator_headers(etag, cache_control=AUDIO_CACHE_CONTROL),
                 }
             )
         except Exception as e:
@@ -6,10 +6,13 @@ from .text_to_speech import test_tts_stream, test_tts
 from .models import TextToSpeechRequest
 import asyncio
 import json
+from collections import OrderedDict
 from typing import Optional
 
 
 SAMPLE_RATE = 48000
+# Generated audio kept in memory, least recently used evicted first
+AUDIO_CACHE_MAX_BYTES = 64 * 1024 * 1024
 # voices_file_path = "backend/src/apis/text_to_speech/voices.json"
 # test = json.load(open(voices_file_path))
 
@@ -22,6 +25,8 @@ class TextToSpeechService:
         if not api_key:
             raise RuntimeError("GRADIUM_API_KEY is not set in environment")
         self.client = gradium.client.GradiumClient(api_key=api_key)
+        self._audio_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._audio_cache_bytes = 0
     
     def run(self, inputs: TextToSpeechRequest):
         voice_id = voice_id_dict[inputs.voice]
@@ -31,9 +36,19 @@ class TextToSpeechService:
         asyncio.run(test_tts(client=self.client, text=inputs.input_text, voice=voice_id, output_file=output_path))
         return {"message": "TTS request completed."}
     
+    def resolve_voice(self, voice: str) -> str:
+        """Map a voice name to its Gradium voice id (unknown names fall back to Eva)."""
+        return voice_id_dict.get(voice, voice_id_dict["Eva"])
+    
     async def generate_audio(self, text: str, voice: str = "Eva") -> bytes:
-        """Generate audio from text and return as bytes."""
-        voice_id = voice_id_dict.get(voice, voice_id_dict["Eva"])
+        """Generate audio from text and return as bytes (cached per text and voice)."""
+        voice_id = self.resolve_voice(voice)
+        key = (voice_id, text)
+        cached = self._audio_cache.get(key)
+        if cached is not None:
+            self._audio_cache.move_to_end(key)
+            return cached
+        
         result = await self.client.tts(
             setup={
                 "model_name": "default", 
@@ -42,5 +57,16 @@ class TextToSpeechService:
             },
             text=text
         )
-        return result.raw_data
+        audio = result.raw_data
+        self._cache_audio(key, audio)
+        return audio
+    
+    def _cache_audio(self, key: tuple, audio: bytes) -> None:
+        if len(audio) > AUDIO_CACHE_MAX_BYTES:
+            return
+        self._audio_cache[key] = audio
+        self._audio_cache_bytes += len(audio)
+        while self._audio_cache_bytes > AUDIO_CACHE_MAX_BYTES:
+            _, evicted = self._audio_cache.popitem(last=False)
+            self._audio_cache_bytes -= len(evicted)
    
\ No newline at end of file
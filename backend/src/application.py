@@ -14,6 +14,7 @@ from contextlib import asynccontextmanager
 
 from .commons.router import MyFastAPI
 from .commons.database import engine
+from .commons.constants import settings
 from .apis.rag import models as rag_models
 
 # Import Controllers
@@ -28,15 +29,23 @@ async def lifespan(app: MyFastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(rag_models.Base.metadata.create_all)
     print("Database tables created.")
+    await rag_service.embedding_queue.start()
+    await session_service.outbox.start()
+    await session_service.collector.start()
     yield
     print("Shutting down...")
+    await session_service.collector.stop()
+    await session_service.outbox.stop()
+    await rag_service.embedding_queue.stop()
+    rag_service.close()
+    session_service.close()
 
 app = MyFastAPI(root="/api", lifespan=lifespan)
 rag_service = RagService()
 # Configure services
 example_service = ExampleService()
 text_to_speech_service = TextToSpeechService()
-session_service = SessionService(rag_service=rag_service)
+session_service = SessionService(rag_service=rag_service, content_backend=settings.SESSION_CONTENT_BACKEND)
 stt_service = SttService()
 
 # Configure controllers
@@ -0,0 +1,76 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag from the values the response is derived from."""
+    digest = hashlib.sha1("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def http_date(timestamp: Optional[str]) -> Optional[str]:
+    """Convert one of our ISO timestamps ("...Z") to an HTTP date."""
+    if not timestamp:
+        return None
+    try:
+        value = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    candidates = [candidate.strip().removeprefix("W/") for candidate in header.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+def _not_modified_since(header: str, last_modified: str) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+        modified = parsedate_to_datetime(last_modified)
+    except (TypeError, ValueError):
+        return False
+    return modified <= since
+
+
+def validator_headers(etag: str, last_modified: Optional[str] = None, cache_control: str = "no-cache") -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    return headers
+
+
+def not_modified_response(
+    request: Request, etag: str, last_modified: Optional[str] = None, cache_control: str = "no-cache"
+) -> Optional[Response]:
+    """
+    Return a 304 response if the request's validators still match, else None.
+
+    If-None-Match takes precedence over If-Modified-Since (RFC 9110).
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        matches = _etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        matches = bool(if_modified_since and last_modified and _not_modified_since(if_modified_since, last_modified))
+
+    if not matches:
+        return None
+    return Response(status_code=304, headers=validator_headers(etag, last_modified, cache_control))
+
+
+def set_validators(
+    response: Response, etag: str, last_modified: Optional[str] = None, cache_control: str = "no-cache"
+) -> None:
+    """Attach the validators to a 200 response."""
+    response.headers.update(validator_headers(etag, last_modified, cache_control))
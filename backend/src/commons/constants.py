@@ -6,17 +6,68 @@ import os
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite+aiosqlite:///./sql_app.db"
+    # Storage profile: "tuned" (WAL, pragmas below, connection pool) or "default" (SQLite defaults)
+    DATABASE_PROFILE: str = "tuned"
+    DATABASE_SYNCHRONOUS: str = "NORMAL"  # with WAL, a power loss can lose the last commits but not corrupt
+    DATABASE_CACHE_SIZE_KB: int = 65536  # page cache per connection
+    DATABASE_MMAP_SIZE: int = 268435456  # bytes of the database file read through mmap
+    DATABASE_BUSY_TIMEOUT: int = 5000  # milliseconds a connection waits for a lock before failing
+    DATABASE_POOL_SIZE: int = 8
+    DATABASE_MAX_OVERFLOW: int = 8  # connections opened above the pool size under bursts
     
     # RAG & LLM
     GOOGLE_API_KEY: str
     GEMINI_MODEL: str = "gemini-2.0-flash"
     EMBEDDING_MODEL: str = "models/embedding-001"
     VECTOR_DB_PATH: str = "./chroma_db"
+    # Vector store backend: "chroma" or "numpy" (in-process, memory-mapped)
+    VECTOR_STORE: str = "chroma"
+    NUMPY_VECTOR_PATH: str = "./vector_store"
+    # Precision of the vectors scanned by the NumPy store: "float32", "float16" or "int8"
+    # (applies to sessions created afterwards)
+    VECTOR_PRECISION: str = "float32"
+    VECTOR_RESCORE_FACTOR: int = 4  # quantized shortlist re-scored exactly (0 to disable and not keep float32)
     
     # Tuning
     RAG_TOP_K: int = 5
+    RAG_EXECUTOR_WORKERS: int = 8  # threads for blocking vector DB / LLM calls
     RAG_VECTOR_WEIGHT: float = 0.7
     RAG_BM25_WEIGHT: float = 0.3
+    RAG_FUSION: str = "rrf"  # "rrf" (reciprocal rank fusion) or "weighted" (uses the weights above)
+    RAG_RRF_K: int = 60
+    BM25_K1: float = 1.5
+    BM25_B: float = 0.75
+    BM25_MAX_SESSIONS: int = 64  # per-session lexical indexes kept in memory
+    SEARCH_CANDIDATES: int = 200  # chunks ranked by each retriever of the cross-session search (first pages)
+    SEARCH_CURSOR_CACHE_SIZE: int = 256  # cross-session search rankings kept for their next pages
+    SEARCH_CURSOR_TTL: float = 600  # seconds after its last page, 0 to keep a ranking until evicted
+    
+    # Context sent to the LLM: candidates are deduplicated and picked by MMR within a token budget
+    RAG_CONTEXT_CANDIDATES: int = 15
+    RAG_CONTEXT_MAX_TOKENS: int = 2000
+    RAG_DEDUPE_THRESHOLD: float = 0.8  # estimated shingle Jaccard similarity of near-duplicates
+    RAG_MMR_LAMBDA: float = 0.7  # 1 ranks by relevance only, lower values favour diverse passages
+    RAG_ANSWER_CACHE_SIZE: int = 256  # answers kept; invalidated when their session changes
+    RAG_ANSWER_CACHE_TTL: float = 3600  # seconds, 0 to keep answers until evicted
+    RAG_SSE_HEARTBEAT: float = 15  # seconds without an event before a heartbeat comment is sent
+    RAG_SSE_DISCONNECT_POLL: float = 0.5  # seconds between client disconnect checks while waiting
+    RAG_BATCH_MAX_QUESTIONS: int = 20  # questions per /rag/batch_query request
+    RAG_BATCH_CONCURRENCY: int = 4  # answers of a batch generated at the same time
+    
+    # Transcripts are indexed as chunks of speaker turns
+    CHUNK_MAX_TOKENS: int = 256
+    CHUNK_OVERLAP_TOKENS: int = 32
+    
+    # Embedding batches (Gemini accepts up to 100 texts per batch request)
+    EMBEDDING_BATCH_SIZE: int = 100
+    EMBEDDING_BATCH_WAIT: float = 0.05  # seconds to wait for a batch to fill up
+    EMBEDDING_QUEUE_SIZE: int = 2000  # documents queued before producers are blocked
+    EMBEDDING_MIN_INTERVAL: float = 0.0  # minimum seconds between embedding requests
+    EMBEDDING_CACHE_PATH: str = "./embedding_cache.db"  # empty to keep the cache in memory only
+    EMBEDDING_CACHE_SIZE: int = 10000  # embeddings kept in memory
+    
+    # Session manager
+    SESSION_CONTENT_BACKEND: str = "files"  # "files" (one .txt per conversation) or "segments"
     
     @field_validator('GOOGLE_API_KEY')
     @classmethod
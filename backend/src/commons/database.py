@@ -1,11 +1,61 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from .constants import settings
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False)
+DATABASE_PROFILES = ("tuned", "default")
+
+
+def _sqlite_pragmas() -> list[str]:
+    return [
+        # Readers no longer wait for the writer, and a commit appends to the log instead of rewriting pages
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={settings.DATABASE_SYNCHRONOUS}",
+        f"PRAGMA cache_size=-{settings.DATABASE_CACHE_SIZE_KB}",  # negative: KiB rather than pages
+        f"PRAGMA mmap_size={settings.DATABASE_MMAP_SIZE}",
+        "PRAGMA temp_store=MEMORY",
+        f"PRAGMA busy_timeout={settings.DATABASE_BUSY_TIMEOUT}",
+    ]
+
+
+def create_database_engine(url: str, profile: str = "tuned") -> AsyncEngine:
+    """
+    Async engine for ``url`` with a storage profile.
+
+    "tuned" sets the SQLite pragmas above on every new connection and keeps
+    a pool of DATABASE_POOL_SIZE connections (plus DATABASE_MAX_OVERFLOW
+    under bursts), so concurrent requests read in parallel with the
+    writer. "default" keeps SQLite's and SQLAlchemy's defaults. Other
+    databases always get the defaults.
+    """
+    if profile not in DATABASE_PROFILES:
+        raise ValueError(f"Unknown database profile: {profile}")
+    database_url = make_url(url)
+    if profile == "default" or database_url.get_backend_name() != "sqlite":
+        return create_async_engine(url, echo=False)
+
+    options = {}
+    if database_url.database and database_url.database != ":memory:":
+        # In-memory databases live in a single connection (static pool)
+        options.update(pool_size=settings.DATABASE_POOL_SIZE, max_overflow=settings.DATABASE_MAX_OVERFLOW)
+    engine = create_async_engine(url, echo=False, **options)
+    pragmas = _sqlite_pragmas()
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return engine
+
+
+engine = create_database_engine(settings.DATABASE_URL, settings.DATABASE_PROFILE)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 # Dependency helper (if needed inside services)
 async def get_db_session():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
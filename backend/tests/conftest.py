@@ -0,0 +1,34 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Tests import the application as the ``src`` package, like uvicorn does from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Settings requires an API key at import time; the tests never call Google
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+
+
+@pytest.fixture
+def rag_database(tmp_path, monkeypatch):
+    """Point the RagService at an empty database in tmp_path; returns its session factory."""
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import NullPool
+
+    from src.apis.rag import models, service
+
+    # No pooled connection outlives the event loop of the test that opened it
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'rag.db'}", poolclass=NullPool)
+
+    async def create_tables():
+        async with engine.begin() as connection:
+            await connection.run_sync(models.Base.metadata.create_all)
+
+    asyncio.run(create_tables())
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr(service, "AsyncSessionLocal", session_factory)
+    return session_factory
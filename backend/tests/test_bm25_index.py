@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+from src.apis.rag.bm25_index import BM25IndexManager, SessionBM25Index
+from src.apis.rag.tokenizer import tokenize
+
+
+def _documents(n: int):
+    words = ["budget", "roadmap", "hiring", "launch", "review", "kubernetes", "design", "retro"]
+    return [(f"d{i}", [words[i % 8], words[(i * 3) % 8], words[(i * 5 + 1) % 8], f"term{i % 11}"]) for i in range(n)]
+
+
+def _scores(index: SessionBM25Index, tokens):
+    return dict(index.search(tokens, 1000))
+
+
+def test_incremental_updates_match_a_rebuilt_index():
+    documents = _documents(200)
+    incremental = SessionBM25Index()
+    incremental.add(documents[:150])
+    incremental.remove([doc_id for doc_id, _ in documents[:120]])  # compacts the postings
+    incremental.add(documents[150:])
+    replaced = ("d160", ["hiring", "hiring", "budget"])
+    incremental.add([replaced])
+
+    kept = [document for document in documents[120:] if document[0] != "d160"] + [replaced]
+    rebuilt = SessionBM25Index()
+    rebuilt.add(kept)
+
+    assert len(incremental) == len(rebuilt) == 80
+    for query in (["budget"], ["hiring", "term3"], ["kubernetes", "design", "retro"]):
+        assert incremental.search(query, 1000)
+        assert _scores(incremental, query) == pytest.approx(_scores(rebuilt, query), rel=1e-5)
+    removed = {doc_id for doc_id, _ in documents[:120]}
+    assert _scores(incremental, ["term0"]) and not set(_scores(incremental, ["term0"])) & removed
+
+
+def test_search_ranks_exact_terms_over_the_whole_session():
+    index = SessionBM25Index()
+    index.add([
+        ("notes", tokenize("Weekly sync: budget and hiring")),
+        ("zoe", tokenize("Zoë presented the Kubernetes migration plan")),
+        ("long", tokenize("budget " * 20 + "hiring roadmap review")),
+    ])
+
+    assert index.search(tokenize("kubernetes ZOE"), 5)[0][0] == "zoe"
+    assert [doc_id for doc_id, _ in index.search(["budget"], 5)] == ["long", "notes"]
+    assert index.search(["absent"], 5) == []
+    assert len(index.search(["budget", "hiring"], 1)) == 1
+
+
+def test_manager_loads_once_and_applies_later_changes():
+    loads = []
+
+    def loader(session_id):
+        loads.append(session_id)
+        return [(f"{session_id}-a", ["budget"])]
+
+    manager = BM25IndexManager(loader, max_sessions=2)
+    manager.add("s1", [("ignored", ["budget"])])  # not loaded yet: the loader will see it
+    assert manager.search("s1", ["budget"], 5)[0][0] == "s1-a"
+
+    manager.add("s1", [("s1-b", ["budget", "budget"])])
+    manager.remove("s1", ["s1-a"])
+    assert [doc_id for doc_id, _ in manager.search("s1", ["budget"], 5)] == ["s1-b"]
+    assert loads == ["s1"]
+
+    # Least recently used sessions are evicted, then reloaded
+    manager.search("s2", ["budget"], 5)
+    manager.search("s3", ["budget"], 5)
+    manager.search("s1", ["budget"], 5)
+    assert loads == ["s1", "s2", "s3", "s1"]
+
+    manager.drop(["s1"])
+    manager.search("s1", ["budget"], 5)
+    assert loads[-1] == "s1" and len(loads) == 5
+
+
+def test_changes_during_a_load_are_replayed():
+    started, release = threading.Event(), threading.Event()
+
+    def loader(session_id):
+        started.set()
+        release.wait(5)
+        return [("old", ["budget"]), ("gone", ["budget"])]
+
+    manager = BM25IndexManager(loader)
+    searching = threading.Thread(target=manager.search, args=("s1", ["budget"], 5))
+    searching.start()
+    started.wait(5)
+    manager.add("s1", [("new", ["budget"])])
+    manager.remove("s1", ["gone"])
+    release.set()
+    searching.join(5)
+
+    assert {doc_id for doc_id, _ in manager.search("s1", ["budget"], 5)} == {"old", "new"}
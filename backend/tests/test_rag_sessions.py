@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.apis.rag import models
+from src.apis.rag.controller import controller
+from src.apis.rag.service import RagService
+from src.commons.router import MyFastAPI
+
+START = datetime(2024, 1, 1)
+
+
+async def _add_sessions(session_factory, sessions):
+    async with session_factory() as db:
+        db.add_all(models.Session(id=session_id, name=session_id, created_at=created_at) for session_id, created_at in sessions)
+        await db.commit()
+
+
+@pytest.fixture
+def api(rag_database):
+    service = RagService.__new__(RagService)  # no Chroma / Gemini clients
+    app = MyFastAPI()
+    app.add_controller("/rag", controller, rag_service=service)
+    with TestClient(app) as client:
+        yield client, rag_database
+
+
+def _pages(client, limit, cursor=None):
+    while True:
+        page = client.get("/rag/sessions/page", params={"limit": limit, "cursor": cursor}).json()
+        yield [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return
+
+
+def test_pages_are_newest_first_with_ties_broken_by_id(api):
+    client, session_factory = api
+    # Three sessions share every created_at, so pages have to break the ties
+    sessions = [(f"s{i:02d}", START + timedelta(minutes=i // 3)) for i in range(12)]
+    asyncio.run(_add_sessions(session_factory, sessions))
+
+    pages = list(_pages(client, limit=5))
+
+    expected = [session_id for session_id, _ in sorted(sessions, key=lambda s: (s[1], s[0]), reverse=True)]
+    assert [session_id for page in pages for session_id in page] == expected
+    assert [len(page) for page in pages] == [5, 5, 2]
+    assert list(_pages(client, limit=12)) == [expected]
+
+
+def test_newer_sessions_do_not_shift_later_pages(api):
+    client, session_factory = api
+    asyncio.run(_add_sessions(session_factory, [(f"s{i}", START + timedelta(minutes=i)) for i in range(4)]))
+
+    first = client.get("/rag/sessions/page", params={"limit": 2}).json()
+    asyncio.run(_add_sessions(session_factory, [("newest", START + timedelta(days=1))]))
+    second = client.get("/rag/sessions/page", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+
+    assert [item["id"] for item in first["items"]] == ["s3", "s2"]
+    assert [item["id"] for item in second["items"]] == ["s1", "s0"]
+    assert second["next_cursor"] is None
+
+
+def test_invalid_cursor_is_a_bad_request(api):
+    client, _ = api
+    response = client.get("/rag/sessions/page", params={"cursor": "not a cursor"})
+    assert response.status_code == 400
+    assert client.get("/rag/sessions/page").json() == {"items": [], "next_cursor": None}
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from src.commons.router import MyFastAPI
+from src.apis.rag import schemas
+from src.apis.rag.answer_cache import AnswerCache
+from src.apis.rag.context import PackedContext
+from src.apis.rag.controller import controller
+from src.apis.rag.service import RagService
+from src.apis.rag.sse import HEARTBEAT, StreamMetrics, event_stream
+
+SEARCH_DELAY = 0.2
+CHUNK_DELAY = 0.1
+CHUNKS = 5
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class SlowAsyncLLM:
+    """Fake Gemini model with a native async streaming client."""
+
+    async def generate_content_async(self, prompt, stream=False):
+        async def chunks():
+            for i in range(CHUNKS):
+                await asyncio.sleep(CHUNK_DELAY)
+                yield _Chunk(f"{i} ")
+        return chunks()
+
+
+class SlowSyncLLM:
+    """Fake Gemini model that only has the blocking client."""
+
+    def generate_content(self, prompt, stream=False):
+        def chunks():
+            for i in range(CHUNKS):
+                time.sleep(CHUNK_DELAY)
+                yield _Chunk(f"{i} ")
+        return chunks()
+
+
+def _slow_search(query, session_id):
+    time.sleep(SEARCH_DELAY)  # blocking, like the Chroma query and query embedding
+    return PackedContext(documents=["context"], tokens=1, candidate_tokens=1, duplicates=0, over_budget=0)
+
+
+def _slow_search_many(queries, session_id):
+    return [_slow_search(query, session_id) for query in queries[:1]] * len(queries)  # one blocking call
+
+
+def _make_app(llm) -> MyFastAPI:
+    service = RagService.__new__(RagService)  # no Chroma / Gemini clients
+    service.executor = ThreadPoolExecutor(max_workers=8)
+    service.llm_model = llm
+    service._hybrid_search = _slow_search
+    service._hybrid_search_many = _slow_search_many
+    service.answer_cache = AnswerCache()
+    service.stream_metrics = StreamMetrics()
+
+    app = MyFastAPI()
+    app.add_controller("/rag", controller, rag_service=service)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+def _parse_events(body: str) -> list:
+    events = []
+    for block in body.split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def _query(client: httpx.AsyncClient, session_id: str) -> str:
+    response = await client.post("/rag/initial_query", json={"query": "what?", "session_id": session_id})
+    assert response.status_code == 200
+    events = _parse_events(response.text)
+    assert [name for name, _ in events[:1] + events[-1:]] == ["context", "done"]
+    assert events[-1][1]["tokens"] == CHUNKS and events[-1][1]["ttfb_ms"] >= SEARCH_DELAY * 1000
+    return "".join(data["text"] for name, data in events if name == "token")
+
+
+def _run_concurrent_streams(llm, streams: int = 3, same_session: bool = False):
+    async def main():
+        transport = httpx.ASGITransport(app=_make_app(llm))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            started = time.perf_counter()
+            queries = asyncio.gather(*(_query(client, "s0" if same_session else f"s{i}") for i in range(streams)))
+
+            # Another endpoint answers while the streams are in flight
+            await asyncio.sleep(CHUNK_DELAY / 2)
+            ping_started = time.perf_counter()
+            ping = await client.get("/ping")
+            ping_latency = time.perf_counter() - ping_started
+
+            bodies = await queries
+            return bodies, time.perf_counter() - started, ping, ping_latency
+
+    return asyncio.run(main())
+
+
+def test_async_llm_streams_do_not_block_each_other():
+    bodies, elapsed, ping, ping_latency = _run_concurrent_streams(SlowAsyncLLM())
+
+    single_stream = SEARCH_DELAY + CHUNKS * CHUNK_DELAY
+    assert all(body == "0 1 2 3 4 " for body in bodies)
+    assert elapsed < 2 * single_stream  # run back to back they would take 3x
+    assert ping.status_code == 200
+    assert ping_latency < CHUNK_DELAY
+
+
+def test_sync_llm_is_streamed_from_the_executor():
+    bodies, elapsed, ping, ping_latency = _run_concurrent_streams(SlowSyncLLM())
+
+    single_stream = SEARCH_DELAY + CHUNKS * CHUNK_DELAY
+    assert all(body == "0 1 2 3 4 " for body in bodies)
+    assert elapsed < 2 * single_stream
+    assert ping.status_code == 200
+    assert ping_latency < CHUNK_DELAY
+
+
+class CountingLLM(SlowAsyncLLM):
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, stream=False):
+        self.calls += 1
+        return await super().generate_content_async(prompt, stream)
+
+
+def test_identical_queries_share_one_generation():
+    llm = CountingLLM()
+    bodies, elapsed, _, _ = _run_concurrent_streams(llm, same_session=True)
+
+    assert all(body == "0 1 2 3 4 " for body in bodies)
+    assert llm.calls == 1
+
+
+def test_event_stream_sends_heartbeats_and_cancels_on_disconnect():
+    cancelled = asyncio.Event()
+    disconnected = False
+
+    async def events():
+        yield schemas.AnswerToken(text="a")
+        try:
+            await asyncio.sleep(10)  # an LLM that went quiet
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        yield schemas.AnswerToken(text="never")
+
+    async def is_disconnected():
+        return disconnected
+
+    async def main():
+        nonlocal disconnected
+        stream = event_stream(events(), {schemas.AnswerToken: "token"}, is_disconnected, heartbeat=0.05, poll_interval=0.02)
+        frames = [await stream.__anext__(), await stream.__anext__()]
+        disconnected = True
+        frames += [frame async for frame in stream]
+        return frames
+
+    frames = asyncio.run(main())
+    assert frames[0] == 'event: token\ndata: {"text": "a"}\n\n'
+    assert frames[1:] == [HEARTBEAT]
+    assert cancelled.is_set()
+
+
+def test_batch_answers_are_multiplexed_in_one_stream():
+    questions = [{"query": f"question {i}?"} for i in range(4)] + [{"id": "last", "query": "question 4?"}]
+
+    async def main():
+        transport = httpx.ASGITransport(app=_make_app(SlowAsyncLLM()))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            started = time.perf_counter()
+            response = await client.post("/rag/batch_query", json={"session_id": "s0", "questions": questions})
+            return response, time.perf_counter() - started
+
+    response, elapsed = asyncio.run(main())
+    events = _parse_events(response.text)
+
+    answers = {}
+    for name, data in events:
+        if name == "token":
+            answers[data["question_id"]] = answers.get(data["question_id"], "") + data["text"]
+    assert answers == {question_id: "0 1 2 3 4 " for question_id in ["0", "1", "2", "3", "last"]}
+    assert events[-1] == ("end", {"questions": 5, "failed": 0, "duration_ms": events[-1][1]["duration_ms"]})
+    # RAG_BATCH_CONCURRENCY answers at a time: two rounds instead of five
+    assert elapsed < SEARCH_DELAY + 3 * CHUNKS * CHUNK_DELAY
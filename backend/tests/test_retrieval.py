@@ -0,0 +1,102 @@
+import numpy as np
+
+from src.apis.rag.bm25_index import BM25IndexManager
+from src.apis.rag.retrieval import (
+    DenseGenerator, LexicalGenerator, RetrievalEngine, RRFFuser, Scorer, WeightedFuser,
+    index_metadata, session_loader, stored_tokens,
+)
+from src.apis.rag.tokenizer import TOKENIZER_VERSION, tokenize
+from src.apis.rag.vector_store import NumpyVectorStore
+
+DOCUMENTS = {
+    "d0": "Budget review with the finance team",
+    "d1": "Roadmap planning for the next quarter",
+    "d2": "Kubernetes migration: Zoë owns the rollout",
+    "d3": "Hiring plan and interview loops",
+}
+
+
+class _Embedder:
+    """Embeds a text as the bag of its known tokens, counting the calls."""
+
+    def __init__(self):
+        self.vocabulary = sorted({token for text in DOCUMENTS.values() for token in tokenize(text)})
+        self.calls = 0
+
+    def __call__(self, text: str):
+        self.calls += 1
+        vector = np.zeros(len(self.vocabulary))
+        for token in tokenize(text):
+            if token in self.vocabulary:
+                vector[self.vocabulary.index(token)] += 1
+        return vector + 0.01  # never all zeros
+
+
+class _Reverse(Scorer):
+    name = "reverse"
+
+    def score(self, context, ranking):
+        return ranking[::-1]
+
+
+def _engine(tmp_path, fuser=None, scorers=()):
+    embed = _Embedder()
+    store = NumpyVectorStore(str(tmp_path))
+    ids = list(DOCUMENTS)
+    store.upsert(
+        ids, [embed(DOCUMENTS[doc_id]) for doc_id in ids], [DOCUMENTS[doc_id] for doc_id in ids],
+        [index_metadata({"session_id": "s1"}, tokenize(DOCUMENTS[doc_id])) for doc_id in ids],
+    )
+    embed.calls = 0
+    engine = RetrievalEngine(
+        store, embed,
+        generators=[DenseGenerator(store), LexicalGenerator(BM25IndexManager(session_loader(store)))],
+        fuser=fuser or RRFFuser(),
+        scorers=scorers,
+    )
+    return engine, embed
+
+
+def test_search_fuses_the_generators_and_times_each_stage(tmp_path):
+    engine, embed = _engine(tmp_path)
+
+    # Case and accents are normalized the same way at ingestion and query time
+    result = engine.search("ZOE kubernetes", ["s1"], top_k=2)
+
+    assert result.ids[0] == "d2"
+    assert result.documents[0] == DOCUMENTS["d2"]
+    assert result.scores == sorted(result.scores, reverse=True)
+    assert {"embed_query", "dense", "lexical", "fuse", "total"} <= set(result.timings)
+    assert embed.calls == 1
+    assert engine.metrics()["queries"] == 1
+
+
+def test_weighted_fuser_and_scorers(tmp_path):
+    engine, _ = _engine(tmp_path, WeightedFuser({"dense": 0.0, "lexical": 1.0}), [_Reverse()])
+
+    result = engine.search("hiring interview loops", ["s1"], top_k=4)
+
+    # Only the lexical ranking weighs, and the scorer runs on the fused list
+    assert result.ids[-1] == "d3"
+    assert "reverse" in result.timings
+
+
+def test_search_many_embeds_each_query_once(tmp_path):
+    engine, embed = _engine(tmp_path)
+
+    results = engine.search_many(["budget finance", "roadmap quarter"], ["s1"], top_k=1)
+
+    assert [result.ids for result in results] == [["d0"], ["d1"]]
+    assert embed.calls == 2
+    # Without sessions there is no lexical index to search
+    assert engine.search("budget finance", None, top_k=1).ids == ["d0"]
+
+
+def test_stored_tokens_are_reused():
+    metadata = index_metadata({"session_id": "s1"}, ["stored", "tokens"])
+    assert metadata["tokenizer"] == TOKENIZER_VERSION
+    assert stored_tokens("Some Text", metadata) == ["stored", "tokens"]
+
+    # Documents indexed by another tokenizer version are tokenized again
+    assert stored_tokens("Some Text", {**metadata, "tokenizer": TOKENIZER_VERSION - 1}) == ["some", "text"]
+    assert stored_tokens("Café", {}) == ["cafe"]
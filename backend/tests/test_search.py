@@ -0,0 +1,144 @@
+import asyncio
+import base64
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from src.apis.rag import models, schemas
+from src.apis.rag import search_cursor
+from src.apis.rag.search_cursor import SearchCursors, SearchState
+from src.apis.rag.service import RagService
+
+# Thirty sessions with one hit each, best first
+RANKING = [(f"s{i:02d}", round(1.0 - i / 100, 2), [(f"{i}:0", f"c{i}", round(1.0 - i / 100, 2))]) for i in range(30)]
+
+
+def _group_ids(groups):
+    return [session_id for session_id, _, _ in groups]
+
+
+def test_served_groups_are_kept_when_ranking_deeper():
+    state = SearchState("key")
+    state.regroup(RANKING[:4])
+    page, more = state.page(0, 3)
+    assert _group_ids(page) == ["s00", "s01", "s02"] and more
+
+    # A deeper ranking may reorder the sessions; the ones served stay where they were
+    state.regroup([RANKING[5], RANKING[1], RANKING[3], RANKING[0], RANKING[4]])
+    state.complete = True
+    assert _group_ids(state.page(0, 3)[0]) == ["s00", "s01", "s02"]
+    page, more = state.page(3, 3)
+    assert _group_ids(page) == ["s05", "s03", "s04"] and not more
+
+
+def test_resumed_state_skips_the_groups_before_its_key():
+    state = SearchState("key", after=(RANKING[9][1], RANKING[9][0]))
+    state.regroup(RANKING)
+    assert _group_ids(state.groups)[:2] == ["s10", "s11"]
+    assert len(state.groups) == 20
+
+
+def test_cursors_expire_and_belong_to_their_search(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(search_cursor.time, "monotonic", lambda: now[0])
+    cursors = SearchCursors(max_entries=2, ttl=10)
+    first, state = cursors.create("query a")
+
+    assert cursors.get(first, "query a") is state
+    assert cursors.get(first, "query b") is None
+    now[0] = 9.0
+    assert cursors.get(first, "query a") is state  # using it keeps it alive
+    now[0] = 18.0
+    assert cursors.get(first, "query a") is state
+    now[0] = 30.0
+    assert cursors.get(first, "query a") is None
+
+    oldest, _ = cursors.create("query a")
+    cursors.create("query b")
+    cursors.create("query c")
+    assert cursors.get(oldest, "query a") is None
+
+
+class _Texts:
+    def get(self, ids):
+        return {doc_id: f"text of {doc_id}" for doc_id in ids}
+
+
+def _service(calls):
+    service = RagService.__new__(RagService)  # no Chroma / Gemini clients
+    service.executor = ThreadPoolExecutor(max_workers=2)
+    service.search_cursors = SearchCursors()
+    service.vector_store = _Texts()
+
+    async def rank_deeper(state, query, per_session, conditions):
+        # Stands in for the retrievers: the best ``depth`` candidates of a fixed ranking
+        state.depth = state.depth * 4 if state.depth else 4
+        calls.append(state.depth)
+        state.complete = state.depth >= len(RANKING)
+        state.regroup(RANKING[:state.depth])
+        return {}
+
+    service._rank_deeper = rank_deeper
+    return service
+
+
+async def _add_session(session_factory):
+    async with session_factory() as db:
+        db.add(models.Session(id="s00", name="Weekly sync"))
+        await db.commit()
+
+
+async def _page(service, cursor=None):
+    events = [event async for event in service.search("budget", limit=7, cursor=cursor)]
+    assert isinstance(events[-1], schemas.SearchPage)
+    return [group.session_id for group in events[:-1]], events[-1].next_cursor, events[:-1]
+
+
+def test_search_pages_through_every_session_once(rag_database):
+    async def run():
+        await _add_session(rag_database)
+        calls = []
+        service = _service(calls)
+        try:
+            sessions, cursor, groups = await _page(service)
+            assert groups[0].session_name == "Weekly sync"
+            assert groups[0].hits[0].text == "text of 0:0"
+            seen = [sessions]
+            while cursor:
+                sessions, next_cursor, _ = await _page(service, cursor)
+                # The same cursor twice gives the same page and the same next cursor
+                assert (sessions, next_cursor) == (await _page(service, cursor))[:2]
+                seen.append(sessions)
+                cursor = next_cursor
+
+            assert [session_id for page in seen for session_id in page] == _group_ids(RANKING)
+            assert [len(page) for page in seen] == [7, 7, 7, 7, 2]
+            assert calls == [4, 16, 64]  # ranked deeper only when a page ran short
+        finally:
+            service.executor.shutdown()
+
+    asyncio.run(run())
+
+
+def test_expired_cursor_resumes_after_its_last_group(rag_database):
+    async def run():
+        service = _service([])
+        try:
+            first, cursor, _ = await _page(service)
+            service.search_cursors.clear()
+            resumed, _, _ = await _page(service, cursor)
+            assert first == _group_ids(RANKING[:7])
+            assert resumed == _group_ids(RANKING[7:14])
+        finally:
+            service.executor.shutdown()
+
+    asyncio.run(run())
+
+
+def test_invalid_cursors_are_rejected():
+    service = _service([])
+    negative = base64.urlsafe_b64encode(json.dumps(["id", -1, 0.5, "s00"]).encode()).decode()
+    for cursor in ("not base64!", negative):
+        with pytest.raises(ValueError):
+            service.search("budget", cursor=cursor)
+    service.executor.shutdown()
@@ -0,0 +1,150 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.apis.session_manager.controller import controller
+from src.apis.session_manager.models import SessionCreate, SessionUpdate
+from src.apis.session_manager.service import SessionService
+from src.commons.router import MyFastAPI
+
+
+@pytest.fixture
+def api(tmp_path):
+    service = SessionService(base_path=str(tmp_path), content_backend="segments")
+    app = MyFastAPI()
+    app.add_controller("/session-manager", controller, session_service=service)
+    with TestClient(app) as client:
+        yield client, service
+    service.close()
+
+
+def test_unchanged_listing_is_not_sent_again(api):
+    client, service = api
+    service.create_session(SessionCreate(name="first"))
+
+    response = client.get("/session-manager/sessions")
+    etag = response.headers["etag"]
+    assert response.status_code == 200 and len(response.json()) == 1
+
+    response = client.get("/session-manager/sessions", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    # Weak and listed validators match too
+    response = client.get("/session-manager/sessions", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == 304
+
+    service.create_session(SessionCreate(name="second"))
+    response = client.get("/session-manager/sessions", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and len(response.json()) == 2
+    assert response.headers["etag"] != etag
+
+
+def test_session_etag_changes_with_the_session_only(api):
+    client, service = api
+    session = service.create_session(SessionCreate(name="watched"))
+    url = f"/session-manager/sessions/{session.session_id}"
+
+    response = client.get(url)
+    etag = response.headers["etag"]
+    assert response.headers["last-modified"]
+
+    service.create_session(SessionCreate(name="other"))
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    service.add_conversation(session.session_id, "a: hello")
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()["conversations"]) == 1
+
+    assert client.get("/session-manager/sessions/missing", headers={"If-None-Match": etag}).status_code == 404
+
+
+def test_content_is_validated_by_etag_or_date(api):
+    client, service = api
+    session = service.create_session(SessionCreate(name="s"))
+    conversation = service.add_conversation(session.session_id, "a: hello\nb: hi")
+    url = f"/session-manager/sessions/{session.session_id}/conversations/{conversation.conversation_id}/content"
+
+    response = client.get(url)
+    assert response.text == "a: hello\nb: hi"
+    etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+    # If-None-Match takes precedence over If-Modified-Since
+    response = client.get(url, headers={"If-None-Match": '"other"', "If-Modified-Since": last_modified})
+    assert response.status_code == 200
+    # A window of turns is a different representation
+    assert client.get(f"{url}?offset=1", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_change_feed_pages_through_folded_changes(api):
+    client, service = api
+    start = service.get_changes(0).seq
+    sessions = [service.create_session(SessionCreate(name=f"s{i}")) for i in range(5)]
+    service.update_session(sessions[0].session_id, SessionUpdate(name="renamed"))
+    conversation = service.add_conversation(sessions[1].session_id, "a: hello")
+    service.delete_session(sessions[2].session_id)
+
+    changes, since = [], start
+    while True:
+        feed = client.get("/session-manager/changes", params={"since": since, "limit": 2}).json()
+        assert len(feed["changes"]) <= 2 and feed["seq"] > since
+        changes.extend(feed["changes"])
+        since = feed["seq"]
+        if not feed["has_more"]:
+            break
+
+    # Every item once, with its current state, in the order of their last change
+    by_item = {(change["kind"], change["session_id"], change["conversation_id"]): change for change in changes}
+    assert len(by_item) == len(changes) == 6
+    assert [change["seq"] for change in changes] == sorted(change["seq"] for change in changes)
+    assert by_item[("session", sessions[0].session_id, None)]["session"]["name"] == "renamed"
+    assert by_item[("session", sessions[2].session_id, None)]["op"] == "deleted"
+    assert client.get("/session-manager/changes", params={"since": since}).json()["changes"] == []
+
+    # In one page, the changes to an item fold into its first op
+    feed = service.get_changes(start)
+    by_item = {(change.kind, change.session_id, change.conversation_id): change for change in feed.changes}
+    renamed = by_item[("session", sessions[0].session_id, None)]
+    assert (renamed.op, renamed.session.name) == ("created", "renamed")
+    added = by_item[("conversation", sessions[1].session_id, conversation.conversation_id)]
+    assert (added.op, added.conversation.conversation_id) == ("created", conversation.conversation_id)
+    assert feed.seq == since
+
+
+def test_change_feed_pages_end_on_a_seq_boundary(api):
+    client, service = api
+    for i in range(3):
+        service.create_session(SessionCreate(name=f"s{i}"))
+    since = service.get_changes(0).seq
+    service.delete_all_sessions()  # one record, three changes sharing its seq
+
+    feed = client.get("/session-manager/changes", params={"since": since, "limit": 2}).json()
+    assert [change["op"] for change in feed["changes"]] == ["deleted"] * 3
+    assert not feed["has_more"]
+
+
+def test_change_feed_long_poll_and_reset(api, tmp_path):
+    client, service = api
+    since = service.get_changes(0).seq
+    timer = threading.Timer(0.2, service.create_session, [SessionCreate(name="late")])
+    timer.start()
+    started = time.monotonic()
+    feed = client.get("/session-manager/changes", params={"since": since, "wait": 10}).json()
+    timer.join()
+    assert time.monotonic() - started < 5
+    assert [change["session"]["name"] for change in feed["changes"]] == ["late"]
+
+    # The feed does not survive a restart: older cursors have to resync
+    service.close()
+    restarted = SessionService(base_path=str(tmp_path), content_backend="segments")
+    try:
+        assert restarted.get_changes(since).reset
+        assert not restarted.get_changes(restarted.get_changes(0).seq).reset
+    finally:
+        restarted.close()
@@ -0,0 +1,50 @@
+import asyncio
+
+from src.apis.session_manager.models import SessionCreate
+from src.apis.session_manager.service import SessionService
+
+
+class FlakyRag:
+    """RAG service whose first conversation delete fails after the files are gone."""
+
+    def __init__(self):
+        self.deleted_conversations = []
+        self.failures = 1
+
+    async def delete_sessions(self, session_ids):
+        return len(session_ids)
+
+    async def delete_conversations(self, conversation_ids):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("vector store unavailable")
+        self.deleted_conversations.extend(conversation_ids)
+        return len(conversation_ids)
+
+
+def test_collect_retry_resumes_at_the_failed_step(tmp_path):
+    rag = FlakyRag()
+    service = SessionService(base_path=str(tmp_path), rag_service=rag, content_backend="segments")
+    try:
+        session = service.create_session(SessionCreate(name="s"))
+        kept = service.add_conversation(session.session_id, "kept transcript")
+        deleted = service.add_conversation(session.session_id, "deleted transcript")
+        service.delete_conversation(session.session_id, deleted.conversation_id)
+
+        removed = []
+        remove_files = service.collector._remove_conversation_files
+        service.collector._remove_conversation_files = lambda items: (removed.extend(items), remove_files(items))
+
+        try:
+            asyncio.run(service.collector.collect())
+        except RuntimeError:
+            pass
+        assert service.store.list_conversation_tombstones(10)  # kept for the retry
+
+        assert asyncio.run(service.collector.collect()) == 1
+        assert len(removed) == 1  # the files step is not repeated
+        assert rag.deleted_conversations == [deleted.conversation_id]
+        assert service.store.list_conversation_tombstones(10) == []
+        assert service.get_conversation_content(session.session_id, kept.conversation_id) == "kept transcript"
+    finally:
+        service.close()
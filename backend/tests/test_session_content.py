@@ -0,0 +1,67 @@
+import json
+
+from src.apis.session_manager.content import SegmentContentStore, transcript_turns
+from src.apis.session_manager.models import Conversation, Session
+
+NOW = "2024-01-01T00:00:00"
+
+
+def _session() -> Session:
+    return Session(
+        session_id="s1", name="s1", created_at=NOW, updated_at=NOW, conversations_dir="sessions/s1/conversations"
+    )
+
+
+def _conversation(conversation_id: str, file_path: str) -> Conversation:
+    return Conversation(conversation_id=conversation_id, file_path=file_path, added_at=NOW)
+
+
+def test_repeated_delete_keeps_the_other_conversations(tmp_path):
+    store = SegmentContentStore(tmp_path)
+    session = _session()
+    kept = _conversation("kept", store.put(session, "kept", "kept transcript"))
+    deleted = _conversation("deleted", store.put(session, "deleted", "deleted transcript"))
+    assert deleted.file_path == "sessions/s1/segment.idx"
+
+    store.delete("s1", deleted)
+    store.delete("s1", deleted)  # e.g. the collector retrying a partly failed cleanup
+
+    assert (tmp_path / deleted.file_path).is_file()
+    assert store.get("s1", deleted) is None
+    assert store.get("s1", kept) == "kept transcript"
+
+    # The index is read back from disk after a restart
+    store = SegmentContentStore(tmp_path)
+    assert store.get("s1", kept) == "kept transcript"
+    assert store.get("s1", deleted) is None
+
+
+def test_delete_removes_legacy_transcript_files(tmp_path):
+    store = SegmentContentStore(tmp_path)
+    session = _session()
+    legacy = _conversation("old", store._legacy.put(session, "old", "old transcript"))
+    assert store.get("s1", legacy) == "old transcript"
+
+    store.delete("s1", legacy)
+
+    assert not (tmp_path / legacy.file_path).exists()
+    assert store.get("s1", legacy) is None
+
+
+def test_turn_windows_match_the_full_transcript(tmp_path):
+    store = SegmentContentStore(tmp_path)
+    session = _session()
+    transcripts = {
+        "diarized": json.dumps(
+            [{"SPEAKER_00": "bonjour é"}, {"SPEAKER_01": "yo", "SPEAKER_02": "hé"}, {"SPEAKER_00": "bye"}],
+            ensure_ascii=False,
+        ),
+        "plain": "first line\r\n\r\nsecond ü\nthird",
+    }
+    for conversation_id, text in transcripts.items():
+        conversation = _conversation(conversation_id, store.put(session, conversation_id, text))
+        turns = transcript_turns(text)
+        for offset in range(len(turns) + 1):
+            for limit in (None, 1, 2):
+                expected = turns[offset:] if limit is None else turns[offset:offset + limit]
+                assert store.get_turns("s1", conversation, offset, limit) == (expected, len(turns))
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from src.apis.session_manager.models import Conversation, Session
+from src.apis.session_manager.store import SessionStore
+
+NOW = "2024-01-01T00:00:00"
+
+
+def _session(session_id: str) -> Session:
+    return Session(
+        session_id=session_id, name=session_id, created_at=NOW, updated_at=NOW,
+        conversations_dir=f"sessions/{session_id}/conversations",
+    )
+
+
+def _conversation(conversation_id: str) -> Conversation:
+    return Conversation(conversation_id=conversation_id, file_path=f"{conversation_id}.txt", added_at=NOW)
+
+
+def test_mutations_queued_during_a_flush_are_committed_together(tmp_path):
+    store = SessionStore(tmp_path)
+    flushed = []
+    release = threading.Event()
+    flush = store._flush_pending
+
+    def blocking_flush():
+        flushed.append(len(store._pending))
+        if len(flushed) == 1:
+            release.wait(5)
+        flush()
+
+    store._flush_pending = blocking_flush
+    try:
+        first = store.create_session(_session("s0"))
+        while not flushed:
+            time.sleep(0.01)  # the writer is in the first flush
+        futures = [store.create_session(_session(f"s{i}")) for i in range(1, 20)]
+        # Applied after the session it belongs to, in the same batch
+        added = store.add_conversation("s19", _conversation("c1"))
+        release.set()
+
+        assert first.result(5).session_id == "s0"
+        assert [future.result(5).session_id for future in futures] == [f"s{i}" for i in range(1, 20)]
+        assert [c.conversation_id for c in added.result(5).conversations] == ["c1"]
+        assert flushed == [1, 20]  # one journal write for the whole second batch
+    finally:
+        release.set()
+        store.close()
+
+    store = SessionStore(tmp_path)
+    try:
+        assert len(store.list_sessions()) == 20
+        assert store.get_conversation("s19", "c1") is not None
+    finally:
+        store.close()
+
+
+def test_a_failed_flush_fails_and_rolls_back_the_batch(tmp_path):
+    store = SessionStore(tmp_path)
+    try:
+        store.create_session(_session("kept")).result(5)
+        flush = store._flush_pending
+
+        def failing_flush():
+            store._flush_pending = flush
+            raise OSError("disk full")
+
+        store._flush_pending = failing_flush
+        lost = store.create_session(_session("lost"))
+        with pytest.raises(OSError):
+            lost.result(5)
+        assert store.get_session("lost") is None
+
+        assert store.update_session("kept", {"name": "renamed"}).result(5).name == "renamed"
+    finally:
+        store.close()
+
+    store = SessionStore(tmp_path)
+    try:
+        assert [session.name for session in store.list_sessions()] == ["renamed"]
+    finally:
+        store.close()
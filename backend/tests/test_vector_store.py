@@ -0,0 +1,27 @@
+import numpy as np
+
+from src.apis.rag.vector_store import NumpyVectorStore
+
+
+def _hit_ids(hits):
+    return [hit.id for hit in hits]
+
+
+def test_global_query_matches_the_sessions(tmp_path):
+    rng = np.random.default_rng(0)
+    store = NumpyVectorStore(str(tmp_path), "int8", rescore_factor=4)
+    ids = [f"d{i}" for i in range(600)]
+    store.upsert(
+        ids, rng.normal(size=(600, 16)), [f"doc {i}" for i in range(600)],
+        [{"session_id": f"s{i % 23}"} for i in range(600)],
+    )
+    store.upsert(ids[:20], rng.normal(size=(20, 16)), ["moved"] * 20, [{"session_id": "s99"}] * 20)
+    store.delete(ids[100:450])  # compacts the sessions
+    store.delete_sessions(["s3"])
+
+    query = rng.normal(size=16)
+    sessions = sorted(store._session_names)
+    assert _hit_ids(store.query_global(query, 10)) == _hit_ids(store.query(query, 10, sessions))
+    assert _hit_ids(store.query(query, 10)) == _hit_ids(store.query(query, 10, sessions))
+    selected = {"s1", "s3", "s99"}
+    assert _hit_ids(store.query_global(query, 10, selected)) == _hit_ids(store.query(query, 10, sorted(selected)))
@@ -9,6 +9,7 @@ import {
   Card,
   CardContent,
   Avatar,
+  Button,
 } from '@mui/material';
 import ExpandMoreIcon from '@mui/icons-material/ExpandMore';
 import ExpandLessIcon from '@mui/icons-material/ExpandLess';
@@ -25,16 +26,23 @@ const SessionSidebar = ({ onSessionSelect, onConversationSelect, selectedSession
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [expandedSessions, setExpandedSessions] = useState({});
+  const [conversationsBySession, setConversationsBySession] = useState({});
   const [deleteDialogOpen, setDeleteDialogOpen] = useState(false);
   const [itemToDelete, setItemToDelete] = useState(null);
   const [deleteType, setDeleteType] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const loadSessions = async () => {
     try {
       setLoading(true);
       setError(null);
-      const data = await sessionAPI.getSessions();
-      setSessions(data);
+      // Only the first page; the next ones are fetched on scroll or "Load more"
+      const page = await sessionAPI.getSessionSummaries();
+      setSessions(page.items);
+      setNextCursor(page.next_cursor);
+      // Conversations are fetched again on demand for expanded sessions
+      setConversationsBySession({});
     } catch (err) {
       setError(err.message);
     } finally {
@@ -42,6 +50,31 @@ const SessionSidebar = ({ onSessionSelect, onConversationSelect, selectedSession
     }
   };
 
+  const loadMoreSessions = async () => {
+    if (!nextCursor || loadingMore) return;
+    try {
+      setLoadingMore(true);
+      const page = await sessionAPI.getSessionSummaries(nextCursor);
+      setSessions(prev => {
+        // A session updated since the previous page moved to the top: keep its first occurrence
+        const seen = new Set(prev.map(session => session.session_id));
+        return [...prev, ...page.items.filter(session => !seen.has(session.session_id))];
+      });
+      setNextCursor(page.next_cursor);
+    } catch (err) {
+      setError(err.message);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const handleScroll = (e) => {
+    const { scrollTop, scrollHeight, clientHeight } = e.currentTarget;
+    if (scrollHeight - scrollTop - clientHeight < 200) {
+      loadMoreSessions();
+    }
+  };
+
   useEffect(() => {
     loadSessions();
   }, []);
@@ -60,6 +93,23 @@ const SessionSidebar = ({ onSessionSelect, onConversationSelect, selectedSession
     }
   }, [selectedSession]);
 
+  const loadConversations = async (sessionId) => {
+    setConversationsBySession(prev => ({ ...prev, [sessionId]: null }));
+    try {
+      const conversations = await sessionAPI.getConversations(sessionId);
+      setConversationsBySession(prev => ({ ...prev, [sessionId]: conversations }));
+    } catch (err) {
+      setError(err.message);
+    }
+  };
+
+  useEffect(() => {
+    Object.keys(expandedSessions)
+      .filter(sessionId => expandedSessions[sessionId] && !(sessionId in conversationsBySession))
+      .forEach(loadConversations);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [expandedSessions, conversationsBySession]);
+
   const handleSessionClick = async (session) => {
     const fullSession = await sessionAPI.getSession(session.session_id);
     onSessionSelect(fullSession);
@@ -191,7 +241,7 @@ const SessionSidebar = ({ onSessionSelect, onConversationSelect, selectedSession
           Sessions
         </Typography>
       </Box>
-      <Box sx={{ flex: 1, overflow: 'auto', p: 2 }}>
+      <Box sx={{ flex: 1, overflow: 'auto', p: 2 }} onScroll={handleScroll}>
         {sessions.length === 0 ? (
           <Box sx={{ p: 3, textAlign: 'center' }}>
             <Typography sx={{ color: '#666' }}>No sessions found</Typography>
@@ -201,6 +251,7 @@ const SessionSidebar = ({ onSessionSelect, onConversationSelect, selectedSession
             {sessions.map((session) => {
               const isExpanded = expandedSessions[session.session_id];
               const isSelected = selectedSession?.session_id === session.session_id;
+              const conversations = conversationsBySession[session.session_id] || [];
 
               return (
                 <Box key={session.session_id}>
@@ -283,9 +334,9 @@ const SessionSidebar = ({ onSessionSelect, onConversationSelect, selectedSession
 
                   <Collapse in={isExpanded} timeout="auto" unmountOnExit>
                     <Box sx={{ pr: 2, pt: 0.5, pb: 1 }}>
-                      {session.conversations && session.conversations.length > 0 ? (
+                      {conversations.length > 0 ? (
                         <Box sx={{ display: 'flex', flexDirection: 'column', gap: 0.75 }}>
-                          {session.conversations.map((conversation, idx) => {
+                          {conversations.map((conversation, idx) => {
                             const isConvSelected = selectedConversation?.conversation_id === conversation.conversation_id;
                             
                             return (
@@ -361,6 +412,17 @@ const SessionSidebar = ({ onSessionSelect, onConversationSelect, selectedSession
                 </Box>
               );
             })}
+            {nextCursor && (
+              <Box sx={{ display: 'flex', justifyContent: 'center', py: 1 }}>
+                {loadingMore ? (
+                  <CircularProgress size={24} />
+                ) : (
+                  <Button size="small" onClick={loadMoreSessions}>
+                    Load more
+                  </Button>
+                )}
+              </Box>
+            )}
           </Box>
         )}
       </Box>
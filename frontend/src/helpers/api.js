@@ -8,6 +8,30 @@ export const sessionAPI = {
     return response.json();
   },
 
+  // Get a page of session summaries (most recently updated first)
+  getSessionSummaries: async (cursor = null, limit = 50) => {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (cursor) params.set('cursor', cursor);
+    const response = await fetch(`${API_BASE}/session-manager/sessions/summaries?${params}`);
+    if (!response.ok) throw new Error(`Failed to fetch sessions: ${response.status}`);
+    return response.json();
+  },
+
+  // Get the conversations of a session
+  getConversations: async (sessionId) => {
+    const response = await fetch(`${API_BASE}/session-manager/sessions/${sessionId}/conversations`);
+    if (!response.ok) throw new Error(`Failed to fetch conversations: ${response.status}`);
+    return response.json();
+  },
+
+  // Get the sessions and conversations changed since a change seq (optionally long-polling)
+  getChanges: async (since = 0, wait = 0) => {
+    const params = new URLSearchParams({ since: String(since), wait: String(wait) });
+    const response = await fetch(`${API_BASE}/session-manager/changes?${params}`);
+    if (!response.ok) throw new Error(`Failed to fetch changes: ${response.status}`);
+    return response.json();
+  },
+
   // Get a single session
   getSession: async (sessionId) => {
     const response = await fetch(`${API_BASE}/session-manager/sessions/${sessionId}`);
@@ -67,47 +91,109 @@ export const sessionAPI = {
   },
 };
 
+// Parse a server-sent events response into { event, data } objects (data is JSON)
+async function* readEvents(response) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  try {
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+      // Events are separated by a blank line; the last part may be incomplete
+      const blocks = buffer.split('\n\n');
+      buffer = blocks.pop();
+      for (const block of blocks) {
+        let event = 'message';
+        const data = [];
+        for (const line of block.split('\n')) {
+          if (line.startsWith(':')) continue; // heartbeat
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data.push(line.slice(5).replace(/^ /, ''));
+        }
+        if (data.length) yield { event, data: JSON.parse(data.join('\n')) };
+      }
+    }
+  } finally {
+    // Closes the connection if the caller stopped early, which stops the generation
+    await reader.cancel().catch(() => {});
+  }
+}
+
 export const ragAPI = {
-  // Query RAG with streaming response
-  initialQuery: async function* (query, sessionId) {
+  // Query RAG; yields the answer text as it streams. The response is server-sent events:
+  // "context" and "done" are passed to onContext / onDone, "error" is thrown.
+  // Aborting `signal` or leaving the loop early closes the stream.
+  initialQuery: async function* (query, sessionId, { signal, onContext, onDone } = {}) {
     const response = await fetch(`${API_BASE}/rag/initial_query`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
+        'Accept': 'text/event-stream',
       },
       body: JSON.stringify({
         query: query,
         session_id: sessionId,
       }),
+      signal,
     });
 
     if (!response.ok) {
       throw new Error(`Failed to query RAG: ${response.status}`);
     }
 
-    const reader = response.body.getReader();
-    const decoder = new TextDecoder();
+    for await (const { event, data } of readEvents(response)) {
+      if (event === 'token') yield data.text;
+      else if (event === 'context') onContext?.(data);
+      else if (event === 'done') onDone?.(data);
+      else if (event === 'error') throw new Error(data.detail);
+    }
+  },
 
-    try {
-      while (true) {
-        const { done, value } = await reader.read();
-        if (done) break;
+  // Ask several questions about a session in one request; yields the { event, data } of every
+  // answer as they arrive ("context", "token", "done" or "error", with data.question_id),
+  // then { event: 'end' }. Questions are strings or { id, query }.
+  batchQuery: async function* (sessionId, questions, { signal } = {}) {
+    const response = await fetch(`${API_BASE}/rag/batch_query`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Accept': 'text/event-stream',
+      },
+      body: JSON.stringify({
+        session_id: sessionId,
+        questions: questions.map(question => (typeof question === 'string' ? { query: question } : question)),
+      }),
+      signal,
+    });
 
-        const chunk = decoder.decode(value, { stream: true });
-        yield chunk;
-      }
-    } finally {
-      reader.releaseLock();
+    if (!response.ok) {
+      throw new Error(`Failed to query RAG: ${response.status}`);
     }
+
+    yield* readEvents(response);
+  },
+
+  // Search all sessions; results are grouped by session, filters: { sessionName, dateFrom, dateTo }
+  search: async (query, { sessionName, dateFrom, dateTo, limit = 20, cursor } = {}) => {
+    const params = new URLSearchParams({ q: query, limit: String(limit) });
+    if (sessionName) params.set('session_name', sessionName);
+    if (dateFrom) params.set('date_from', dateFrom);
+    if (dateTo) params.set('date_to', dateTo);
+    if (cursor) params.set('cursor', cursor);
+    const response = await fetch(`${API_BASE}/rag/search?${params}`);
+    if (!response.ok) throw new Error(`Failed to search: ${response.status}`);
+    return response.json();
   },
 };
 
 export const ttsAPI = {
   // Generate audio from text
   generateAudio: async (text, voice = 'Eva') => {
-    const response = await fetch(`${API_BASE}/text_to_speech/generate?text=${encodeURIComponent(text)}&voice=${voice}`, {
-      method: 'POST',
-    });
+    const response = await fetch(`${API_BASE}/text_to_speech/generate?text=${encodeURIComponent(text)}&voice=${encodeURIComponent(voice)}`);
     if (!response.ok) throw new Error(`Failed to generate audio: ${response.status}`);
     return response.blob();
   },